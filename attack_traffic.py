@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Attack Traffic Replay Generator
+Streams timestamped login/refresh/logout/access events with a configurable
+attack mix, and replays them against the blacklist, rotation and
+rate-limit models to measure throughput and detection rate
+"""
+
+import argparse
+import json
+import random
+from collections import Counter, namedtuple
+
+from bench_timing import timed
+from rate_limiter import create_limiter
+from token_blacklist import CompactDigestStore, hash_token
+from token_families import ROTATED, UNKNOWN, FamilyManager
+
+Event = namedtuple("Event", "ts kind user ip family attack")
+
+NORMAL_MIX = {"login": 0.15, "refresh": 0.35, "access": 0.45, "logout": 0.05}
+
+# Attack kinds, mirroring the vectors in test_session_hijacking_vectors and
+# the stolen-token windows in test_token_expiration_attacks
+ATTACK_MIX = {
+    "token_replay": 0.3,      # rotated refresh token presented again
+    "stolen_access": 0.3,     # access token used after its session logged out
+    "session_fixation": 0.1,  # refresh for a family the server never issued
+    "refresh_storm": 0.3,     # burst of refreshes for one session
+}
+
+
+def home_network(user):
+    """Stable network (upper 16 bits of the 24-bit IP id) a user logs in from"""
+    return (user * 2654435761) & 0xFFFF00
+
+
+def generate_events(count, rate=1000.0, attack_ratio=0.05, normal_mix=None,
+                    attack_mix=None, users=10000, storm_size=20, seed=1):
+    """Lazily yield ``count`` events with Poisson arrivals at ``rate``/sec
+
+    The generator tracks which sessions are live or logged out so every
+    attack refers to a session in the right state, without ever holding
+    more than the live session set in memory.
+    """
+    rng = random.Random(seed)
+    normal_kinds, normal_weights = zip(*(normal_mix or NORMAL_MIX).items())
+    attack_kinds, attack_weights = zip(*(attack_mix or ATTACK_MIX).items())
+    live = []  # family ids with an active session
+    owner = {}  # family -> (user, ip)
+    rotated = set()  # live families whose refresh token has rotated at least once
+    logged_out = []  # recent logged-out families (bounded)
+    next_family = 0
+    now = 0.0
+    emitted = 0
+
+    def pick_live():
+        return live[rng.randrange(len(live))]
+
+    while emitted < count:
+        now += rng.expovariate(rate)
+        if live and rng.random() < attack_ratio:
+            attack = rng.choices(attack_kinds, attack_weights)[0]
+            if attack == "token_replay" and rotated:
+                family = pick_live()
+                if family not in rotated:
+                    continue
+                user, _ = owner[family]
+                yield Event(now, "refresh", user, rng.randrange(1 << 24), family, attack)
+                emitted += 1
+            elif attack == "stolen_access" and logged_out:
+                family = logged_out[rng.randrange(len(logged_out))]
+                user, _ = owner.get(family, (-1, -1))
+                yield Event(now, "access", user, rng.randrange(1 << 24), family, attack)
+                emitted += 1
+            elif attack == "session_fixation":
+                yield Event(now, "refresh", -1, rng.randrange(1 << 24), -1 - rng.randrange(1 << 30), attack)
+                emitted += 1
+            elif attack == "refresh_storm":
+                family = pick_live()
+                user, ip = owner[family]
+                for _ in range(min(storm_size, count - emitted)):
+                    now += rng.uniform(0.001, 0.05)
+                    yield Event(now, "refresh", user, ip, family, attack)
+                    emitted += 1
+                rotated.add(family)
+            continue
+
+        kind = rng.choices(normal_kinds, normal_weights)[0]
+        if kind == "login" or not live:
+            family = next_family
+            next_family += 1
+            user = rng.randrange(users)
+            owner[family] = (user, home_network(user) | rng.randrange(256))
+            live.append(family)
+            yield Event(now, "login", user, owner[family][1], family, None)
+        else:
+            index = rng.randrange(len(live))
+            family = live[index]
+            user, ip = owner[family]
+            if kind == "logout":
+                live[index] = live[-1]
+                live.pop()
+                rotated.discard(family)
+                logged_out.append(family)
+                if len(logged_out) > 1000:
+                    del owner[logged_out.pop(0)]
+            elif kind == "refresh":
+                rotated.add(family)
+            yield Event(now, kind, user, ip, family, None)
+        emitted += 1
+
+
+def write_events(events, path):
+    """Write events as JSON Lines; returns the number written"""
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write(json.dumps(event._asdict(), separators=(",", ":")) + "\n")
+            written += 1
+    return written
+
+
+def read_events(path):
+    """Lazily read events written by write_events"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield Event(**json.loads(line))
+
+
+class StressTarget:
+    """Blacklist, family rotation and refresh rate limiting driven by events"""
+
+    def __init__(self, limiter="gcra", limit=10, window=60.0):
+        self.families = FamilyManager(refresh_ttl=float("inf"), clock=lambda: 0.0)
+        self.blacklist = CompactDigestStore()
+        self.limiter = create_limiter(limiter, limit, window)
+        self._sessions = {}  # event family -> [model family, current token, previous token]
+
+    @staticmethod
+    def _access_digest(family):
+        return hash_token(f"access-{family}")
+
+    def handle(self, event):
+        """Apply one event; returns True if the request was blocked"""
+        if event.kind == "login":
+            model_family, token = self.families.create_family(event.user)
+            self._sessions[event.family] = [model_family, token, None]
+            return False
+
+        session = self._sessions.get(event.family)
+        if event.kind == "access":
+            return self._access_digest(event.family) in self.blacklist
+
+        if event.kind == "logout":
+            if session:
+                self.families.revoke_family(session[0])
+                self.blacklist.insert(self._access_digest(event.family))
+                del self._sessions[event.family]
+            return False
+
+        # refresh
+        if not self.limiter.allow(event.user, event.ts):
+            return True
+        if session is None:
+            status, _ = self.families.rotate(event.family, None)
+            return status == UNKNOWN
+        model_family, current, previous = session
+        token = previous if event.attack == "token_replay" else current
+        status, new_token = self.families.rotate(model_family, token)
+        if status == ROTATED:
+            session[1:] = [new_token, current]
+            return False
+        # Reuse revokes the family, so its later refreshes are refused too
+        return True
+
+
+def run_stress(events, limiter="gcra", limit=10, window=60.0):
+    """Replay events against a StressTarget; report throughput and detection"""
+    target = StressTarget(limiter, limit, window)
+    attacks = Counter()
+    detected = Counter()
+    legit = 0
+    false_positives = 0
+    kinds = Counter()
+    # One timed() run rather than sampled with measure: ``events`` is
+    # consumed lazily and may be far too long to hold as a list
+    with timed() as elapsed:
+        for event in events:
+            blocked = target.handle(event)
+            kinds[event.kind] += 1
+            if event.attack:
+                attacks[event.attack] += 1
+                detected[event.attack] += blocked
+            else:
+                legit += 1
+                false_positives += blocked
+    total = sum(kinds.values())
+    return {
+        "events": total,
+        "events_per_sec": total / elapsed["s"] if elapsed["s"] else 0.0,
+        "event_kinds": dict(kinds),
+        "rate_limiter": limiter,
+        "detection": {
+            attack: {
+                "events": attacks[attack],
+                "detected": detected[attack],
+                "detection_rate": detected[attack] / attacks[attack],
+            }
+            for attack in sorted(attacks)
+        },
+        "legitimate_events": legit,
+        "false_positives": false_positives,
+        "blacklist_size": len(target.blacklist),
+        "families": len(target.families),
+    }
+
+
+def main():
+    """Generate attack traffic to a file, or replay it against the models"""
+    parser = argparse.ArgumentParser(description="Attack traffic generator and stress replay")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--rate", type=float, default=1000.0, help="mean events per second")
+    parser.add_argument("--attack-ratio", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--write", metavar="PATH", help="write events as JSON Lines and exit")
+    parser.add_argument("--replay", metavar="PATH", help="replay events from a file")
+    parser.add_argument("--limiter", default="gcra")
+    args = parser.parse_args()
+
+    if args.write:
+        written = write_events(generate_events(args.events, args.rate, args.attack_ratio, seed=args.seed),
+                               args.write)
+        print(f"wrote {written} events to {args.write}")
+        return
+    events = read_events(args.replay) if args.replay else generate_events(
+        args.events, args.rate, args.attack_ratio, seed=args.seed)
+    print(json.dumps(run_stress(events, args.limiter), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+"""
+Structured Audit Output
+Typed result and finding records with appendable JSON Lines, CSV and
+columnar (stdlib ``array``) writers, plus a reader that queries many audit
+runs without parsing text
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import re
+import tempfile
+from array import array
+from collections import namedtuple
+
+from bench_timing import timed
+
+# One leaf of a test's results: numeric leaves fill ``number``, text fills ``text``
+ResultRecord = namedtuple("ResultRecord", "run service ts test key number text")
+# Vulnerabilities, recommendations and implementation status lines
+FindingRecord = namedtuple("FindingRecord", "run service ts kind severity text")
+
+# Column storage per record kind: "s" dictionary-encoded text, "d" float64
+SCHEMAS = {
+    "result": (ResultRecord, {"run": "s", "service": "s", "ts": "d", "test": "s",
+                              "key": "s", "number": "d", "text": "s"}),
+    "finding": (FindingRecord, {"run": "s", "service": "s", "ts": "d", "kind": "s",
+                                "severity": "s", "text": "s"}),
+}
+RECORD_KINDS = {record_type: kind for kind, (record_type, _) in SCHEMAS.items()}
+
+SEVERITIES = ("IMMEDIATE", "CRITICAL", "HIGH", "MEDIUM", "LOW")
+# Whole words only, so "LOW" does not match "ALLOW" or "FLOW"
+_SEVERITY_WORDS = [(severity, re.compile(rf"\b{severity}\b")) for severity in SEVERITIES]
+
+# Per record kind: committed row count and dictionary sizes; columns may
+# hold a torn tail past it after a crash, which the next writer truncates
+MANIFEST = "manifest.json"
+
+
+def iter_leaves(obj, prefix=""):
+    """Yield (path, value) for every scalar leaf of nested results"""
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            yield from iter_leaves(value, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(obj, (list, tuple)):
+        for index, value in enumerate(obj):
+            yield from iter_leaves(value, f"{prefix}[{index}]")
+    elif obj is not None:
+        yield prefix, obj
+
+
+def result_records(run, service, ts, test, results):
+    """Flatten one test's results into ResultRecords"""
+    for key, value in iter_leaves(results):
+        if isinstance(value, bool):
+            yield ResultRecord(run, service, ts, test, key, float(value), str(value).lower())
+        elif isinstance(value, (int, float)):
+            yield ResultRecord(run, service, ts, test, key, float(value), "")
+        else:
+            yield ResultRecord(run, service, ts, test, key, math.nan, str(value))
+
+
+def severity_of(text):
+    """Severity named in a finding ("2. IMMEDIATE: ..."), or "" if none"""
+    upper = text.upper()
+    for severity, word in _SEVERITY_WORDS:
+        if word.search(upper):
+            return severity
+    return ""
+
+
+def finding_records(run, service, ts, vulnerabilities=(), recommendations=(),
+                    implementation_status=None):
+    for text in vulnerabilities:
+        yield FindingRecord(run, service, ts, "vulnerability", severity_of(text), text)
+    for text in recommendations:
+        yield FindingRecord(run, service, ts, "recommendation", severity_of(text), text)
+    for status, items in (implementation_status or {}).items():
+        for text in items:
+            yield FindingRecord(run, service, ts, f"status:{status}", "", text)
+
+
+class JsonLinesSink:
+    """All record kinds in one appendable JSON Lines file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._out = open(path, "a", encoding="utf-8")
+
+    def write(self, records):
+        out = self._out
+        for record in records:
+            row = record._asdict()
+            row["kind"] = RECORD_KINDS[type(record)]
+            if isinstance(row.get("number"), float) and math.isnan(row["number"]):
+                row["number"] = None
+            out.write(json.dumps(row, separators=(",", ":")) + "\n")
+
+    def close(self):
+        self._out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CsvSink:
+    """One appendable CSV file per record kind in ``directory``"""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._files = {}
+
+    def _writer(self, kind):
+        if kind not in self._files:
+            path = os.path.join(self.directory, f"{kind}.csv")
+            new = not os.path.exists(path) or os.path.getsize(path) == 0
+            f = open(path, "a", encoding="utf-8", newline="")
+            writer = csv.writer(f)
+            if new:
+                writer.writerow(SCHEMAS[kind][0]._fields)
+            self._files[kind] = (f, writer)
+        return self._files[kind][1]
+
+    def write(self, records):
+        for record in records:
+            self._writer(RECORD_KINDS[type(record)]).writerow(record)
+
+    def close(self):
+        for f, _ in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _typecode(code):
+    return "I" if code == "s" else code
+
+
+def _load_manifest(directory, fields):
+    """Committed state of one kind's directory, validated against its files
+
+    Stores written before manifests existed are read as committed up to
+    their shortest column.
+    """
+    path = os.path.join(directory, MANIFEST)
+    sizes = {name: _file_size(os.path.join(directory, f"{name}.{_typecode(code)}"))
+             // array(_typecode(code)).itemsize for name, code in fields.items()}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    else:
+        manifest = {"rows": min(sizes.values()), "dict_bytes": {
+            name: _file_size(os.path.join(directory, f"{name}.dict"))
+            for name, code in fields.items() if code == "s"}}
+    short = {name: rows for name, rows in sizes.items() if rows < manifest["rows"]}
+    if short:
+        raise ValueError(f"{directory}: columns {sorted(short)} hold fewer than the "
+                         f"{manifest['rows']} committed rows")
+    for name, size in manifest["dict_bytes"].items():
+        if _file_size(os.path.join(directory, f"{name}.dict")) < size:
+            raise ValueError(f"{directory}: dictionary {name} is shorter than committed")
+    return manifest
+
+
+def _file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+class _ColumnSet:
+    """Buffered columns of one record kind; text is stored as uint32 codes
+
+    Text is kept as strings until flush, which runs under an exclusive
+    lock on the kind's directory: it picks up dictionary entries other
+    writers committed, encodes, appends to every column, fsyncs, then
+    atomically replaces the manifest. Rows past the manifest are
+    uncommitted and are cut off by the next flush.
+    """
+
+    def __init__(self, directory, kind):
+        self.directory = os.path.join(directory, kind)
+        os.makedirs(self.directory, exist_ok=True)
+        self.fields = SCHEMAS[kind][1]
+        self.buffers = {name: [] if code == "s" else array(code) for name, code in self.fields.items()}
+        self._reset_dictionaries()
+
+    def _reset_dictionaries(self):
+        self.dictionaries = {name: {} for name, code in self.fields.items() if code == "s"}
+        self._dict_loaded = {name: 0 for name in self.dictionaries}
+
+    def _path(self, name, ext):
+        return os.path.join(self.directory, f"{name}.{ext}")
+
+    def append(self, record):
+        for name, value in zip(self.fields, record):
+            self.buffers[name].append(value)
+
+    def __len__(self):
+        return len(self.buffers["run"])
+
+    def _sync_dictionaries(self, manifest):
+        """Load dictionary entries committed since this writer last looked"""
+        for name, codes in self.dictionaries.items():
+            size = manifest["dict_bytes"][name]
+            loaded = self._dict_loaded[name]
+            if size > loaded:
+                with open(self._path(name, "dict"), "rb") as f:
+                    f.seek(loaded)
+                    data = f.read(size - loaded)
+                for line in data.decode("utf-8").splitlines():
+                    codes[json.loads(line)] = len(codes)
+                self._dict_loaded[name] = size
+
+    def _append_committed(self, manifest):
+        rows = len(self)
+        # Cut any torn tail a crashed writer left past the last commit
+        for name, code in self.fields.items():
+            path = self._path(name, _typecode(code))
+            if os.path.exists(path):
+                os.truncate(path, manifest["rows"] * array(_typecode(code)).itemsize)
+        for name, size in manifest["dict_bytes"].items():
+            if os.path.exists(self._path(name, "dict")):
+                os.truncate(self._path(name, "dict"), size)
+        self._sync_dictionaries(manifest)
+
+        dict_bytes = dict(manifest["dict_bytes"])
+        columns = {}
+        for name, values in self.buffers.items():
+            if name not in self.dictionaries:
+                columns[name] = values
+                continue
+            codes = self.dictionaries[name]
+            encoded = array("I")
+            added = []
+            for value in values:
+                index = codes.get(value)
+                if index is None:
+                    index = codes[value] = len(codes)
+                    added.append(value)
+                encoded.append(index)
+            columns[name] = encoded
+            if added:
+                with open(self._path(name, "dict"), "ab") as f:
+                    f.write("".join(json.dumps(value) + "\n" for value in added).encode("utf-8"))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    dict_bytes[name] = self._dict_loaded[name] = f.tell()
+        for name, values in columns.items():
+            with open(self._path(name, values.typecode), "ab") as f:
+                values.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+        # The manifest swap commits every column at once
+        _replace_json(os.path.join(self.directory, MANIFEST),
+                      {"rows": manifest["rows"] + rows, "dict_bytes": dict_bytes})
+
+    def flush(self):
+        if not len(self):
+            return
+        with open(os.path.join(self.directory, ".lock"), "a") as lock:
+            _lock_exclusive(lock)
+            try:
+                self._append_committed(_load_manifest(self.directory, self.fields))
+            except BaseException:
+                # Codes handed out for an uncommitted flush are not valid
+                self._reset_dictionaries()
+                raise
+        for name, values in self.buffers.items():
+            del values[:]
+
+
+def _lock_exclusive(f):
+    """Block until this process holds an exclusive lock on ``f``, released on close
+
+    flock on POSIX, a one-byte msvcrt lock on Windows; where neither
+    exists, writers are not serialized.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        try:
+            import msvcrt
+        except ImportError:
+            return
+        f.seek(0)
+        while True:
+            try:
+                # LK_LOCK gives up after about ten seconds; keep waiting
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                pass
+    fcntl.flock(f, fcntl.LOCK_EX)
+
+
+def _replace_json(path, obj):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".manifest-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _read_dictionary(path, size=None):
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        data = f.read() if size is None else f.read(size)
+    return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+
+class ColumnarSink:
+    """Append-only column files per record kind under ``directory``
+
+    Each column is a raw ``array`` file appended with ``tofile``; text
+    columns hold codes into an append-only dictionary, so repeated keys,
+    services and findings cost four bytes per row. Rows are buffered and
+    written every ``flush_rows`` records and on close. Flushes from
+    concurrent writers take turns under a directory lock, so they never
+    assign one dictionary code to two strings.
+    """
+
+    def __init__(self, directory, flush_rows=65536):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self._sets = {}
+
+    def write(self, records):
+        for record in records:
+            kind = RECORD_KINDS[type(record)]
+            columns = self._sets.get(kind)
+            if columns is None:
+                columns = self._sets[kind] = _ColumnSet(self.directory, kind)
+            columns.append(record)
+            if len(columns) >= self.flush_rows:
+                columns.flush()
+
+    def flush(self):
+        for columns in self._sets.values():
+            columns.flush()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+SINKS = {"jsonl": JsonLinesSink, "csv": CsvSink, "columnar": ColumnarSink}
+
+
+def open_sink(fmt, path):
+    if fmt not in SINKS:
+        raise ValueError(f"Unknown output format: {fmt}")
+    return SINKS[fmt](path)
+
+
+class StoreReport:
+    """Report writer (see report_stream) that appends typed records to a sink"""
+
+    def __init__(self, sink, run, service, ts):
+        self.sink = sink
+        self.run = run
+        self.service = service
+        self.ts = ts
+
+    def begin(self, title=None, started=None):
+        pass
+
+    def emit_result(self, test_name, data):
+        self.sink.write(result_records(self.run, self.service, self.ts, test_name, data))
+
+    def emit_records(self, test_name, records):
+        self.begin_records(test_name)
+        for record in records:
+            self.emit_record(test_name, record)
+        self.end_records(test_name)
+
+    def begin_records(self, test_name):
+        self._record_index = 0
+
+    def emit_record(self, test_name, record):
+        self.emit_result(f"{test_name}[{self._record_index}]", record)
+        self._record_index += 1
+
+    def end_records(self, test_name):
+        pass
+
+    def emit_summary(self, total_tests, vulnerabilities, recommendations, implementation_status):
+        self.sink.write(finding_records(self.run, self.service, self.ts, vulnerabilities,
+                                        recommendations, implementation_status))
+        self.sink.write([ResultRecord(self.run, self.service, self.ts, "summary", "total_tests",
+                                      float(total_tests), "")])
+
+    def end(self):
+        self.sink.close()
+
+
+class ColumnarStore:
+    """Read side of a ColumnarSink directory
+
+    Only the columns a query touches are loaded (``array.fromfile``), and
+    equality filters on text columns compare integer codes, so queries over
+    many runs never decode strings they do not return.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._manifests = {}
+
+    def _path(self, kind, name, ext):
+        return os.path.join(self.directory, kind, f"{name}.{ext}")
+
+    def manifest(self, kind):
+        """Committed rows and dictionary sizes, read once per store object"""
+        if kind not in self._manifests:
+            self._manifests[kind] = _load_manifest(os.path.join(self.directory, kind),
+                                                   SCHEMAS[kind][1])
+        return self._manifests[kind]
+
+    def column(self, kind, name):
+        """Raw column array of committed rows (codes for text columns)"""
+        typecode = _typecode(SCHEMAS[kind][1][name])
+        path = self._path(kind, name, typecode)
+        values = array(typecode)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                values.frombytes(f.read(self.manifest(kind)["rows"] * values.itemsize))
+        return values
+
+    def dictionary(self, kind, name):
+        return _read_dictionary(self._path(kind, name, "dict"),
+                                self.manifest(kind)["dict_bytes"].get(name))
+
+    def count(self, kind):
+        return self.manifest(kind)["rows"]
+
+    def select(self, kind, columns=None, where=None):
+        """Rows (as tuples of ``columns``) matching every ``where`` condition
+
+        ``where`` maps column names to a value to match exactly, or to a
+        predicate called with the decoded value.
+        """
+        fields = SCHEMAS[kind][1]
+        columns = list(columns or fields)
+        rows = None
+        for name, condition in (where or {}).items():
+            values = self.column(kind, name)
+            if fields[name] == "s":
+                strings = self.dictionary(kind, name)
+                if callable(condition):
+                    wanted = {i for i, s in enumerate(strings) if condition(s)}
+                    test = wanted.__contains__
+                else:
+                    try:
+                        target = strings.index(condition)
+                    except ValueError:
+                        return []
+                    test = lambda v: v == target
+            else:
+                test = condition if callable(condition) else lambda v: v == condition
+            candidates = range(len(values)) if rows is None else rows
+            rows = [i for i in candidates if test(values[i])]
+        if rows is None:
+            rows = range(self.count(kind))
+
+        output = []
+        for name in columns:
+            values = self.column(kind, name)
+            if fields[name] == "s":
+                strings = self.dictionary(kind, name)
+                output.append([strings[values[i]] for i in rows])
+            else:
+                output.append([values[i] for i in rows])
+        return list(zip(*output))
+
+    def metric_history(self, key, test=None, service=None):
+        """(run, ts, number) for one result key across all stored runs"""
+        where = {"key": key}
+        if test is not None:
+            where["test"] = test
+        if service is not None:
+            where["service"] = service
+        return self.select("result", ["run", "ts", "number"], where)
+
+
+def _synthetic_runs(runs, services, keys_per_run, seed):
+    rng = random.Random(seed)
+    for run in range(runs):
+        service = f"service-{run % services:03d}"
+        ts = 1704067200.0 + run * 3600
+        run_id = f"{service}-{run:05d}"
+        for k in range(keys_per_run):
+            if k % 4 == 0:
+                yield ResultRecord(run_id, service, ts, "blacklist_security", f"metric_{k}", math.nan,
+                                   rng.choice(["Implemented", "NOT IMPLEMENTED", "Configured"]))
+            else:
+                yield ResultRecord(run_id, service, ts, "blacklist_security", f"metric_{k}",
+                                   rng.random() * 1000, "")
+
+
+def _directory_bytes(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, files in os.walk(path) for name in files)
+
+
+def _query_jsonl(path, key, service):
+    matches = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            if row["key"] == key and row["service"] == service:
+                matches.append((row["run"], row["ts"], row["number"]))
+    return matches
+
+
+def _query_csv(directory, key, service):
+    matches = []
+    with open(os.path.join(directory, "result.csv"), encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        for run, row_service, ts, _, row_key, number, _ in reader:
+            if row_key == key and row_service == service:
+                matches.append((run, float(ts), float(number)))
+    return matches
+
+
+def benchmark_store(runs=500, services=50, keys_per_run=200, batches=10, seed=1):
+    """Append ``runs`` audit runs in ``batches`` and query one metric per format
+
+    Every format gets the same records, appended in several batches (as
+    successive audits would), then answers "history of one key for one
+    service" over everything stored.
+    """
+    records = list(_synthetic_runs(runs, services, keys_per_run, seed))
+    per_batch = math.ceil(len(records) / batches)
+    key, service = "metric_1", "service-007"
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {"jsonl": os.path.join(tmp, "audit.jsonl"), "csv": os.path.join(tmp, "csv"),
+                 "columnar": os.path.join(tmp, "columnar")}
+        queries = {
+            "jsonl": lambda: _query_jsonl(paths["jsonl"], key, service),
+            "csv": lambda: _query_csv(paths["csv"], key, service),
+            "columnar": lambda: ColumnarStore(paths["columnar"]).metric_history(key, service=service),
+        }
+        for fmt, path in paths.items():
+            with timed() as append_time:
+                for offset in range(0, len(records), per_batch):
+                    with open_sink(fmt, path) as sink:
+                        sink.write(records[offset:offset + per_batch])
+
+            with timed() as query_time:
+                matches = queries[fmt]()
+            results.append({
+                "format": fmt,
+                "rows": len(records),
+                "append_rows_per_sec": len(records) / append_time["s"] if append_time["s"] else 0.0,
+                "disk_bytes": _directory_bytes(path),
+                "bytes_per_row": _directory_bytes(path) / len(records),
+                "query_time_s": query_time["s"],
+                "query_matches": len(matches),
+            })
+    return results
+
+
+def main():
+    """Query a columnar audit store, or benchmark the output formats"""
+    parser = argparse.ArgumentParser(description="Structured audit output store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    query = subparsers.add_parser("query", help="history of one result key in a columnar store")
+    query.add_argument("store")
+    query.add_argument("key")
+    query.add_argument("--test")
+    query.add_argument("--service")
+    findings = subparsers.add_parser("findings", help="findings in a columnar store")
+    findings.add_argument("store")
+    findings.add_argument("--kind", default="vulnerability")
+    findings.add_argument("--service")
+    bench = subparsers.add_parser("benchmark", help="append/query cost per format")
+    bench.add_argument("--runs", type=int, default=500)
+    bench.add_argument("--keys", type=int, default=200, help="result keys per run")
+    args = parser.parse_args()
+
+    if args.command == "query":
+        rows = ColumnarStore(args.store).metric_history(args.key, args.test, args.service)
+        print(json.dumps([{"run": r, "ts": ts, "value": v} for r, ts, v in rows], indent=2))
+    elif args.command == "findings":
+        where = {"kind": args.kind}
+        if args.service:
+            where["service"] = args.service
+        rows = ColumnarStore(args.store).select("finding", ["run", "severity", "text"], where)
+        print(json.dumps([{"run": r, "severity": s, "text": t} for r, s, t in rows], indent=2))
+    else:
+        print(json.dumps(benchmark_store(args.runs, keys_per_run=args.keys), indent=2))
+
+
+if __name__ == "__main__":
+    main()
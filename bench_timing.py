@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark Timing Core
+perf_counter_ns sampling with warmup, batched samples, outlier rejection
+and confidence intervals, a single-run timer for macro timings, plus
+nestable tracemalloc measurement, shared by the benchmarks behind every
+performance figure in the security audit
+"""
+
+import argparse
+import json
+import math
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from reproducibility import t_quantile
+
+# Samples further than this many scaled MADs from the median are rejected
+OUTLIER_FENCE = 3.5
+# Scale that makes the median absolute deviation estimate a normal stdev
+MAD_SCALE = 1.4826
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def reject_outliers(samples, fence=OUTLIER_FENCE):
+    """Split samples into (kept, rejected) by distance from the median
+
+    Uses the median absolute deviation, so a few interrupted or GC-paused
+    samples cannot widen the fence that is meant to catch them.
+    """
+    median = statistics.median(samples)
+    spread = MAD_SCALE * statistics.median(abs(s - median) for s in samples)
+    if spread == 0:
+        return list(samples), []
+    kept = [s for s in samples if abs(s - median) <= fence * spread]
+    rejected = [s for s in samples if abs(s - median) > fence * spread]
+    return kept, rejected
+
+
+def summarize(samples, batch=1, confidence=0.95, fence=OUTLIER_FENCE):
+    """Statistics for per-operation times (ns), one value per timed sample
+
+    ``mean_ns`` carries a Student t confidence interval over the samples
+    that survive outlier rejection. ``p50_ns`` / ``p99_ns`` / ``max_ns``
+    are taken over every sample, outliers included, so the tail stays
+    visible. With ``batch`` > 1 each sample is a batch mean, so these are
+    batch-level percentiles, not per-call ones.
+    """
+    if not samples:
+        raise ValueError("No timing samples")
+    kept, rejected = reject_outliers(samples, fence)
+    ordered = sorted(samples)
+    mean = statistics.fmean(kept)
+    stdev = statistics.stdev(kept) if len(kept) > 1 else 0.0
+    margin = t_quantile(confidence, len(kept) - 1) * stdev / math.sqrt(len(kept)) if len(kept) > 1 else 0.0
+    return {
+        "samples": len(kept),
+        "outliers_rejected": len(rejected),
+        "batch": batch,
+        "confidence": confidence,
+        "mean_ns": mean,
+        "ci_low_ns": max(mean - margin, 0.0),
+        "ci_high_ns": mean + margin,
+        "stdev_ns": stdev,
+        "p50_ns": _percentile(ordered, 0.50),
+        "p99_ns": _percentile(ordered, 0.99),
+        "max_ns": ordered[-1],
+        "ops_per_sec": 1e9 / mean if mean else 0.0,
+    }
+
+
+def calibrate(fn, min_sample_ns=200_000, max_batch=1 << 20):
+    """Smallest power-of-two batch of ``fn()`` calls lasting ``min_sample_ns``
+
+    Calibration runs double as warmup for caches and lazy initialization.
+    """
+    batch = 1
+    perf_counter_ns = time.perf_counter_ns
+    while batch < max_batch:
+        t0 = perf_counter_ns()
+        for _ in range(batch):
+            fn()
+        if perf_counter_ns() - t0 >= min_sample_ns:
+            break
+        batch *= 2
+    return batch
+
+
+def measure(fn, samples=30, batch=None, warmup=2, min_sample_ns=200_000,
+            confidence=0.95):
+    """Time repeated ``fn()`` calls; each sample is one batch of calls
+
+    Without a ``batch`` it is calibrated so every sample lasts at least
+    ``min_sample_ns``, keeping per-call times well above timer resolution.
+    """
+    if batch is None:
+        batch = calibrate(fn, min_sample_ns)
+    perf_counter_ns = time.perf_counter_ns
+    loop = range(batch)
+    for _ in range(warmup):
+        for _ in loop:
+            fn()
+    times = []
+    for _ in range(samples):
+        t0 = perf_counter_ns()
+        for _ in loop:
+            fn()
+        times.append((perf_counter_ns() - t0) / batch)
+    return summarize(times, batch, confidence)
+
+
+def measure_each(fn, items, batch=32, warmup=1, confidence=0.95):
+    """Time ``fn(item)`` over ``items``; each sample is one batch of items
+
+    For operations that consume their input (replaying a token that is
+    then revoked) or that should see every probe once. The first
+    ``warmup`` batches run untimed, so ``items`` needs at least
+    ``(warmup + 2) * batch`` entries for a confidence interval.
+    ``total_ns`` is the summed time of every timed batch.
+    """
+    items = list(items)
+    start = min(warmup * batch, max(len(items) - 2 * batch, 0))
+    for item in items[:start]:
+        fn(item)
+    perf_counter_ns = time.perf_counter_ns
+    times = []
+    total = 0
+    for offset in range(start, len(items), batch):
+        chunk = items[offset:offset + batch]
+        t0 = perf_counter_ns()
+        for item in chunk:
+            fn(item)
+        elapsed = perf_counter_ns() - t0
+        total += elapsed
+        times.append(elapsed / len(chunk))
+    result = summarize(times, batch, confidence)
+    result["total_ns"] = total
+    return result
+
+
+@contextmanager
+def timed():
+    """Wall time of one run of the block: ``elapsed["ns"]`` and ``elapsed["s"]``
+
+    For macro timings that cannot be sampled with measure/measure_each
+    because the work runs once: building a store, an end-to-end replay of a
+    lazy stream, a concurrent run, a sweep or a network round-trip
+    comparison. Anything cheap and repeatable belongs in measure instead.
+    """
+    elapsed = {}
+    perf_counter_ns = time.perf_counter_ns
+    start = perf_counter_ns()
+    try:
+        yield elapsed
+    finally:
+        elapsed["ns"] = perf_counter_ns() - start
+        elapsed["s"] = elapsed["ns"] / 1e9
+
+
+def ratio_interval(a, b):
+    """Ratio of mean times a/b with bounds from both confidence intervals"""
+    ratio = a["mean_ns"] / b["mean_ns"] if b["mean_ns"] else math.inf
+    low = a["ci_low_ns"] / b["ci_high_ns"] if b["ci_high_ns"] else math.inf
+    high = a["ci_high_ns"] / b["ci_low_ns"] if b["ci_low_ns"] else math.inf
+    return ratio, low, high
+
+
+def verdict(low, high, limit):
+    """"GOOD" if the whole interval is under ``limit``, "POOR" if over, else "INCONCLUSIVE" """
+    if high < limit:
+        return "GOOD"
+    if low >= limit:
+        return "POOR"
+    return "INCONCLUSIVE"
+
+
+# Peak high-water marks of the traced_allocations blocks currently open
+_open_blocks = []
+
+
+@contextmanager
+def traced_allocations():
+    """Bytes allocated inside the block: ``usage["current"]`` still live, ``usage["peak"]`` at most
+
+    Both are relative to the traced total on entry. Blocks nest: tracing
+    is started and stopped only by the outermost block, and the peak reset
+    an inner block needs is folded back into every enclosing block, so
+    profiling a whole test does not disturb the figures its benchmarks
+    measure themselves.
+    """
+    owner = not tracemalloc.is_tracing()
+    if owner:
+        tracemalloc.start()
+    base, peak = tracemalloc.get_traced_memory()
+    for block in _open_blocks:
+        block[0] = max(block[0], peak)
+    tracemalloc.reset_peak()
+    block = [base]
+    _open_blocks.append(block)
+    usage = {}
+    try:
+        yield usage
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        _open_blocks.pop()
+        high = max(block[0], peak)
+        for outer in _open_blocks:
+            outer[0] = max(outer[0], high)
+        usage["current"] = current - base
+        usage["peak"] = high - base
+        if owner:
+            tracemalloc.stop()
+
+
+def main():
+    """Show the timing core on a few reference operations"""
+    parser = argparse.ArgumentParser(description="Micro-benchmark timing core demo")
+    parser.add_argument("--samples", type=int, default=30)
+    args = parser.parse_args()
+
+    import hashlib
+
+    data = b"x" * 64
+    digests = {hashlib.sha256(str(i).encode()).digest() for i in range(10000)}
+    probe = hashlib.sha256(b"42").digest()
+    print(json.dumps({
+        "noop": measure(lambda: None, args.samples),
+        "sha256_64b": measure(lambda: hashlib.sha256(data).digest(), args.samples),
+        "set_lookup": measure(lambda: probe in digests, args.samples),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
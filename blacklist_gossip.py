@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Blacklist Gossip Replication Simulator
+Runs N blacklist replicas as local processes that push batched revocation
+deltas to each other over TCP and repair missed ones with Merkle-style
+anti-entropy, measuring propagation time, bandwidth per revocation and
+lookup throughput as N grows
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import selectors
+import socket
+import struct
+import time
+
+from token_blacklist import DIGEST_SIZE, CompactDigestStore
+
+# Frame header: type, sender replica id, payload length
+FRAME = struct.Struct("<BHI")
+DELTA, ROOT, LEAVES, HAVE, WANT, REPAIR = 1, 2, 3, 4, 5, 6
+FRAME_NAMES = {DELTA: "delta", ROOT: "anti_entropy", LEAVES: "anti_entropy",
+               HAVE: "anti_entropy", WANT: "anti_entropy", REPAIR: "repair"}
+
+# Replicated entry: digest, expiry, monotonic ns when first revoked anywhere
+ENTRY = struct.Struct(f"<{DIGEST_SIZE}sqq")
+BUCKETS = 256
+LEAF_BYTES = 16
+# Digest prefix that names an entry during anti-entropy set reconciliation
+PREFIX_BYTES = 8
+
+
+class _Connection:
+    """Non-blocking socket with an output buffer and a partial-frame input buffer"""
+
+    def __init__(self, sock, peer=None):
+        self.sock = sock
+        self.peer = peer  # replica id for outbound connections
+        self.out = bytearray()
+        self.inbuf = bytearray()
+
+
+class Replica:
+    """One blacklist node; runs its event loop in a child process
+
+    Local revocations are queued and pushed to ``fanout`` random peers every
+    ``flush_ms`` or once ``batch_size`` are waiting. With a fanout below
+    N - 1, entries a node learns from a peer are forwarded once (infect and
+    die), never back to that peer. Every ``anti_entropy_ms`` a node sends one random peer the root
+    hash of its 256 bucket hashes (XOR of digest prefixes, kept up to date
+    on insert). On a mismatch the peer returns its leaves, the node lists
+    8-byte prefixes of its entries in the differing buckets, and each side
+    then sends the other exactly the entries it lacks. ``loss`` drops that fraction of delta
+    frames at the sender so anti-entropy has something to repair.
+    """
+
+    def __init__(self, index, control, batch_size=256, flush_ms=2.0, fanout=None,
+                 anti_entropy_ms=50.0, loss=0.0, seed=1):
+        self.index = index
+        self.control = control
+        self.batch_size = batch_size
+        self.flush_ns = int(flush_ms * 1e6)
+        self.fanout = fanout
+        self.anti_entropy_ns = int(anti_entropy_ms * 1e6)
+        self.loss = loss
+        self.rng = random.Random(seed * 1000 + index)
+        self.store = CompactDigestStore()
+        self.entries = {}  # digest -> (exp, origin_ns, arrival_ns)
+        self.buckets = [[] for _ in range(BUCKETS)]
+        self.leaves = [0] * BUCKETS
+        self.pending = []
+        self.forward = {}  # sender -> fresh digests learned from it
+        self.peers = {}
+        self.bytes_sent = {"delta": 0, "anti_entropy": 0, "repair": 0}
+        self.frames_dropped = 0
+        self.repaired = 0
+        self.selector = selectors.DefaultSelector()
+
+    # -- replicated state -------------------------------------------------
+
+    def _insert(self, digest, exp, origin_ns, now_ns):
+        if digest in self.entries:
+            return False
+        self.entries[digest] = (exp, origin_ns, now_ns)
+        self.store.insert(digest, exp)
+        bucket = digest[0]
+        self.buckets[bucket].append(digest)
+        self.leaves[bucket] ^= int.from_bytes(digest[:LEAF_BYTES], "little")
+        return True
+
+    def _root(self):
+        return hashlib.sha256(self._leaf_bytes()).digest()
+
+    def _pack(self, digests):
+        entries = self.entries
+        return b"".join(ENTRY.pack(d, entries[d][0], entries[d][1]) for d in digests)
+
+    # -- networking -------------------------------------------------------
+
+    def _send(self, peer, kind, payload):
+        conn = self.peers.get(peer)
+        if conn is None:
+            return
+        conn.out += FRAME.pack(kind, self.index, len(payload)) + payload
+        self.bytes_sent[FRAME_NAMES[kind]] += FRAME.size + len(payload)
+        self._flush_socket(conn)
+
+    def _flush_socket(self, conn):
+        if conn.out:
+            try:
+                sent = conn.sock.send(conn.out)
+                del conn.out[:sent]
+            except BlockingIOError:
+                pass
+            except OSError:
+                self._drop(conn)
+                return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if conn.out else 0)
+        self.selector.modify(conn.sock, events, conn)
+
+    def _targets(self, exclude=None):
+        others = [p for p in self.peers if p != exclude]
+        if self.fanout is None or self.fanout >= len(others):
+            return others
+        return self.rng.sample(others, self.fanout)
+
+    def _push(self, digests, exclude=None):
+        payload = self._pack(digests)
+        for peer in self._targets(exclude):
+            if self.loss and self.rng.random() < self.loss:
+                self.frames_dropped += 1
+                continue
+            self._send(peer, DELTA, payload)
+
+    def _on_frame(self, kind, sender, payload):
+        now = time.monotonic_ns()
+        if kind in (DELTA, REPAIR):
+            fresh = []
+            for digest, exp, origin in ENTRY.iter_unpack(payload):
+                if self._insert(digest, exp, origin, now):
+                    fresh.append(digest)
+            if kind == REPAIR:
+                self.repaired += len(fresh)
+            elif fresh and self.fanout is not None and self.fanout < len(self.peers):
+                self.forward.setdefault(sender, []).extend(fresh)
+        elif kind == ROOT:
+            if payload != self._root():
+                self._send(sender, LEAVES, self._leaf_bytes())
+        elif kind == LEAVES:
+            theirs = [int.from_bytes(payload[i:i + LEAF_BYTES], "little")
+                      for i in range(0, len(payload), LEAF_BYTES)]
+            differing = bytes(b for b in range(BUCKETS) if theirs[b] != self.leaves[b])
+            if differing:
+                prefixes = b"".join(d[:PREFIX_BYTES] for b in differing for d in self.buckets[b])
+                self._send(sender, HAVE, len(differing).to_bytes(2, "little") + differing + prefixes)
+        elif kind == HAVE:
+            count = int.from_bytes(payload[:2], "little")
+            differing = payload[2:2 + count]
+            theirs = {payload[i:i + PREFIX_BYTES]
+                      for i in range(2 + count, len(payload), PREFIX_BYTES)}
+            ours = {d[:PREFIX_BYTES]: d for b in differing for d in self.buckets[b]}
+            # Entries younger than one sync interval are probably still in
+            # flight as deltas; a real miss is repaired next round
+            settled = now - self.anti_entropy_ns
+            missing = [d for p, d in ours.items() if p not in theirs and self.entries[d][2] <= settled]
+            if missing:
+                self._send(sender, REPAIR, self._pack(missing))
+            wanted = b"".join(p for p in theirs if p not in ours)
+            if wanted:
+                self._send(sender, WANT, wanted)
+        elif kind == WANT:
+            wanted = {payload[i:i + PREFIX_BYTES] for i in range(0, len(payload), PREFIX_BYTES)}
+            buckets = {p[0] for p in wanted}
+            found = [d for b in buckets for d in self.buckets[b] if d[:PREFIX_BYTES] in wanted]
+            if found:
+                self._send(sender, REPAIR, self._pack(found))
+
+    def _drop(self, conn):
+        """Forget a connection the other side closed (peers stop at different times)"""
+        self.selector.unregister(conn.sock)
+        conn.sock.close()
+        if conn.peer is not None:
+            self.peers.pop(conn.peer, None)
+
+    def _leaf_bytes(self):
+        return b"".join(leaf.to_bytes(LEAF_BYTES, "little") for leaf in self.leaves)
+
+    def _read(self, conn):
+        try:
+            data = conn.sock.recv(1 << 20)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(conn)
+            return
+        buf = conn.inbuf
+        buf += data
+        offset = 0
+        while len(buf) - offset >= FRAME.size:
+            kind, sender, length = FRAME.unpack_from(buf, offset)
+            end = offset + FRAME.size + length
+            if end > len(buf):
+                break
+            self._on_frame(kind, sender, bytes(buf[offset + FRAME.size:end]))
+            offset = end
+        del buf[:offset]
+
+    # -- control ----------------------------------------------------------
+
+    def _on_command(self, command, arg):
+        if command == "revoke":
+            now = time.monotonic_ns()
+            for i in range(0, len(arg), DIGEST_SIZE + 8):
+                digest = arg[i:i + DIGEST_SIZE]
+                exp = int.from_bytes(arg[i + DIGEST_SIZE:i + DIGEST_SIZE + 8], "little")
+                if self._insert(digest, exp, now, now):
+                    self.pending.append(digest)
+            if len(self.pending) >= self.batch_size:
+                self._flush_pending()
+        elif command == "status":
+            self.control.send({"entries": len(self.entries), "bytes_sent": dict(self.bytes_sent),
+                               "frames_dropped": self.frames_dropped, "repaired": self.repaired})
+        elif command == "arrivals":
+            self.control.send(b"".join(struct.pack(f"<{DIGEST_SIZE}sq", d, v[2])
+                                       for d, v in self.entries.items()))
+        elif command == "lookups":
+            # Every replica counts lookups over the same wall-clock window
+            start_at, duration = arg
+            digests = list(self.entries)
+            rng = random.Random(self.index)
+            probes = [rng.choice(digests) if digests and rng.random() < 0.5
+                      else rng.randbytes(DIGEST_SIZE) for _ in range(4096)]
+            lookup = self.store.lookup
+            while time.monotonic() < start_at:
+                pass
+            deadline = start_at + duration
+            done = 0
+            while time.monotonic() < deadline:
+                for digest in probes:
+                    lookup(digest)
+                done += len(probes)
+            self.control.send(done / (time.monotonic() - start_at))
+        elif command == "stop":
+            return False
+        return True
+
+    def _flush_pending(self):
+        if self.pending:
+            self._push(self.pending)
+            self.pending = []
+        if self.forward:
+            for sender, digests in self.forward.items():
+                self._push(digests, exclude=sender)
+            self.forward = {}
+
+    def serve(self, listener, addresses):
+        """Connect to every peer, then run until told to stop"""
+        for peer, address in addresses.items():
+            if peer == self.index:
+                continue
+            sock = socket.create_connection(address)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setblocking(False)
+            self.peers[peer] = _Connection(sock, peer)
+            self.selector.register(sock, selectors.EVENT_READ, self.peers[peer])
+        for _ in range(len(addresses) - 1):
+            sock, _ = listener.accept()
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ, _Connection(sock))
+        listener.close()
+        self.selector.register(self.control, selectors.EVENT_READ, None)
+        self.control.send("ready")
+
+        now = time.monotonic_ns()
+        next_flush = now + self.flush_ns
+        next_sync = now + self.anti_entropy_ns + self.rng.randrange(self.anti_entropy_ns or 1)
+        running = True
+        while True:
+            timeout = max(min(next_flush, next_sync) - time.monotonic_ns(), 0) / 1e9
+            for key, mask in self.selector.select(timeout):
+                if key.data is None:
+                    running = self._on_command(*self.control.recv())
+                    continue
+                conn = key.data
+                if mask & selectors.EVENT_WRITE and conn.sock.fileno() >= 0:
+                    self._flush_socket(conn)
+                if mask & selectors.EVENT_READ and conn.sock.fileno() >= 0:
+                    self._read(conn)
+            if not running:
+                break
+            now = time.monotonic_ns()
+            if now >= next_flush:
+                self._flush_pending()
+                next_flush = now + self.flush_ns
+            if self.anti_entropy_ns and now >= next_sync and self.peers:
+                self._send(self.rng.choice(list(self.peers)), ROOT, self._root())
+                next_sync = now + self.anti_entropy_ns
+        for key in list(self.selector.get_map().values()):
+            if key.data is not None:
+                key.fileobj.close()
+
+
+def _replica_main(index, control, options):
+    listener = socket.create_server(("127.0.0.1", 0))
+    control.send(listener.getsockname())
+    addresses = control.recv()
+    Replica(index, control, **options).serve(listener, addresses)
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def simulate_cluster(replicas=4, revocations=5000, rate=20000, command_batch=50,
+                     lookup_seconds=0.5, timeout=30.0, seed=1, clock=time.time, **options):
+    """Revoke ``revocations`` tokens across ``replicas`` nodes and measure spread
+
+    Revocations arrive at ``rate`` per second, each ``command_batch`` at a
+    random node. Propagation time is from the first node accepting a
+    revocation to the last node storing it, on the system-wide monotonic
+    clock. Lookup throughput is counted on every node over the same
+    ``lookup_seconds`` window after convergence, so with fewer cores than
+    replicas the per-replica rate shows the contention. Token expiries
+    are one hour after ``clock()``.
+    """
+    rng = random.Random(seed)
+    ctx = multiprocessing.get_context()
+    controls = []
+    processes = []
+    for index in range(replicas):
+        parent, child = ctx.Pipe()
+        process = ctx.Process(target=_replica_main, args=(index, child, dict(options, seed=seed)),
+                              daemon=True)
+        process.start()
+        controls.append(parent)
+        processes.append(process)
+    try:
+        addresses = {index: control.recv() for index, control in enumerate(controls)}
+        for control in controls:
+            control.send(addresses)
+        for control in controls:
+            control.recv()
+
+        expiry = int(clock()) + 3600
+        start = time.monotonic()
+        for sent in range(0, revocations, command_batch):
+            count = min(command_batch, revocations - sent)
+            payload = b"".join(rng.randbytes(DIGEST_SIZE) + expiry.to_bytes(8, "little")
+                               for _ in range(count))
+            rng.choice(controls).send(("revoke", payload))
+            delay = start + (sent + count) / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            for control in controls:
+                control.send(("status", None))
+            statuses = [control.recv() for control in controls]
+            converged = all(s["entries"] == revocations for s in statuses)
+            if converged or time.monotonic() > deadline:
+                break
+            time.sleep(0.01)
+        converge_time = time.monotonic() - start
+
+        first = {}
+        last = {}
+        for control in controls:
+            control.send(("arrivals", None))
+        for control in controls:
+            for digest, arrival in struct.iter_unpack(f"<{DIGEST_SIZE}sq", control.recv()):
+                if digest not in first or arrival < first[digest]:
+                    first[digest] = arrival
+                if digest not in last or arrival > last[digest]:
+                    last[digest] = arrival
+        spread = sorted((last[d] - first[d]) / 1e6 for d in first)
+
+        start_at = time.monotonic() + 0.05
+        for control in controls:
+            control.send(("lookups", (start_at, lookup_seconds)))
+        lookup_rates = [control.recv() for control in controls]
+
+        sent_by_kind = {kind: sum(s["bytes_sent"][kind] for s in statuses)
+                        for kind in statuses[0]["bytes_sent"]}
+        total_bytes = sum(sent_by_kind.values())
+        return {
+            "replicas": replicas,
+            "revocations": revocations,
+            "converged": converged,
+            "converge_time_s": converge_time,
+            "propagation_p50_ms": _percentile(spread, 0.50),
+            "propagation_p99_ms": _percentile(spread, 0.99),
+            "propagation_max_ms": spread[-1] if spread else 0.0,
+            "bytes_per_revocation": total_bytes / max(revocations, 1),
+            "bytes_per_revocation_by_kind": {k: v / max(revocations, 1) for k, v in sent_by_kind.items()},
+            "delta_frames_dropped": sum(s["frames_dropped"] for s in statuses),
+            "entries_repaired": sum(s["repaired"] for s in statuses),
+            "lookups_per_sec_per_replica": sum(lookup_rates) / replicas,
+            "lookups_per_sec_total": sum(lookup_rates),
+        }
+    finally:
+        for control in controls:
+            try:
+                control.send(("stop", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in processes:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+
+
+def benchmark_gossip(sizes=(2, 4, 8), revocations=5000, loss=0.0, fanout=None, seed=1,
+                     clock=time.time, **options):
+    """Run the cluster simulation at each replica count"""
+    results = [simulate_cluster(n, revocations, loss=loss, fanout=fanout, seed=seed, clock=clock,
+                                **options)
+               for n in sizes]
+    return {
+        "cpu_count": os.cpu_count(),
+        "loss": loss,
+        "fanout": fanout,
+        "by_replicas": results,
+    }
+
+
+def main():
+    """Run the gossip replication simulator"""
+    parser = argparse.ArgumentParser(description="Blacklist gossip replication simulator")
+    parser.add_argument("--replicas", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--revocations", type=int, default=5000)
+    parser.add_argument("--rate", type=int, default=20000, help="revocations per second")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--flush-ms", type=float, default=2.0)
+    parser.add_argument("--fanout", type=int, help="peers per push (default: all)")
+    parser.add_argument("--anti-entropy-ms", type=float, default=50.0)
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of delta frames dropped")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(json.dumps(benchmark_gossip(args.replicas, args.revocations, args.loss, args.fanout,
+                                      args.seed, rate=args.rate, batch_size=args.batch_size,
+                                      flush_ms=args.flush_ms,
+                                      anti_entropy_ms=args.anti_entropy_ms), indent=2))
+
+
+if __name__ == "__main__":
+    main()
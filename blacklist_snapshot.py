@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""
+Persistent Blacklist Snapshot
+Memory-mapped file of sorted (digest, expiry) records that a restarted node
+queries in place, an append log for revocations since the last snapshot,
+periodic compaction, and a cold-start benchmark against a JSON dump
+"""
+
+import argparse
+import bisect
+import json
+import mmap
+import os
+import random
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_timing import measure_each, timed
+from token_blacklist import DIGEST_SIZE, CompactDigestStore
+
+MAGIC = b"BLSNAP01"
+# Header: magic, record count, fence bits; padded to HEADER_SIZE
+HEADER = struct.Struct("<8sQQ")
+HEADER_SIZE = 64
+# One record: raw digest then signed little-endian expiry
+RECORD_SIZE = DIGEST_SIZE + 8
+EXPIRY_OFFSET = DIGEST_SIZE
+# fence[p] is the first record whose digest starts with the 16-bit prefix p,
+# so a lookup bisects ~count / 65536 records instead of all of them
+FENCE_BITS = 16
+NEVER = CompactDigestStore.NEVER
+
+# Append log: op, digest, expiry
+LOG_RECORD = struct.Struct("<B32sq")
+LOG_ADD = 1
+LOG_DELETE = 0
+
+
+def pack_record(digest, exp):
+    return digest + (NEVER if exp is None else int(exp)).to_bytes(8, "little", signed=True)
+
+
+def record_expiry(record):
+    return int.from_bytes(record[EXPIRY_OFFSET:RECORD_SIZE], "little", signed=True)
+
+
+def _write_sorted(path, records):
+    """Write ascending, digest-unique records to ``path`` atomically"""
+    fences = 1 << FENCE_BITS
+    shift = 16 - FENCE_BITS
+    counts = [0] * fences
+    count = 0
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".snapshot-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(bytes(HEADER_SIZE + 8 * (fences + 1)))
+            pending = []
+            for record in records:
+                counts[(record[0] << 8 | record[1]) >> shift] += 1
+                pending.append(record)
+                if len(pending) == 4096:
+                    f.write(b"".join(pending))
+                    count += len(pending)
+                    pending = []
+            f.write(b"".join(pending))
+            count += len(pending)
+
+            fence = [0] * (fences + 1)
+            total = 0
+            for prefix, n in enumerate(counts):
+                fence[prefix] = total
+                total += n
+            fence[fences] = total
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, count, FENCE_BITS).ljust(HEADER_SIZE, b"\0"))
+            f.write(struct.pack(f"<{fences + 1}Q", *fence))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return count
+
+
+def write_snapshot(path, entries, now=None):
+    """Write (digest, exp) pairs in any order as a snapshot; returns the count
+
+    Entries are packed into 256 buckets by first digest byte and sorted one
+    bucket at a time, so only one bucket is ever held as separate objects.
+    Duplicate digests keep the latest expiry; with ``now`` given, entries
+    already expired are dropped.
+    """
+    buckets = [bytearray() for _ in range(256)]
+    for digest, exp in entries:
+        buckets[digest[0]] += pack_record(digest, exp)
+
+    def records():
+        for b, packed in enumerate(buckets):
+            chunk = [bytes(packed[i:i + RECORD_SIZE]) for i in range(0, len(packed), RECORD_SIZE)]
+            buckets[b] = None
+            chunk.sort()
+            previous = None
+            for record in chunk:
+                if previous is not None and previous[:DIGEST_SIZE] == record[:DIGEST_SIZE]:
+                    if record_expiry(record) > record_expiry(previous):
+                        previous = record
+                    continue
+                if previous is not None and (now is None or record_expiry(previous) > now):
+                    yield previous
+                previous = record
+            if previous is not None and (now is None or record_expiry(previous) > now):
+                yield previous
+
+    return _write_sorted(path, records())
+
+
+class _DigestKeys:
+    """Sequence of the digests in a snapshot's records, for bisect"""
+
+    def __init__(self, buffer, offset):
+        self._buffer = buffer
+        self._offset = offset
+
+    def __getitem__(self, index):
+        start = self._offset + index * RECORD_SIZE
+        return self._buffer[start:start + DIGEST_SIZE]
+
+
+class BlacklistSnapshot:
+    """Read-only snapshot queried straight from the page cache
+
+    Opening maps the file and reads the 64-byte header; nothing is parsed
+    or copied, so a node answers its first lookup after one page fault per
+    probe rather than after a rebuild.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count, fence_bits = HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a blacklist snapshot")
+        self._shift = 16 - fence_bits
+        fences = (1 << fence_bits) + 1
+        self._records_offset = HEADER_SIZE + 8 * fences
+        fence = memoryview(self._mm)[HEADER_SIZE:self._records_offset]
+        if sys.byteorder == "little":
+            self._fence = fence.cast("Q")
+        else:
+            self._fence = struct.unpack(f"<{fences}Q", fence)
+            fence.release()
+        self._keys = _DigestKeys(self._mm, self._records_offset)
+
+    def _find(self, digest):
+        prefix = (digest[0] << 8 | digest[1]) >> self._shift
+        lo, hi = self._fence[prefix], self._fence[prefix + 1]
+        index = bisect.bisect_left(self._keys, digest, lo, hi)
+        if index < hi and self._keys[index] == digest:
+            return index
+        return -1
+
+    def expiry(self, digest):
+        """Stored expiry for digest, or None if absent"""
+        index = self._find(digest)
+        if index < 0:
+            return None
+        start = self._records_offset + index * RECORD_SIZE + EXPIRY_OFFSET
+        return int.from_bytes(self._mm[start:start + 8], "little", signed=True)
+
+    def lookup(self, digest, now=None):
+        exp = self.expiry(digest)
+        return exp is not None and (now is None or exp > now)
+
+    def records(self):
+        """Raw records in digest order"""
+        mm = self._mm
+        start = self._records_offset
+        for offset in range(start, start + self._count * RECORD_SIZE, RECORD_SIZE):
+            yield mm[offset:offset + RECORD_SIZE]
+
+    def items(self):
+        for record in self.records():
+            yield record[:DIGEST_SIZE], record_expiry(record)
+
+    def __contains__(self, digest):
+        return self.lookup(digest)
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        if isinstance(self._fence, memoryview):
+            self._fence.release()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PersistentBlacklist:
+    """Snapshot plus append log, compacted into a new snapshot periodically
+
+    Revocations are appended to ``<path>.log`` and kept in a small overlay
+    until ``compact`` merges them into the snapshot. Replaying the log is
+    idempotent (adds keep the later expiry), so a crash between replacing
+    the snapshot and truncating the log loses nothing.
+    """
+
+    name = "persistent_snapshot"
+
+    def __init__(self, path, compact_after=100000, sync=False, clock=time.time):
+        self.path = path
+        self.log_path = path + ".log"
+        self.compact_after = compact_after
+        self.sync = sync
+        self.clock = clock
+        self._snapshot = BlacklistSnapshot(path) if os.path.exists(path) else None
+        self._overlay = {}  # digest -> expiry, or None once deleted
+        self._count = len(self._snapshot) if self._snapshot else 0
+        self._replay()
+        self._log = open(self.log_path, "ab")
+
+    def _replay(self):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % LOG_RECORD.size  # drop a torn final record
+        for op, digest, exp in LOG_RECORD.iter_unpack(data[:usable]):
+            if op == LOG_ADD:
+                self._apply_insert(digest, exp)
+            else:
+                self._apply_delete(digest)
+        if usable != len(data):
+            with open(self.log_path, "r+b") as f:
+                f.truncate(usable)
+
+    def expiry(self, digest):
+        if digest in self._overlay:
+            return self._overlay[digest]
+        return self._snapshot.expiry(digest) if self._snapshot else None
+
+    def _apply_insert(self, digest, exp):
+        current = self.expiry(digest)
+        if current is None:
+            self._count += 1
+        elif current >= exp:
+            return False
+        self._overlay[digest] = exp
+        return current is None
+
+    def _apply_delete(self, digest):
+        if self.expiry(digest) is None:
+            return False
+        self._overlay[digest] = None
+        self._count -= 1
+        return True
+
+    def _append(self, op, digest, exp):
+        self._log.write(LOG_RECORD.pack(op, digest, exp))
+        self._log.flush()
+        if self.sync:
+            os.fsync(self._log.fileno())
+
+    def insert(self, digest, exp=None):
+        """Add a digest; an existing entry keeps the later expiry"""
+        exp = NEVER if exp is None else int(exp)
+        self._append(LOG_ADD, digest, exp)
+        added = self._apply_insert(digest, exp)
+        if len(self._overlay) >= self.compact_after:
+            self.compact()
+        return added
+
+    def add(self, digest):
+        self.insert(digest)
+
+    def update(self, digests):
+        for digest in digests:
+            self.insert(digest)
+
+    def delete(self, digest):
+        self._append(LOG_DELETE, digest, 0)
+        return self._apply_delete(digest)
+
+    def lookup(self, digest, now=None):
+        exp = self.expiry(digest)
+        return exp is not None and (now is None or exp > now)
+
+    def compact(self, now=None):
+        """Merge the overlay into a new snapshot, dropping expired entries"""
+        now = self.clock() if now is None else now
+        overlay = sorted(self._overlay.items())
+
+        def merged():
+            pending = iter(overlay)
+            nxt = next(pending, None)
+            base = self._snapshot.records() if self._snapshot else ()
+            for record in base:
+                digest = record[:DIGEST_SIZE]
+                while nxt is not None and nxt[0] < digest:
+                    if nxt[1] is not None and nxt[1] > now:
+                        yield pack_record(*nxt)
+                    nxt = next(pending, None)
+                if nxt is not None and nxt[0] == digest:
+                    if nxt[1] is not None and nxt[1] > now:
+                        yield pack_record(*nxt)
+                    nxt = next(pending, None)
+                elif record_expiry(record) > now:
+                    yield bytes(record)
+            while nxt is not None:
+                if nxt[1] is not None and nxt[1] > now:
+                    yield pack_record(*nxt)
+                nxt = next(pending, None)
+
+        count = _write_sorted(self.path, merged())
+        if self._snapshot:
+            self._snapshot.close()
+        self._snapshot = BlacklistSnapshot(self.path)
+        self._log.close()
+        self._log = open(self.log_path, "wb")
+        self._overlay = {}
+        self._count = count
+        return count
+
+    def __contains__(self, digest):
+        return self.lookup(digest)
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        self._log.close()
+        if self._snapshot:
+            self._snapshot.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def synthetic_entries(count, seed=1, start=1704067200, horizon=7 * 24 * 3600):
+    """Seeded random (digest, expiry) pairs, generated in packed chunks"""
+    rng = random.Random(seed)
+    produced = 0
+    while produced < count:
+        n = min(65536, count - produced)
+        packed = rng.randbytes(n * DIGEST_SIZE)
+        for i in range(0, n * DIGEST_SIZE, DIGEST_SIZE):
+            yield packed[i:i + DIGEST_SIZE], start + rng.randrange(horizon)
+        produced += n
+
+
+def write_json_dump(path, entries):
+    """The rebuild baseline: hex digests and expiries as one JSON document"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"entries":[')
+        first = True
+        for digest, exp in entries:
+            f.write(f'{"" if first else ","}["{digest.hex()}",{exp}]')
+            first = False
+        f.write("]}")
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process image
+
+    Linux carries ru_maxrss over from the parent across fork/exec, so the
+    per-image high-water mark in /proc is preferred where it exists.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def cold_start(fmt, path, probes_path):
+    """Load a blacklist as a fresh node would and answer the probes
+
+    Runs in its own process so peak RSS belongs to this load alone.
+    """
+    with open(probes_path, encoding="utf-8") as f:
+        probes = [bytes.fromhex(line) for line in f.read().split()]
+    rss_before = peak_rss_bytes()
+    with timed() as ready:
+        if fmt == "mmap":
+            blacklist = BlacklistSnapshot(path)
+        else:
+            with open(path, encoding="utf-8") as f:
+                entries = json.load(f)["entries"]
+            blacklist = CompactDigestStore(capacity=len(entries))
+            for digest, exp in entries:
+                blacklist.insert(bytes.fromhex(digest), exp)
+            del entries
+    with timed() as first_query:
+        first_hit = blacklist.lookup(probes[0])
+    found = sum(blacklist.lookup(p) for p in probes)
+    lookup = measure_each(blacklist.lookup, probes, batch=64)
+    return {
+        "format": fmt,
+        "entries": len(blacklist),
+        "ready_s": ready["s"],
+        "first_query_s": ready["s"] + first_query["s"],
+        "first_probe_found": first_hit,
+        "probes_found": found,
+        "lookup_mean_ns": lookup["mean_ns"],
+        "lookup_ci_ns": [lookup["ci_low_ns"], lookup["ci_high_ns"]],
+        "rss_before_load_bytes": rss_before,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "load_rss_bytes": peak_rss_bytes() - rss_before,
+    }
+
+
+def benchmark_snapshot(entries=10_000_000, probes=2000, directory=None, seed=1):
+    """Cold start and memory: mapped snapshot vs rebuilding from JSON
+
+    Both files hold the same seeded entries. Each load runs in a fresh
+    interpreter and is timed until the first lookup is answered; half the
+    probes are present. The files were just written, so both loads read
+    from the page cache rather than disk.
+    """
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        snapshot_path = os.path.join(tmp, "blacklist.snap")
+        json_path = os.path.join(tmp, "blacklist.json")
+        probes_path = os.path.join(tmp, "probes.txt")
+
+        with timed() as snapshot_write:
+            written = write_snapshot(snapshot_path, synthetic_entries(entries, seed))
+        with timed() as json_write:
+            write_json_dump(json_path, synthetic_entries(entries, seed))
+        snapshot_bytes = os.path.getsize(snapshot_path)
+        json_bytes = os.path.getsize(json_path)
+
+        rng = random.Random(seed + 1)
+        wanted = set(rng.sample(range(entries), min(probes // 2, entries)))
+        present = [d for i, (d, _) in enumerate(synthetic_entries(entries, seed)) if i in wanted]
+        absent = [rng.randbytes(DIGEST_SIZE) for _ in range(probes - len(present))]
+        mixed = present + absent
+        rng.shuffle(mixed)
+        with open(probes_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(p.hex() for p in mixed))
+
+        loads = {}
+        for fmt, path in (("mmap", snapshot_path), ("json", json_path)):
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "cold-start",
+                                  fmt, path, probes_path],
+                                 check=True, capture_output=True, text=True).stdout
+            loads[fmt] = json.loads(out)
+
+        # Append log and compaction on top of the snapshot
+        with PersistentBlacklist(snapshot_path, compact_after=entries + 1) as persistent:
+            appended = min(100000, entries)
+            appends = measure_each(lambda entry: persistent.insert(*entry),
+                                   synthetic_entries(appended, seed + 2), batch=256)
+            with timed() as compaction:
+                compacted = persistent.compact(now=0)
+
+        return {
+            "entries": written,
+            "snapshot_bytes": snapshot_bytes,
+            "json_bytes": json_bytes,
+            "snapshot_write_s": snapshot_write["s"],
+            "json_write_s": json_write["s"],
+            "cold_start": loads,
+            "cold_start_speedup": loads["json"]["first_query_s"] / loads["mmap"]["first_query_s"],
+            "load_rss_ratio": loads["json"]["load_rss_bytes"] / max(loads["mmap"]["load_rss_bytes"], 1),
+            "log_appends": appended,
+            "log_appends_per_sec": appends["ops_per_sec"],
+            "compacted_entries": compacted,
+            "compaction_s": compaction["s"],
+        }
+
+
+def main():
+    """Benchmark snapshot cold start, or load one (used by the benchmark)"""
+    parser = argparse.ArgumentParser(description="Memory-mapped blacklist snapshot")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    bench = subparsers.add_parser("benchmark", help="cold start vs JSON rebuild")
+    bench.add_argument("--entries", type=int, default=10_000_000)
+    bench.add_argument("--probes", type=int, default=2000)
+    bench.add_argument("--dir", help="where to write the temporary files")
+    bench.add_argument("--seed", type=int, default=1)
+    load = subparsers.add_parser("cold-start", help="load a blacklist file and answer probes")
+    load.add_argument("format", choices=("mmap", "json"))
+    load.add_argument("path")
+    load.add_argument("probes")
+    args = parser.parse_args()
+
+    if args.command == "cold-start":
+        print(json.dumps(cold_start(args.format, args.path, args.probes)))
+    else:
+        print(json.dumps(benchmark_snapshot(args.entries, args.probes, args.dir, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
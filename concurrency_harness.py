@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Concurrent Session Load Harness
+Drives a refresh-token service model from thread-pool, process-pool and
+asyncio workers to expose lost updates and double-issued refresh tokens
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import secrets
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from bench_timing import timed
+
+WORKER_LEVELS = [1, 2, 4, 8, 16, 32, 64]
+MODES = ["thread", "process", "asyncio"]
+
+
+class TokenServiceModel:
+    """Refresh-token service state: families, token ownership, issuance log
+
+    Family records are immutable tuples ``(current_token, rotations,
+    revoked)`` replaced wholesale, so the same code runs over plain dicts or
+    ``multiprocessing.Manager`` proxies. Without a ``lock`` every operation
+    is a read, a simulated I/O pause and a write - the window real
+    database-backed handlers leave open between SELECT and UPDATE. Ids
+    come from the OS CSPRNG unless a seeded ``rng`` is injected.
+    """
+
+    def __init__(self, families=None, tokens=None, issued=None, slots=None,
+                 lock=None, io_delay=0.0, sessions=None, rng=None):
+        self.families = families if families is not None else {}
+        self.tokens = tokens if tokens is not None else {}  # token -> family id
+        self.issued = issued if issued is not None else []  # (parent, child)
+        self.slots = slots if slots is not None else []  # family ids clients hold
+        self.sessions = sessions if sessions is not None else {}  # user -> tuple of family ids
+        self.lock = lock
+        self.io_delay = io_delay
+        self._randbits = (rng or secrets.SystemRandom()).getrandbits
+
+    def _new_id(self):
+        return f"{self._randbits(64):016x}"
+
+    def login(self):
+        family_id = self._new_id()
+        token = self._new_id()
+        self.tokens[token] = family_id
+        self.families[family_id] = (token, 0, False)
+        return family_id, token
+
+    def _read(self, token):
+        family_id = self.tokens.get(token)
+        if family_id is None:
+            return None, None
+        return family_id, self.families[family_id]
+
+    def _write_refresh(self, token, family_id, record):
+        if record is None:
+            return None
+        current, rotations, revoked = record
+        if revoked:
+            return None
+        if current != token:
+            # Reuse of a rotated token: revoke the whole family
+            self.families[family_id] = (current, rotations, True)
+            return None
+        child = self._new_id()
+        self.tokens[child] = family_id
+        self.families[family_id] = (child, rotations + 1, False)
+        self.issued.append((token, child))
+        return child
+
+    def _pause(self):
+        time.sleep(self.io_delay)
+
+    def refresh(self, token):
+        """Rotate ``token``; returns the new token or None if rejected"""
+        if self.lock is not None:
+            with self.lock:
+                state = self._read(token)
+                self._pause()
+                return self._write_refresh(token, *state)
+        state = self._read(token)
+        self._pause()
+        return self._write_refresh(token, *state)
+
+    async def refresh_async(self, token, lock=None):
+        """Coroutine variant of refresh; the I/O pause yields to the loop"""
+        if lock is not None:
+            async with lock:
+                state = self._read(token)
+                await asyncio.sleep(self.io_delay)
+                return self._write_refresh(token, *state)
+        state = self._read(token)
+        await asyncio.sleep(self.io_delay)
+        return self._write_refresh(token, *state)
+
+    def logout(self, family_id):
+        record = self.families.get(family_id)
+        if record is not None:
+            self.families[family_id] = (record[0], record[1], True)
+
+    def _login_user(self, user):
+        family_id, token = self.login()
+        owned = self.sessions.get(user, ())
+        self._pause()
+        self.sessions[user] = tuple(owned) + (family_id,)
+        return family_id, token
+
+    def login_user(self, user):
+        """Log ``user`` in on a new device and add the family to their session index"""
+        if self.lock is not None:
+            with self.lock:
+                return self._login_user(user)
+        return self._login_user(user)
+
+    def _logout_all(self, user):
+        owned = self.sessions.get(user, ())
+        self._pause()
+        for family_id in owned:
+            self.logout(family_id)
+        self.sessions[user] = ()
+
+    def logout_all(self, user):
+        """Revoke every family in the user's session index, then clear it"""
+        if self.lock is not None:
+            with self.lock:
+                return self._logout_all(user)
+        return self._logout_all(user)
+
+    def current_token(self, slot):
+        """Token a client holding ``slot`` would present next"""
+        family_id = self.slots[slot]
+        return family_id, self.families[family_id]
+
+    def audit(self, successes):
+        """Compare callers' view of successful refreshes with stored state"""
+        issued = list(self.issued)
+        children_per_parent = Counter(parent for parent, _ in issued)
+        stored_rotations = sum(record[1] for record in self.families.values())
+        return {
+            "successful_refreshes": successes,
+            "issued_tokens": len(issued),
+            "lost_updates": len(issued) - stored_rotations,
+            "double_issued": sum(n - 1 for n in children_per_parent.values() if n > 1),
+            "families": len(self.families),
+        }
+
+
+def _next_op(model, slot):
+    """Refresh the token held in ``slot``; log in again if it was revoked"""
+    _, (token, _, revoked) = model.current_token(slot)
+    with timed() as latency:
+        child = None if revoked else model.refresh(token)
+        if child is None:
+            new_family, _ = model.login()
+            model.slots[slot] = new_family
+    return child is not None, latency["s"]
+
+
+def _run_ops(model, worker, ops, num_slots):
+    latencies = []
+    successes = 0
+    for n in range(ops):
+        ok, latency = _next_op(model, (worker + n) % num_slots)
+        successes += ok
+        latencies.append(latency)
+    return successes, latencies
+
+
+def _process_worker(args):
+    families, tokens, issued, slots, lock, io_delay, worker, ops, seed = args
+    rng = random.Random(seed) if seed is not None else None
+    model = TokenServiceModel(families, tokens, issued, slots, lock, io_delay, rng=rng)
+    return _run_ops(model, worker, ops, len(slots))
+
+
+def _seed(model, num_families):
+    for _ in range(num_families):
+        family_id, _ = model.login()
+        model.slots.append(family_id)
+
+
+# Runners time the whole contended run (and each op's latency) once with
+# timed(): throughput under contention is the measurement, so it is not
+# resampled
+def run_threads(workers, ops, num_families, safe, io_delay, rng=None):
+    model = TokenServiceModel(lock=threading.Lock() if safe else None, io_delay=io_delay, rng=rng)
+    _seed(model, num_families)
+    with timed() as elapsed:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda w: _run_ops(model, w, ops, num_families), range(workers)))
+    return model, results, elapsed["s"]
+
+
+def run_processes(workers, ops, num_families, safe, io_delay, rng=None):
+    with multiprocessing.Manager() as manager:
+        model = TokenServiceModel(manager.dict(), manager.dict(), manager.list(), manager.list(),
+                                  manager.Lock() if safe else None, io_delay, rng=rng)
+        _seed(model, num_families)
+        shared = (model.families, model.tokens, model.issued, model.slots, model.lock, io_delay)
+        # Each worker draws ids from its own stream, seeded from ``rng``
+        seeds = [rng.getrandbits(64) if rng is not None else None for _ in range(workers)]
+        with timed() as elapsed:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_process_worker,
+                                        [shared + (w, ops, seeds[w]) for w in range(workers)]))
+        # Copy out of the manager before it shuts down
+        local = TokenServiceModel(dict(model.families), dict(model.tokens), list(model.issued))
+    return local, results, elapsed["s"]
+
+
+def run_asyncio(workers, ops, num_families, safe, io_delay, rng=None):
+    model = TokenServiceModel(io_delay=io_delay, rng=rng)
+    _seed(model, num_families)
+
+    async def worker(index, lock):
+        latencies = []
+        successes = 0
+        for n in range(ops):
+            slot = (index + n) % num_families
+            _, (token, _, revoked) = model.current_token(slot)
+            with timed() as latency:
+                child = None if revoked else await model.refresh_async(token, lock)
+                if child is None:
+                    model.slots[slot], _ = model.login()
+            successes += child is not None
+            latencies.append(latency["s"])
+        return successes, latencies
+
+    async def drive():
+        lock = asyncio.Lock() if safe else None
+        return await asyncio.gather(*(worker(i, lock) for i in range(workers)))
+
+    with timed() as elapsed:
+        results = asyncio.run(drive())
+    return model, results, elapsed["s"]
+
+
+def race_same_token(workers, safe, io_delay=0.001, rng=None):
+    """Many requests refresh the same token at once; one should win"""
+    model = TokenServiceModel(lock=threading.Lock() if safe else None, io_delay=io_delay, rng=rng)
+    _, token = model.login()
+    barrier = threading.Barrier(workers)
+
+    def attempt(_):
+        barrier.wait()
+        return model.refresh(token)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        children = [c for c in pool.map(attempt, range(workers)) if c is not None]
+    report = model.audit(len(children))
+    report["violation"] = len(children) > 1
+    return report
+
+
+def race_refresh_logout(workers, safe, io_delay=0.001, rng=None):
+    """Refreshes in flight while the family logs out; logout must stick"""
+    model = TokenServiceModel(lock=threading.Lock() if safe else None, io_delay=io_delay, rng=rng)
+    family_id, token = model.login()
+    barrier = threading.Barrier(workers + 1)
+
+    def attempt(_):
+        barrier.wait()
+        return model.refresh(token)
+
+    def logout():
+        barrier.wait()
+        time.sleep(io_delay / 2)  # land inside the refresh read/write window
+        if model.lock is not None:
+            with model.lock:
+                model.logout(family_id)
+        else:
+            model.logout(family_id)
+
+    with ThreadPoolExecutor(max_workers=workers + 1) as pool:
+        logout_future = pool.submit(logout)
+        children = [c for c in pool.map(attempt, range(workers)) if c is not None]
+        logout_future.result()
+    report = model.audit(len(children))
+    report["family_revoked_after_logout"] = model.families[family_id][2]
+    report["violation"] = not model.families[family_id][2]
+    return report
+
+
+def race_login_logout(workers, safe, io_delay=0.001, rng=None):
+    """Logins on new devices while the same user logs out everywhere
+
+    Session state is consistent when every family still live is in the
+    user's session index, so a later logout can still reach it. Without a
+    lock, logins racing each other or the logout drop index entries and
+    leave orphaned live sessions.
+    """
+    model = TokenServiceModel(lock=threading.Lock() if safe else None, io_delay=io_delay, rng=rng)
+    user = "user-1"
+    existing = [model.login_user(user)[0] for _ in range(workers // 2)]
+    barrier = threading.Barrier(workers)
+
+    def attempt(index):
+        barrier.wait()
+        if index == 0:
+            model.logout_all(user)
+            return None
+        return model.login_user(user)[0]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        created = [f for f in pool.map(attempt, range(workers)) if f is not None]
+    indexed = set(model.sessions.get(user, ()))
+    live = [f for f in existing + created if not model.families[f][2]]
+    orphaned = [f for f in live if f not in indexed]
+    return {
+        "logins": len(created),
+        "logouts": 1,
+        "live_sessions": len(live),
+        "indexed_sessions": len(indexed),
+        "orphaned_sessions": len(orphaned),
+        "violation": bool(orphaned),
+    }
+
+
+RUNNERS = {"thread": run_threads, "process": run_processes, "asyncio": run_asyncio}
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_scenario(mode, workers, ops=200, num_families=4, safe=False, io_delay=0.0, rng=None):
+    """Run one contention level and audit the resulting service state"""
+    model, results, elapsed = RUNNERS[mode](workers, ops, num_families, safe, io_delay, rng)
+    successes = sum(r[0] for r in results)
+    latencies = sorted(lat for r in results for lat in r[1])
+    report = {
+        "mode": mode,
+        "workers": workers,
+        "locking": "lock" if safe else "none",
+        "operations": len(latencies),
+        "throughput_ops_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_latency_ms": _percentile(latencies, 0.50) * 1000,
+        "p99_latency_ms": _percentile(latencies, 0.99) * 1000,
+        "max_latency_ms": (latencies[-1] if latencies else 0.0) * 1000,
+    }
+    report.update(model.audit(successes))
+    return report
+
+
+def run_sweep(modes=MODES, levels=WORKER_LEVELS, ops=200, num_families=4, io_delay=0.0001, rng=None):
+    """Sweep worker counts for each mode with and without locking
+
+    The default ``io_delay`` (100 µs between read and write, as a storage
+    round trip would take) keeps the race window open; with none, unlocked
+    thread runs rarely lose an update. Token ids are drawn from ``rng``
+    when one is given.
+    """
+    results = []
+    for mode in modes:
+        for safe in (False, True):
+            for workers in levels:
+                results.append(run_scenario(mode, workers, ops, num_families, safe, io_delay, rng))
+    return results
+
+
+def main():
+    """Run the concurrency sweep"""
+    parser = argparse.ArgumentParser(description="Concurrent refresh-token load harness")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--workers", type=int, nargs="+", default=WORKER_LEVELS)
+    parser.add_argument("--ops", type=int, default=200, help="operations per worker")
+    parser.add_argument("--families", type=int, default=4, help="shared token families")
+    parser.add_argument("--io-delay", type=float, default=0.0001, help="seconds between read and write")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = run_sweep(args.modes, args.workers, args.ops, args.families, args.io_delay)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<8}{'lock':<6}{'workers':>8}{'ops/s':>10}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'lost':>7}{'double':>8}")
+    for r in results:
+        print(f"{r['mode']:<8}{r['locking']:<6}{r['workers']:>8}{r['throughput_ops_per_sec']:>10.0f}"
+              f"{r['p50_latency_ms']:>9.3f}{r['p99_latency_ms']:>9.3f}"
+              f"{r['lost_updates']:>7}{r['double_issued']:>8}")
+
+
+if __name__ == "__main__":
+    main()
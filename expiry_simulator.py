@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Token Expiry Window Simulator
+Discrete-event simulation on a virtual clock that plays out days of token
+issuance, rotation, logout and theft per expiry policy, reporting blacklist
+size over time, peak memory and attacker exposure windows
+"""
+
+import argparse
+import heapq
+import json
+import random
+
+from bench_timing import timed, traced_allocations
+from token_blacklist import DIGEST_SIZE, CompactDigestStore, hash_token
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# (access token lifetime, refresh token lifetime) in seconds
+POLICIES = {
+    "current": (7 * DAY, 30 * DAY),
+    "recommended": (15 * MINUTE, 7 * DAY),
+}
+
+# Digest, expiry and index slot per CompactDigestStore entry
+BYTES_PER_ENTRY = DIGEST_SIZE + 8 + 8
+
+
+class ExpirySimulation:
+    """Sessions for ``users`` users driven by a heap of timestamped events
+
+    Each session refreshes its access token when it expires (rotating the
+    refresh token), and ends in a logout or is abandoned. Logouts blacklist
+    the live access token until it expires and the refresh family until its
+    refresh token would have. Thefts either copy the access token, which
+    stays usable until it expires or the theft is detected, or use the
+    refresh token first, which is caught as reuse at the victim's next
+    refresh. Blacklist entries are dropped when their token expires.
+    """
+
+    def __init__(self, access_ttl, refresh_ttl, users=1000, duration=14 * DAY,
+                 session_mean=2 * DAY, idle_mean=12 * HOUR, logout_ratio=0.5,
+                 thefts_per_session=0.05, detection_mean=6 * HOUR,
+                 sample_interval=6 * HOUR, seed=1):
+        self.access_ttl = access_ttl
+        self.refresh_ttl = refresh_ttl
+        self.users = users
+        self.duration = duration
+        self.session_mean = session_mean
+        self.idle_mean = idle_mean
+        self.logout_ratio = logout_ratio
+        self.thefts_per_session = thefts_per_session
+        self.detection_mean = detection_mean
+        self.sample_interval = sample_interval
+        self.rng = random.Random(seed)
+
+        self.now = 0.0
+        self._queue = []
+        self._seq = 0
+        self._next_id = 0
+        self.blacklist = CompactDigestStore()
+        # family -> [user, access id, access exp, refresh exp, end, stolen_at]
+        self.sessions = {}
+        self.counts = dict.fromkeys(
+            ["logins", "refreshes", "logouts", "abandoned", "thefts", "reuse_detected",
+             "blacklisted", "unlisted"], 0)
+        self.exposures = {"access": [], "refresh": []}
+        self.timeline = []
+        self.peak_queue = 0
+
+    def schedule(self, at, kind, *args):
+        """Queue ``kind`` at virtual time ``at``; ties run in schedule order"""
+        if at <= self.duration:
+            self._seq += 1
+            heapq.heappush(self._queue, (at, self._seq, kind, args))
+
+    def _new_id(self):
+        self._next_id += 1
+        return self._next_id
+
+    def _blacklist(self, label, ident, until):
+        if until > self.now and self.blacklist.insert(hash_token(f"{label}-{ident}"), int(until)):
+            self.counts["blacklisted"] += 1
+            self.schedule(until, "unlist", label, ident)
+
+    def on_login(self, user):
+        family = self._new_id()
+        length = self.rng.expovariate(1 / self.session_mean)
+        end = self.now + length
+        self.sessions[family] = [user, self._new_id(), self.now + self.access_ttl,
+                                 self.now + self.refresh_ttl, end, None]
+        self.counts["logins"] += 1
+        self.schedule(min(self.now + self.access_ttl, end), "refresh", family)
+        self.schedule(end, "end", family)
+        if self.rng.random() < self.thefts_per_session:
+            self.schedule(self.now + self.rng.uniform(0, length), "theft", family)
+
+    def on_refresh(self, family):
+        session = self.sessions.get(family)
+        if session is None or self.now >= session[4]:
+            return
+        if session[5] is not None:
+            # Victim presents a refresh token the attacker already rotated
+            self.counts["reuse_detected"] += 1
+            self._revoke(family, session)
+            return
+        session[1] = self._new_id()
+        session[2] = self.now + self.access_ttl
+        session[3] = self.now + self.refresh_ttl
+        self.counts["refreshes"] += 1
+        self.schedule(min(session[2], session[4]), "refresh", family)
+
+    def on_end(self, family):
+        session = self.sessions.get(family)
+        if session is None:
+            return
+        if self.rng.random() < self.logout_ratio:
+            self.counts["logouts"] += 1
+            self._revoke(family, session, relogin=False)
+        else:
+            self.counts["abandoned"] += 1
+            if session[5] is None:
+                del self.sessions[family]
+            # else the attacker keeps the family alive until detection
+        self.schedule(self.now + self.rng.expovariate(1 / self.idle_mean), "login", session[0])
+
+    def on_theft(self, family):
+        session = self.sessions.get(family)
+        if session is None:
+            return
+        self.counts["thefts"] += 1
+        detect = self.now + self.rng.expovariate(1 / self.detection_mean)
+        if self.rng.random() < 0.5:
+            # Copied access token: usable until it expires or is blacklisted
+            exp = session[2]
+            self.exposures["access"].append(min(exp, detect) - self.now)
+            self.schedule(detect, "detect_access", session[1], exp)
+        else:
+            session[5] = self.now
+            self.schedule(detect, "detect_refresh", family)
+
+    def on_detect_access(self, access_id, exp):
+        self._blacklist("access", access_id, exp)
+
+    def on_detect_refresh(self, family):
+        session = self.sessions.get(family)
+        if session is not None and session[5] is not None:
+            self._revoke(family, session, relogin=self.now < session[4])
+
+    def _revoke(self, family, session, relogin=True):
+        """Blacklist the session's access token and family, ending the session"""
+        if session[5] is not None:
+            self.exposures["refresh"].append(self.now - session[5])
+        self._blacklist("access", session[1], session[2])
+        self._blacklist("family", family, session[3])
+        del self.sessions[family]
+        if relogin:
+            # The victim is forced to log in again; its end event becomes a no-op
+            self.schedule(self.now + self.rng.expovariate(1 / self.idle_mean), "login", session[0])
+
+    def on_unlist(self, label, ident):
+        if self.blacklist.delete(hash_token(f"{label}-{ident}")):
+            self.counts["unlisted"] += 1
+
+    def on_sample(self):
+        self.timeline.append((round(self.now / HOUR, 2), len(self.blacklist)))
+        self.schedule(self.now + self.sample_interval, "sample")
+
+    def run(self):
+        """Process events until the queue drains or ``duration`` is reached"""
+        for user in range(self.users):
+            self.schedule(self.rng.uniform(0, self.idle_mean), "login", user)
+        self.schedule(0.0, "sample")
+        handlers = {name[3:]: getattr(self, name) for name in dir(self) if name.startswith("on_")}
+        processed = 0
+        queue = self._queue
+        while queue:
+            self.peak_queue = max(self.peak_queue, len(queue))
+            self.now, _, kind, args = heapq.heappop(queue)
+            handlers[kind](*args)
+            processed += 1
+        return processed
+
+
+def _summary(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean_minutes": round(sum(ordered) / len(ordered) / MINUTE, 1),
+        "p95_minutes": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] / MINUTE, 1),
+        "max_minutes": round(ordered[-1] / MINUTE, 1),
+    }
+
+
+def simulate_policy(policy, users=1000, days=14, seed=1, trace_memory=True, **options):
+    """Run one policy and report blacklist growth, memory and exposure
+
+    With ``trace_memory`` the simulation runs once under tracemalloc for its
+    peak allocation, then again untraced (same seed) for the timing.
+    """
+    access_ttl, refresh_ttl = POLICIES[policy]
+
+    def build():
+        return ExpirySimulation(access_ttl, refresh_ttl, users=users, duration=days * DAY,
+                                seed=seed, **options)
+
+    peak_bytes = None
+    if trace_memory:
+        with traced_allocations() as usage:
+            build().run()
+        peak_bytes = usage["peak"]
+
+    sim = build()
+    with timed() as run_time:
+        processed = sim.run()
+    elapsed = run_time["s"]
+    sizes = [size for _, size in sim.timeline]
+    peak_entries = max(sizes, default=0)
+    return {
+        "policy": policy,
+        "access_ttl_s": access_ttl,
+        "refresh_ttl_s": refresh_ttl,
+        "users": users,
+        "simulated_days": days,
+        "events": processed,
+        "wall_time_s": round(elapsed, 3),
+        "simulated_days_per_sec": round(days / elapsed, 1) if elapsed else 0.0,
+        "counts": sim.counts,
+        "blacklist_timeline": sim.timeline,
+        "peak_blacklist_entries": peak_entries,
+        "peak_blacklist_bytes": peak_entries * BYTES_PER_ENTRY,
+        "peak_event_queue": sim.peak_queue,
+        "peak_traced_bytes": peak_bytes,
+        "exposure": {kind: _summary(values) for kind, values in sim.exposures.items()},
+    }
+
+
+def compare_policies(policies=tuple(POLICIES), users=1000, days=14, seed=1, trace_memory=True,
+                     **options):
+    """Simulate each policy on the same seeded workload"""
+    return [simulate_policy(policy, users, days, seed, trace_memory, **options) for policy in policies]
+
+
+def main():
+    """Compare expiry policies with the discrete-event simulator"""
+    parser = argparse.ArgumentParser(description="Token expiry policy simulator (virtual clock)")
+    parser.add_argument("--policies", nargs="+", choices=list(POLICIES), default=list(POLICIES))
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=float, default=14)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--thefts-per-session", type=float, default=0.05)
+    parser.add_argument("--no-trace-memory", action="store_true", help="skip the tracemalloc pass")
+    args = parser.parse_args()
+
+    print(json.dumps(compare_policies(args.policies, args.users, args.days, args.seed,
+                                      not args.no_trace_memory,
+                                      thefts_per_session=args.thefts_per_session), indent=2))
+
+
+if __name__ == "__main__":
+    main()
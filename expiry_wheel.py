@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Token Expiry Timing Wheel
+Hierarchical timing wheel that expires blacklisted hashes and refresh-token
+families by ``exp`` instead of sweeping every entry on a fixed interval
+"""
+
+import argparse
+import json
+import random
+
+from bench_timing import measure_each
+from token_blacklist import CompactDigestStore, fake_token, hash_token
+
+
+class TimingWheel:
+    """Hierarchical timing wheel keyed by expiry timestamp
+
+    Level 0 has one slot per tick; each higher level covers ``wheel_size``
+    slots of the level below. Entries sit at the coarsest level that can
+    hold them and cascade down as time approaches, so advancing one tick
+    only touches the entries due in that tick plus, every ``wheel_size``
+    ticks, one bucket being redistributed from the level above.
+    """
+
+    def __init__(self, tick=1, wheel_size=64, levels=4, start=0):
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.levels = levels
+        self.current = int(start // tick)
+        self._spans = [wheel_size ** level for level in range(levels + 1)]
+        self._buckets = [[[] for _ in range(wheel_size)] for _ in range(levels)]
+        self._overflow = []  # beyond the span of the top level
+        self._due = []  # scheduled at or before the current tick
+        self._pending = {}  # key -> schedules not yet fired or cancelled
+        self._cancelled = {}  # key -> cancelled schedules still in buckets
+        self._count = 0  # schedules in buckets, cancelled ones included
+        self._skipping = 0
+
+    def __len__(self):
+        return self._count - self._skipping
+
+    def schedule(self, key, exp):
+        """Schedule ``key`` to expire at timestamp ``exp``"""
+        self._count += 1
+        self._pending[key] = self._pending.get(key, 0) + 1
+        self._place(key, int(exp // self.tick))
+
+    def cancel(self, key):
+        """Drop every pending schedule of ``key`` lazily; False if there was none
+
+        Cancelled schedules are skipped when their buckets fire. Schedules
+        made for the key after cancel() are not told apart from them, so
+        one that fires first absorbs a skip.
+        """
+        scheduled = self._pending.pop(key, 0)
+        if not scheduled:
+            return False
+        self._cancelled[key] = self._cancelled.get(key, 0) + scheduled
+        self._skipping += scheduled
+        return True
+
+    def _place(self, key, ticks):
+        delta = ticks - self.current
+        if delta <= 0:
+            self._due.append(key)
+            return
+        spans = self._spans
+        for level in range(self.levels):
+            if delta < spans[level + 1]:
+                slot = (ticks // spans[level]) % self.wheel_size
+                if level == 0:
+                    self._buckets[0][slot].append(key)
+                else:
+                    self._buckets[level][slot].append((key, ticks))
+                return
+        self._overflow.append((key, ticks))
+
+    def _cascade(self):
+        """Redistribute higher-level buckets that became current"""
+        spans = self._spans
+        for level in range(1, self.levels):
+            if self.current % spans[level]:
+                break
+            slot = (self.current // spans[level]) % self.wheel_size
+            bucket = self._buckets[level][slot]
+            self._buckets[level][slot] = []
+            for key, ticks in bucket:
+                self._place(key, ticks)
+        else:
+            if self._overflow and self.current % spans[self.levels] == 0:
+                overflow, self._overflow = self._overflow, []
+                for key, ticks in overflow:
+                    self._place(key, ticks)
+
+    def _collect(self, keys, expired):
+        if not keys:
+            return
+        pending = self._pending
+        cancelled = self._cancelled
+        for key in keys:
+            skips = cancelled.get(key)
+            if skips:
+                if skips == 1:
+                    del cancelled[key]
+                else:
+                    cancelled[key] = skips - 1
+                self._skipping -= 1
+                continue
+            remaining = pending[key] - 1
+            if remaining:
+                pending[key] = remaining
+            else:
+                del pending[key]
+            expired.append(key)
+        self._count -= len(keys)
+
+    def advance(self, now):
+        """Advance the wheel to ``now`` and return the keys that expired"""
+        target = int(now // self.tick)
+        expired = []
+        due, self._due = self._due, []
+        self._collect(due, expired)
+        level0 = self._buckets[0]
+        while self.current < target:
+            if self._count == 0:
+                # Nothing pending: jump straight to the target tick
+                self.current = target
+                break
+            self.current += 1
+            if self.current % self.wheel_size == 0:
+                self._cascade()
+            slot = self.current % self.wheel_size
+            bucket = level0[slot]
+            if bucket:
+                level0[slot] = []
+                self._collect(bucket, expired)
+            if self._due:
+                due, self._due = self._due, []
+                self._collect(due, expired)
+        return expired
+
+
+class ExpiryEngine:
+    """Expire blacklisted digests and refresh-token families on one wheel"""
+
+    TOKEN = "token"
+    FAMILY = "family"
+
+    def __init__(self, blacklist=None, families=None, tick=1, start=0):
+        self.blacklist = blacklist if blacklist is not None else CompactDigestStore()
+        self.families = families if families is not None else {}  # id -> exp
+        self.wheel = TimingWheel(tick=tick, start=start)
+
+    def revoke_token(self, digest, exp):
+        """Blacklist a token digest until its own ``exp``; re-revoking extends it"""
+        previous = self.blacklist.expiry(digest)
+        self.blacklist.insert(digest, exp)
+        # Earlier schedules find the later expiry and leave the digest alone
+        if previous is None or exp > previous:
+            self.wheel.schedule((self.TOKEN, digest), exp)
+
+    def track_family(self, family_id, exp):
+        """Track a refresh-token family until ``exp``; rotation extends it"""
+        if exp > self.families.get(family_id, exp - 1):
+            self.families[family_id] = exp
+            self.wheel.schedule((self.FAMILY, family_id), exp)
+
+    def tick(self, now):
+        """Drop everything that expired by ``now``; returns counts by kind"""
+        removed = {self.TOKEN: 0, self.FAMILY: 0}
+        families = self.families
+        for kind, key in self.wheel.advance(now):
+            if kind == self.TOKEN:
+                removed[kind] += self.blacklist.delete(key, now=now)
+            elif families.get(key, now + 1) <= now:
+                # Earlier schedules of a rotated family find a later exp
+                del families[key]
+                removed[kind] += 1
+        return removed
+
+
+def check_engine(tokens=20000, families=2000, horizon=3600, extend_ratio=0.2, seed=1):
+    """Drive an ExpiryEngine through re-revocations and family rotations
+
+    A share of the digests is revoked again with a later ``exp`` and every
+    other family is rotated to a later expiry. The engine is ticked once a
+    second past the horizon; at each checkpoint the blacklist and family
+    table must hold exactly the entries whose latest expiry is still ahead,
+    and both must end empty.
+    """
+    rng = random.Random(seed)
+    engine = ExpiryEngine()
+    expiry = {}
+    for i in range(tokens):
+        digest = hash_token(fake_token(i))
+        exp = rng.randrange(1, horizon)
+        engine.revoke_token(digest, exp)
+        expiry[digest] = exp
+        if rng.random() < extend_ratio:
+            later = exp + rng.randrange(1, horizon)
+            engine.revoke_token(digest, later)
+            expiry[digest] = later
+    family_expiry = {}
+    for family in range(families):
+        exp = rng.randrange(1, horizon)
+        engine.track_family(family, exp)
+        if family % 2:
+            exp += rng.randrange(1, horizon)
+            engine.track_family(family, exp)
+        family_expiry[family] = exp
+
+    mismatches = 0
+    removed = {ExpiryEngine.TOKEN: 0, ExpiryEngine.FAMILY: 0}
+    end = 2 * horizon + 1
+    for now in range(1, end + 1):
+        for kind, count in engine.tick(now).items():
+            removed[kind] += count
+        if now % 256 == 0 or now == end:
+            live = sum(1 for exp in expiry.values() if exp > now)
+            live_families = sum(1 for exp in family_expiry.values() if exp > now)
+            mismatches += (len(engine.blacklist) != live) + (len(engine.families) != live_families)
+    return {
+        "tokens": tokens,
+        "families": families,
+        "tokens_expired": removed[ExpiryEngine.TOKEN],
+        "families_expired": removed[ExpiryEngine.FAMILY],
+        "checkpoint_mismatches": mismatches,
+        "left_in_blacklist": len(engine.blacklist),
+        "left_families": len(engine.families),
+        "left_in_wheel": len(engine.wheel),
+        "consistent": mismatches == 0 and not engine.blacklist and not engine.families
+                      and len(engine.wheel) == 0,
+    }
+
+
+def full_sweep(entries, now):
+    """Baseline cleanup: scan every entry and delete the expired ones"""
+    expired = [key for key, exp in entries.items() if exp <= now]
+    for key in expired:
+        del entries[key]
+    return len(expired)
+
+
+def _pauses(fn, times):
+    """Longest and total pause, in seconds, of ``fn(now)`` called once per ``times``"""
+    if not times:
+        return 0.0, 0.0
+    timing = measure_each(fn, times, batch=1, warmup=0)
+    return timing["max_ns"] / 1e9, timing["total_ns"] / 1e9
+
+
+def benchmark_cleanup(num_entries, horizon=7 * 24 * 3600, duration=4 * 3600,
+                      sweep_interval=3600, tick=1, seed=1):
+    """Compare a periodic full sweep with a timing wheel
+
+    ``num_entries`` expiries are spread uniformly over ``horizon`` seconds
+    and both strategies are driven through ``duration`` simulated seconds.
+    The sweep runs every ``sweep_interval``; the wheel advances every tick.
+    ``expiry_engine`` checks the ExpiryEngine built on the wheel (see
+    check_engine) at up to 20000 tokens.
+    """
+    rng = random.Random(seed)
+    expiries = [rng.randrange(1, horizon) for _ in range(num_entries)]
+
+    entries = dict(enumerate(expiries))
+    sweep_times = range(sweep_interval, duration + 1, sweep_interval)
+    sweep_removed = 0
+
+    def sweep(now):
+        nonlocal sweep_removed
+        sweep_removed += full_sweep(entries, now)
+
+    sweep_max, sweep_total = _pauses(sweep, sweep_times)
+    del entries
+
+    wheel = TimingWheel(tick=tick)
+    schedule = measure_each(lambda item: wheel.schedule(*item), enumerate(expiries), batch=256)
+    wheel_times = range(tick, duration + 1, tick)
+    wheel_removed = 0
+
+    def advance(now):
+        nonlocal wheel_removed
+        wheel_removed += len(wheel.advance(now))
+
+    wheel_max, wheel_total = _pauses(advance, wheel_times)
+    return {
+        "entries": num_entries,
+        "simulated_seconds": duration,
+        "full_sweep": {
+            "interval_seconds": sweep_interval,
+            "runs": len(sweep_times),
+            "expired": sweep_removed,
+            "max_pause_ms": sweep_max * 1000,
+            "total_cpu_s": sweep_total,
+            "expired_per_sec": sweep_removed / sweep_total if sweep_total else 0.0,
+            # Expired entries linger up to one full interval after exp
+            "max_staleness_seconds": sweep_interval,
+        },
+        "timing_wheel": {
+            "tick_seconds": tick,
+            "runs": len(wheel_times),
+            "expired": wheel_removed,
+            "schedule_per_sec": schedule["ops_per_sec"],
+            "max_pause_ms": wheel_max * 1000,
+            "total_cpu_s": wheel_total,
+            "expired_per_sec": wheel_removed / wheel_total if wheel_total else 0.0,
+            "max_staleness_seconds": tick,
+        },
+        "expiry_engine": check_engine(min(num_entries, 20000), seed=seed),
+    }
+
+
+def main():
+    """Run the cleanup benchmark"""
+    parser = argparse.ArgumentParser(description="Timing wheel vs full sweep cleanup benchmark")
+    parser.add_argument("--entries", type=int, default=10_000_000)
+    parser.add_argument("--horizon", type=int, default=7 * 24 * 3600, help="expiry spread in seconds")
+    parser.add_argument("--duration", type=int, default=4 * 3600, help="simulated seconds")
+    parser.add_argument("--sweep-interval", type=int, default=3600)
+    args = parser.parse_args()
+
+    result = benchmark_cleanup(args.entries, args.horizon, args.duration, args.sweep_interval)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Audit Instrumentation
+Opt-in counters, fixed-memory latency histograms, tracemalloc peaks and
+cProfile capture for test methods and the simulated token operations
+(hash, lookup, rotate, revoke), exported as a report section and a pstats
+dump
+"""
+
+import argparse
+import cProfile
+import functools
+import importlib
+import json
+import math
+import os
+import pstats
+import sys
+import time
+from array import array
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+from bench_timing import traced_allocations
+
+# Values below 2**SUB_BITS ns are counted exactly; above that every power
+# of two is split into 2**(SUB_BITS - 1) buckets (under 1.6% error)
+SUB_BITS = 7
+# Largest value kept apart, ~18 minutes in ns; anything longer lands in the last bucket
+MAX_BITS = 40
+
+# (operation, module, attribute) patched while instrumentation is active.
+# Calls are timed per target and counted per operation; nothing is patched
+# otherwise, so the disabled path costs nothing.
+TOKEN_HOOKS = (
+    ("hash", "token_blacklist", "hash_token"),
+    ("hash", "token_hashing", "hash_batch"),
+    ("lookup", "token_blacklist", "HashSetBlacklist.__contains__"),
+    ("lookup", "token_blacklist", "SortedArrayBlacklist.__contains__"),
+    ("lookup", "token_blacklist", "BloomFilterBlacklist.__contains__"),
+    ("lookup", "token_blacklist", "CompactDigestStore.lookup"),
+    ("lookup", "blacklist_snapshot", "BlacklistSnapshot.lookup"),
+    ("lookup", "blacklist_snapshot", "PersistentBlacklist.lookup"),
+    ("lookup", "resp_blacklist", "RespBlacklist.is_revoked"),
+    ("rotate", "token_families", "FamilyManager.rotate"),
+    ("rotate", "jwt_keyring", "KeyRing.rotate"),
+    ("revoke", "token_blacklist", "CompactDigestStore.insert"),
+    ("revoke", "blacklist_snapshot", "PersistentBlacklist.insert"),
+    ("revoke", "token_families", "FamilyManager.revoke_family"),
+    ("revoke", "resp_blacklist", "RespBlacklist.revoke"),
+    ("revoke", "verified_token_cache", "VerifiedTokenCache.revoke_token"),
+    ("revoke", "expiry_wheel", "ExpiryEngine.revoke_token"),
+)
+
+_active = None
+
+
+class Histogram:
+    """HDR-style log-linear histogram of non-negative integers (ns)
+
+    A fixed array of counters sized by SUB_BITS/MAX_BITS, so recording
+    never allocates and histograms from worker processes merge by adding
+    counts. Updates are not locked: threads racing on one bucket can lose
+    a count.
+    """
+
+    def __init__(self, sub_bits=SUB_BITS, max_bits=MAX_BITS):
+        self.sub_bits = sub_bits
+        self._linear = 1 << sub_bits
+        self._half = 1 << (sub_bits - 1)
+        self._counts = array("Q", bytes(8 * (self._linear + (max_bits - sub_bits) * self._half)))
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value):
+        if value < self._linear:
+            return value
+        shift = value.bit_length() - self.sub_bits
+        index = self._linear + (shift - 1) * self._half + (value >> shift) - self._half
+        return min(index, len(self._counts) - 1)
+
+    def _value(self, index):
+        """Midpoint of the values counted in bucket ``index``"""
+        if index < self._linear:
+            return index
+        shift, offset = divmod(index - self._linear, self._half)
+        shift += 1
+        low = (self._half + offset) << shift
+        return low + ((1 << shift) - 1) // 2
+
+    def record(self, value):
+        self._counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if len(other._counts) != len(self._counts):
+            raise ValueError("Histograms have different bucket layouts")
+        counts = self._counts
+        for index, n in enumerate(other._counts):
+            if n:
+                counts[index] += n
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    def percentile(self, fraction):
+        """Smallest recorded bucket value with at least ``fraction`` of counts at or below it"""
+        if not self.count:
+            return None
+        target = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for index, n in enumerate(self._counts):
+            seen += n
+            if seen >= target:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ns": self.total / self.count,
+            "min_ns": self.min,
+            "p50_ns": self.percentile(0.50),
+            "p90_ns": self.percentile(0.90),
+            "p99_ns": self.percentile(0.99),
+            "p999_ns": self.percentile(0.999),
+            "max_ns": self.max,
+            "total_s": self.total / 1e9,
+        }
+
+
+class _RawStats:
+    """Profile stand-in so pstats can load a stats dict shipped from a worker"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def _resolve(module, attribute):
+    """(owner, name, original) for "func" or "Class.method" in ``module``"""
+    if isinstance(module, str):
+        module = importlib.import_module(module)
+    owner = module
+    *path, name = attribute.split(".")
+    for part in path:
+        owner = getattr(owner, part)
+    return owner, name, vars(owner)[name]
+
+
+def _timed(instrumentation, operation, name, fn):
+    histogram = instrumentation.histogram(name)
+    counters = instrumentation.counters
+    perf_counter_ns = time.perf_counter_ns
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = perf_counter_ns()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            histogram.record(perf_counter_ns() - start)
+            counters[operation] += 1
+
+    return wrapper
+
+
+def _top_functions(stats, limit):
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [{
+        "function": f"{os.path.basename(filename)}:{line}({function})",
+        "calls": calls,
+        "tottime_s": tottime,
+        "cumtime_s": cumtime,
+    } for (filename, line, function), (_, calls, tottime, cumtime, _) in rows]
+
+
+class Instrumentation:
+    """Collects counters, latency histograms and memory peaks while active
+
+    ``with instrumentation:`` patches ``hooks`` in, makes this the target
+    of span() / instrumented(), and runs cProfile when ``profile`` is set;
+    leaving the block restores everything. Calls made in other processes
+    (worker pools started by a benchmark) are not seen. ``trace_memory``
+    runs spans under tracemalloc, which slows allocation-heavy code several
+    times over, so latencies from such a run are only comparable with each
+    other.
+    """
+
+    def __init__(self, hooks=TOKEN_HOOKS, trace_memory=False, profile=False):
+        self.hooks = hooks
+        self.trace_memory = trace_memory
+        self.profile = profile
+        self.counters = Counter()
+        self.histograms = {}
+        self.memory_peaks = {}
+        self._stats = None
+        self._profiler = None
+        self._patches = []
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def record(self, name, ns):
+        self.histogram(name).record(ns)
+
+    @contextmanager
+    def span(self, name, trace_memory=None):
+        """Time (and with tracemalloc, measure) the block as ``name``"""
+        trace = self.trace_memory if trace_memory is None else trace_memory
+        histogram = self.histogram(name)
+        memory = traced_allocations() if trace else nullcontext({})
+        with memory as usage:
+            start = time.perf_counter_ns()
+            try:
+                yield
+            finally:
+                histogram.record(time.perf_counter_ns() - start)
+        if "peak" in usage:
+            self.memory_peaks[name] = max(self.memory_peaks.get(name, 0), usage["peak"])
+
+    def _swap(self, owner, name, original, replacement):
+        setattr(owner, name, replacement)
+        self._patches.append((owner, name, original))
+
+    def install(self):
+        """Patch every hook, including copies bound by ``from module import name``"""
+        for operation, module, attribute in self.hooks:
+            owner, name, original = _resolve(module, attribute)
+            label = f"{operation}.{attribute}"
+            wrapper = _timed(self, operation, label, original)
+            self._swap(owner, name, original, wrapper)
+            if isinstance(owner, type):
+                continue
+            for other in list(sys.modules.values()):
+                namespace = getattr(other, "__dict__", None)
+                if namespace is None or other is owner:
+                    continue
+                for key, value in list(namespace.items()):
+                    if value is original:
+                        self._swap(other, key, original, wrapper)
+            # Module-level registries (name -> function) hold references too
+            for registry in [v for v in vars(owner).values() if isinstance(v, dict)]:
+                for key, value in list(registry.items()):
+                    if value is original:
+                        registry[key] = wrapper
+                        self._patches.append((registry, key, original))
+
+    def uninstall(self):
+        while self._patches:
+            owner, name, original = self._patches.pop()
+            if isinstance(owner, dict):
+                owner[name] = original
+            else:
+                setattr(owner, name, original)
+
+    def __enter__(self):
+        global _active
+        if _active is not None:
+            raise RuntimeError("Instrumentation is already active")
+        self.install()
+        _active = self
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._add_stats(pstats.Stats(self._profiler))
+            self._profiler = None
+        _active = None
+        self.uninstall()
+
+    def _add_stats(self, stats):
+        if self._stats is None:
+            self._stats = stats
+        else:
+            self._stats.add(stats)
+
+    def export(self):
+        """Picklable state, for merge() in another process"""
+        return {
+            "counters": dict(self.counters),
+            "histograms": self.histograms,
+            "memory_peaks": self.memory_peaks,
+            "profile": self._stats.stats if self._stats is not None else None,
+        }
+
+    def merge(self, exported):
+        self.counters.update(exported["counters"])
+        for name, histogram in exported["histograms"].items():
+            self.histogram(name).merge(histogram)
+        for name, peak in exported["memory_peaks"].items():
+            self.memory_peaks[name] = max(self.memory_peaks.get(name, 0), peak)
+        if exported["profile"]:
+            self._add_stats(pstats.Stats(_RawStats(exported["profile"])))
+
+    def report(self, top=15):
+        """Report section: counters, latency percentiles, memory peaks, hottest functions"""
+        section = {
+            "counters": dict(sorted(self.counters.items())),
+            "latency": {name: h.summary() for name, h in sorted(self.histograms.items()) if h.count},
+            "memory_peak_bytes": dict(sorted(self.memory_peaks.items())),
+        }
+        if self._stats is not None:
+            section["profile_top_cumulative"] = _top_functions(self._stats, top)
+        return section
+
+    def dump_stats(self, path):
+        """Write the merged cProfile data for ``python -m pstats`` / snakeviz"""
+        if self._stats is None:
+            raise ValueError("No profile was captured (profile=False)")
+        self._stats.dump_stats(path)
+
+
+def active():
+    """The Instrumentation currently collecting, or None"""
+    return _active
+
+
+def span(name):
+    """Context manager timing the block on the active instrumentation, if any"""
+    if _active is None:
+        return nullcontext()
+    return _active.span(name)
+
+
+def instrumented(name=None):
+    """Decorator: run the function inside span(``name`` or its qualname)"""
+    def decorate(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return fn(*args, **kwargs)
+            with _active.span(label):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def main():
+    """Instrument a synthetic token workload and print the section"""
+    parser = argparse.ArgumentParser(description="Token operation instrumentation demo")
+    parser.add_argument("--tokens", type=int, default=50000)
+    parser.add_argument("--trace-memory", action="store_true", help="record tracemalloc peaks")
+    parser.add_argument("--profile", metavar="PATH", help="also write cProfile data here")
+    args = parser.parse_args()
+
+    with Instrumentation(trace_memory=args.trace_memory, profile=bool(args.profile)) as instrumentation:
+        # Imported once the hooks are in, so the names bound here are the wrappers
+        from token_blacklist import CompactDigestStore, fake_token, hash_token
+        from token_families import FamilyManager
+
+        with span("workload"):
+            store = CompactDigestStore(capacity=args.tokens)
+            for i in range(args.tokens):
+                store.insert(hash_token(fake_token(i)))
+            for i in range(0, 2 * args.tokens, 2):
+                store.lookup(hash_token(fake_token(i)))
+            manager = FamilyManager()
+            for _ in range(args.tokens // 10):
+                family, token = manager.create_family(user_id=1)
+                manager.rotate(family, token)
+                manager.revoke_family(family)
+    print(json.dumps(instrumentation.report(), indent=2))
+    if args.profile:
+        instrumentation.dump_stats(args.profile)
+
+
+if __name__ == "__main__":
+    main()
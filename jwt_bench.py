@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+JWT Sign/Verify Throughput Benchmark
+Pure-stdlib HS256/HS512 implementation (hmac + base64url) and a benchmark
+suite that writes machine-readable baselines for regression checks
+"""
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import platform
+import secrets
+import sys
+import time
+from datetime import datetime
+
+from bench_timing import measure_each
+from token_blacklist import CompactDigestStore, hash_token
+
+ALGORITHMS = {"HS256": hashlib.sha256, "HS512": hashlib.sha512}
+
+# Claim layout used by the API (see security_analysis.analyze_jwt_security)
+REQUIRED_CLAIMS = ["id", "type", "iat", "exp"]
+OPTIONAL_CLAIMS = ["phone", "email", "tokenId", "tokenFamily"]
+
+CLAIM_SETS = {
+    "required": REQUIRED_CLAIMS,
+    "with_family": REQUIRED_CLAIMS + ["tokenId", "tokenFamily"],
+    "full": REQUIRED_CLAIMS + OPTIONAL_CLAIMS,
+}
+PAYLOAD_PADDING = {"small": 0, "medium": 256, "large": 2048}
+OPERATIONS = ["sign", "verify", "decode", "blacklist_check", "verify_and_check"]
+
+
+class JWTError(Exception):
+    """Token is malformed, has a bad signature, or fails claim checks"""
+
+
+def b64url_encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def b64url_decode(data):
+    if isinstance(data, str):
+        data = data.encode()
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+def _json(obj):
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def sign(claims, secret, alg="HS256", kid=None):
+    """Encode and sign claims as a compact JWS"""
+    if alg not in ALGORITHMS:
+        raise JWTError(f"Unsupported algorithm: {alg}")
+    if isinstance(secret, str):
+        secret = secret.encode()
+    header = {"alg": alg, "typ": "JWT"}
+    if kid is not None:
+        header["kid"] = kid
+    signing_input = b64url_encode(_json(header)) + b"." + b64url_encode(_json(claims))
+    signature = hmac.new(secret, signing_input, ALGORITHMS[alg]).digest()
+    return (signing_input + b"." + b64url_encode(signature)).decode()
+
+
+def split_token(token):
+    """Return (header, signing_input, signature) without verifying"""
+    if isinstance(token, str):
+        token = token.encode()
+    try:
+        signing_input, _, signature = token.rpartition(b".")
+        header_part = signing_input.split(b".", 1)[0]
+        header = json.loads(b64url_decode(header_part))
+        return header, signing_input, b64url_decode(signature)
+    except (ValueError, TypeError) as exc:
+        raise JWTError("Malformed token") from exc
+
+
+def decode_claims(token):
+    """Decode the payload without checking the signature"""
+    if isinstance(token, str):
+        token = token.encode()
+    parts = token.split(b".")
+    if len(parts) != 3:
+        raise JWTError("Malformed token")
+    try:
+        return json.loads(b64url_decode(parts[1]))
+    except ValueError as exc:
+        raise JWTError("Malformed payload") from exc
+
+
+def verify_signature(token, secret, alg="HS256"):
+    """Check the HMAC in constant time; the header must name ``alg``"""
+    header, signing_input, signature = split_token(token)
+    if header.get("alg") != alg:
+        raise JWTError("Unexpected algorithm")
+    if isinstance(secret, str):
+        secret = secret.encode()
+    expected = hmac.new(secret, signing_input, ALGORITHMS[alg]).digest()
+    if not hmac.compare_digest(expected, signature):
+        raise JWTError("Invalid signature")
+    return header
+
+
+def verify(token, secret, alg="HS256", now=None, required=REQUIRED_CLAIMS):
+    """Verify signature and expiry; returns the decoded claims"""
+    verify_signature(token, secret, alg)
+    return check_claims(decode_claims(token), now, required)
+
+
+def check_claims(claims, now=None, required=REQUIRED_CLAIMS):
+    """Require ``required`` claims and an unexpired ``exp``; returns claims"""
+    missing = [claim for claim in required if claim not in claims]
+    if missing:
+        raise JWTError(f"Missing claims: {', '.join(missing)}")
+    now = time.time() if now is None else now
+    if claims.get("exp", now + 1) <= now:
+        raise JWTError("Token expired")
+    return claims
+
+
+def make_claims(claim_set, padding=0, index=0, now=None):
+    """Build a claim dict for a named claim set plus ``padding`` bytes of data"""
+    now = int(time.time() if now is None else now)
+    values = {
+        "id": f"user-{index:08d}",
+        "type": "customer",
+        "iat": now,
+        "exp": now + 15 * 60,
+        "phone": "+962790000000",
+        "email": f"user{index}@example.com",
+        "tokenId": secrets.token_hex(16),
+        "tokenFamily": secrets.token_hex(16),
+    }
+    claims = {name: values[name] for name in CLAIM_SETS[claim_set]}
+    if padding:
+        claims["data"] = "x" * padding
+    return claims
+
+
+def _rate(fn, items, repeats):
+    """Throughput of fn over ``repeats`` passes of items, in items/sec, and its stdev"""
+    timing = measure_each(fn, list(items) * repeats)
+    rate = timing["ops_per_sec"]
+    return rate, rate * timing["stdev_ns"] / timing["mean_ns"] if timing["mean_ns"] else 0.0
+
+
+def benchmark_case(alg, claim_set, payload, tokens=2000, repeats=5, revoked=10000):
+    """Measure every operation for one algorithm / claim set / payload size"""
+    secret = secrets.token_bytes(64)
+    now = time.time()
+    claims = [make_claims(claim_set, PAYLOAD_PADDING[payload], i, now) for i in range(tokens)]
+    signed = [sign(c, secret, alg) for c in claims]
+
+    blacklist = CompactDigestStore(capacity=revoked + tokens)
+    blacklist.update(hash_token(f"revoked-{i}") for i in range(revoked))
+    for token in signed[::10]:
+        blacklist.insert(hash_token(token))
+
+    def check(token):
+        return hash_token(token) in blacklist
+
+    def verify_and_check(token):
+        verify(token, secret, alg, now)
+        return check(token)
+
+    ops = {
+        "sign": (lambda c: sign(c, secret, alg), claims),
+        "verify": (lambda t: verify(t, secret, alg, now), signed),
+        "decode": (decode_claims, signed),
+        "blacklist_check": (check, signed),
+        "verify_and_check": (verify_and_check, signed),
+    }
+    results = []
+    for op in OPERATIONS:
+        fn, items = ops[op]
+        rate, spread = _rate(fn, items, repeats)
+        results.append({
+            "op": op,
+            "alg": alg,
+            "claims": claim_set,
+            "payload": payload,
+            "token_bytes": round(sum(len(t) for t in signed) / len(signed)),
+            "tokens_per_sec": round(rate, 1),
+            "stdev_tokens_per_sec": round(spread, 1),
+        })
+    return results
+
+
+def run_suite(algs=tuple(ALGORITHMS), claim_sets=tuple(CLAIM_SETS),
+              payloads=tuple(PAYLOAD_PADDING), tokens=2000, repeats=5):
+    results = []
+    for alg in algs:
+        for claim_set in claim_sets:
+            for payload in payloads:
+                results.extend(benchmark_case(alg, claim_set, payload, tokens, repeats))
+    return {
+        "meta": {
+            "suite": "jwt_bench",
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "tokens": tokens,
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def _case_key(result):
+    return (result["op"], result["alg"], result["claims"], result["payload"])
+
+
+def compare_to_baseline(current, baseline, tolerance=0.15):
+    """List cases whose throughput dropped more than ``tolerance`` below baseline"""
+    previous = {_case_key(r): r["tokens_per_sec"] for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get(_case_key(result))
+        if not before:
+            continue
+        change = result["tokens_per_sec"] / before - 1
+        if change < -tolerance:
+            regressions.append({
+                "op": result["op"], "alg": result["alg"],
+                "claims": result["claims"], "payload": result["payload"],
+                "baseline_tokens_per_sec": before,
+                "tokens_per_sec": result["tokens_per_sec"],
+                "change": round(change, 3),
+            })
+    return regressions
+
+
+def main():
+    """Run the JWT benchmark suite"""
+    parser = argparse.ArgumentParser(description="HS256/HS512 JWT throughput benchmark")
+    parser.add_argument("--algs", nargs="+", choices=sorted(ALGORITHMS), default=list(ALGORITHMS))
+    parser.add_argument("--claims", nargs="+", choices=list(CLAIM_SETS), default=list(CLAIM_SETS))
+    parser.add_argument("--payloads", nargs="+", choices=list(PAYLOAD_PADDING), default=list(PAYLOAD_PADDING))
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--baseline-out", help="write results as a baseline JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    current = run_suite(args.algs, args.claims, args.payloads, args.tokens, args.repeats)
+    if args.baseline_out:
+        with open(args.baseline_out, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+
+    print(f"{'op':<18}{'alg':<7}{'claims':<13}{'payload':<9}{'bytes':>7}{'tokens/s':>12}")
+    for r in current["results"]:
+        print(f"{r['op']:<18}{r['alg']:<7}{r['claims']:<13}{r['payload']:<9}"
+              f"{r['token_bytes']:>7}{r['tokens_per_sec']:>12.0f}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare_to_baseline(current, json.load(f), args.tolerance)
+        print(json.dumps({"regressions": regressions}, indent=2))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+JWT Secret Rotation Keyring
+Active and retiring HMAC secrets indexed by ``kid`` with precomputed key
+states, constant-time verification, and a benchmark of verify throughput
+by key count with and without kid routing
+"""
+
+import argparse
+import hmac
+import json
+import random
+import secrets
+import time
+
+from bench_timing import measure_each
+from jwt_bench import (ALGORITHMS, REQUIRED_CLAIMS, JWTError, b64url_encode, check_claims,
+                       decode_claims, make_claims, sign, split_token)
+
+ACTIVE = "active"
+RETIRING = "retiring"
+
+
+class SigningKey:
+    """One secret plus its HMAC state with the key already absorbed
+
+    ``hmac.new`` hashes the padded key into fresh inner/outer states on
+    every call; copying a prepared object skips that per token.
+    """
+
+    __slots__ = ("kid", "alg", "state", "status", "retire_at")
+
+    def __init__(self, kid, secret, alg="HS256"):
+        if alg not in ALGORITHMS:
+            raise JWTError(f"Unsupported algorithm: {alg}")
+        if isinstance(secret, str):
+            secret = secret.encode()
+        self.kid = kid
+        self.alg = alg
+        self.state = hmac.new(secret, digestmod=ALGORITHMS[alg])
+        self.status = ACTIVE
+        self.retire_at = None
+
+    def retired(self, now):
+        return self.retire_at is not None and self.retire_at <= now
+
+    def mac(self, signing_input):
+        h = self.state.copy()
+        h.update(signing_input)
+        return h.digest()
+
+
+class KeyRing:
+    """Signing keys by ``kid``: one active, any number still verifying
+
+    ``rotate`` makes a new key active and keeps the previous one verifying
+    for ``grace`` seconds so tokens signed just before the rotation stay
+    valid until they expire. Tokens carry their ``kid``, so verification
+    goes straight to one key; with ``route=False`` (or a token without a
+    kid) every key is tried, and all of them are compared so the time taken
+    does not reveal which key matched. Kids and secrets come from the OS
+    CSPRNG unless a seeded ``rng`` is injected.
+    """
+
+    def __init__(self, grace=15 * 60, clock=time.time, rng=None):
+        self.grace = grace
+        self.clock = clock
+        self._rng = rng or secrets.SystemRandom()
+        self._keys = {}
+        self.active = None
+
+    def add(self, kid, secret, alg="HS256", active=True):
+        key = SigningKey(kid, secret, alg)
+        self._keys[kid] = key
+        if active:
+            self.rotate_to(kid)
+        else:
+            key.status = RETIRING
+        return key
+
+    def rotate_to(self, kid):
+        """Make ``kid`` the signing key; the previous one starts retiring"""
+        previous = self.active
+        if previous is not None and previous.kid != kid:
+            previous.status = RETIRING
+            previous.retire_at = self.clock() + self.grace
+        key = self._keys[kid]
+        key.status = ACTIVE
+        key.retire_at = None
+        self.active = key
+
+    def rotate(self, secret=None, alg="HS256"):
+        """Add a fresh random secret as the active key; returns its kid"""
+        kid = f"{self._rng.getrandbits(64):016x}"
+        self.add(kid, secret or self._rng.randbytes(64), alg)
+        return kid
+
+    def prune(self):
+        """Drop retiring keys whose grace period has ended"""
+        now = self.clock()
+        expired = [kid for kid, key in self._keys.items()
+                   if key.retire_at is not None and key.retire_at <= now]
+        for kid in expired:
+            del self._keys[kid]
+        return expired
+
+    def sign(self, claims):
+        key = self.active
+        if key is None:
+            raise JWTError("No active signing key")
+        header = {"alg": key.alg, "typ": "JWT", "kid": key.kid}
+        signing_input = (b64url_encode(json.dumps(header, separators=(",", ":")).encode()) + b"."
+                         + b64url_encode(json.dumps(claims, separators=(",", ":")).encode()))
+        return (signing_input + b"." + b64url_encode(key.mac(signing_input))).decode()
+
+    def verify_signature(self, token, route=True):
+        """Return the kid that signed ``token``; raises JWTError otherwise
+
+        A key past its grace period is rejected even before prune() drops it.
+        """
+        header, signing_input, signature = split_token(token)
+        kid = header.get("kid")
+        if route and kid is not None:
+            key = self._keys.get(kid)
+            if key is None or key.alg != header.get("alg"):
+                raise JWTError("Unknown signing key")
+            if not hmac.compare_digest(key.mac(signing_input), signature):
+                raise JWTError("Invalid signature")
+            if key.retired(self.clock()):
+                raise JWTError("Retired signing key")
+            return kid
+        matched = None
+        for key in self._keys.values():
+            if key.alg == header.get("alg") and hmac.compare_digest(key.mac(signing_input), signature):
+                matched = key
+        if matched is None:
+            raise JWTError("Invalid signature")
+        if matched.retired(self.clock()):
+            raise JWTError("Retired signing key")
+        return matched.kid
+
+    def verify(self, token, now=None, required=REQUIRED_CLAIMS, route=True):
+        """Verify signature against the ring, then required claims and expiry"""
+        self.verify_signature(token, route)
+        return check_claims(decode_claims(token), now, required)
+
+    def __contains__(self, kid):
+        return kid in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def check_grace_period(grace=60, advance=3600):
+    """Whether a token signed by a rotated-out key verifies before and after its grace period
+
+    Runs on a manual clock, with prune() never called, in both the
+    kid-routed and try-every-key paths.
+    """
+    issued = 1_700_000_000.0
+    now = [issued]
+    ring = KeyRing(grace=grace, clock=lambda: now[0])
+    ring.rotate()
+    token = ring.sign(make_claims("with_family", index=0, now=issued))
+    ring.rotate()
+
+    def verifies(route):
+        # Claims are checked at issue time so only the key's age decides
+        try:
+            ring.verify(token, issued, route=route)
+            return True
+        except JWTError:
+            return False
+
+    within = {"routed": verifies(True), "try_all": verifies(False)}
+    now[0] += advance
+    after = {"routed": verifies(True), "try_all": verifies(False)}
+    return {
+        "grace_s": grace,
+        "clock_advanced_s": advance,
+        "verifies_within_grace": within,
+        "verifies_after_grace": after,
+        "retired_key_rejected": not any(after.values()),
+    }
+
+
+def _verifies_per_sec(verify, tokens, repeats):
+    return measure_each(verify, list(tokens) * repeats)["ops_per_sec"]
+
+
+def benchmark_keyring(key_counts=(1, 2, 10), tokens=2000, repeats=5, alg="HS256", seed=1,
+                      clock=time.time):
+    """Verify throughput by key count: kid routing vs trying every key
+
+    Tokens are signed by keys picked at random from the ring, as during a
+    rotation window. ``per_call_hmac`` is the single-secret baseline that
+    builds a fresh ``hmac.new`` per token, as jwt_bench.verify does. Keys
+    come from ``seed`` and token times from ``clock``.
+    """
+    rng = random.Random(seed)
+    now = clock()
+    results = []
+    for count in key_counts:
+        ring = KeyRing(clock=clock, rng=rng)
+        kids = [ring.rotate(alg=alg) for _ in range(count)]
+        signed = []
+        for i in range(tokens):
+            ring.rotate_to(rng.choice(kids))
+            signed.append(ring.sign(make_claims("with_family", index=i, now=now)))
+
+        routed = _verifies_per_sec(lambda t: ring.verify(t, now), signed, repeats)
+        try_all = _verifies_per_sec(lambda t: ring.verify(t, now, route=False), signed, repeats)
+        results.append({
+            "keys": count,
+            "alg": alg,
+            "kid_routed_verifies_per_sec": round(routed, 1),
+            "try_all_verifies_per_sec": round(try_all, 1),
+            "routing_speedup": round(routed / try_all, 2) if try_all else 0.0,
+        })
+
+    secret = rng.randbytes(64)
+    baseline = [sign(make_claims("with_family", index=i, now=now), secret, alg) for i in range(tokens)]
+
+    def per_call(token):
+        _, signing_input, signature = split_token(token)
+        expected = hmac.new(secret, signing_input, ALGORITHMS[alg]).digest()
+        if not hmac.compare_digest(expected, signature):
+            raise JWTError("Invalid signature")
+        return check_claims(decode_claims(token), now)
+
+    ring = KeyRing(clock=clock)
+    ring.add("k0", secret, alg)
+    return {
+        "tokens": tokens,
+        "per_call_hmac_verifies_per_sec": round(_verifies_per_sec(per_call, baseline, repeats), 1),
+        "precomputed_single_key_verifies_per_sec": round(
+            _verifies_per_sec(lambda t: ring.verify(t, now, route=False), baseline, repeats), 1),
+        "by_key_count": results,
+    }
+
+
+def main():
+    """Benchmark keyring verification"""
+    parser = argparse.ArgumentParser(description="JWT keyring verify benchmark")
+    parser.add_argument("--keys", type=int, nargs="+", default=[1, 2, 10])
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--alg", choices=sorted(ALGORITHMS), default="HS256")
+    args = parser.parse_args()
+
+    print(json.dumps(benchmark_keyring(args.keys, args.tokens, args.repeats, args.alg), indent=2))
+
+
+if __name__ == "__main__":
+    main()
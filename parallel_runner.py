@@ -0,0 +1,217 @@
+"""
+Parallel Security Test Runner
+Discovers ``test_*`` methods on a tester class, runs each in its own
+process with isolated result state, and merges results in a fixed order
+"""
+
+import io
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bench_timing import timed
+from instrumentation import Instrumentation
+from report_stream import RecordSet
+
+# Records per chunk sent back by a worker, and chunks a worker may have in
+# flight before it waits for the parent to write them out
+CHUNK_RECORDS = 256
+CHANNEL_DEPTH = 4
+
+
+class _ForwardReport:
+    """Report for an in-process test: results go straight to the main tester"""
+
+    def __init__(self, tester):
+        self.tester = tester
+
+    def begin(self, *args):
+        pass
+
+    def emit_result(self, test_name, data):
+        self.tester._record_result(test_name, data)
+
+    def emit_records(self, test_name, records):
+        self.tester._record_records(test_name, records)
+
+    def end(self):
+        pass
+
+
+class _ChannelReport:
+    """Report for a test in a worker process
+
+    Results and progress lines are put on a bounded queue in the order the
+    test produces them, and record sections go in chunks of
+    ``CHUNK_RECORDS``, so a worker never holds a whole section and blocks
+    until the parent has written earlier chunks out. ``end()`` marks the
+    test as finished.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def begin(self, *args):
+        pass
+
+    def write(self, text):
+        self.queue.put(("log", None, text))
+
+    def flush(self):
+        pass
+
+    def emit_result(self, test_name, data):
+        self.queue.put(("result", test_name, data))
+
+    def emit_records(self, test_name, records):
+        self.queue.put(("records", test_name, None))
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= CHUNK_RECORDS:
+                self.queue.put(("chunk", test_name, chunk))
+                chunk = []
+        if chunk:
+            self.queue.put(("chunk", test_name, chunk))
+        self.queue.put(("end", test_name, None))
+
+    def end(self):
+        self.queue.put(("done", None, None))
+
+
+def _chunks(queue):
+    while True:
+        kind, _, chunk = queue.get()
+        if kind == "end":
+            return
+        yield from chunk
+
+
+def _replay(tester, queue):
+    """Pass one worker's output to ``tester`` as it arrives, until the test is done"""
+    while True:
+        kind, test_name, data = queue.get()
+        if kind == "done":
+            return
+        if kind == "log":
+            tester.log.write(data)
+        elif kind == "result":
+            tester._record_result(test_name, data)
+        elif kind == "records":
+            tester._record_records(test_name, _chunks(queue))
+
+
+def discover_tests(tester_cls):
+    """Return test method names in definition order"""
+    names = []
+    for klass in reversed(tester_cls.__mro__):
+        for name, value in vars(klass).items():
+            if name.startswith("test_") and callable(value) and name not in names:
+                names.append(name)
+    return names
+
+
+def run_isolated(tester_cls, test_name, init=None, instrument=None, report=None, log=None):
+    """Run one test on a fresh tester and return its state and timings
+
+    ``init`` holds extra constructor arguments (e.g. a seeded context) and
+    must be picklable when tests run in worker processes. ``instrument``
+    holds Instrumentation options; when given, the test runs inside a
+    span of its own and the collected data comes back for merging. With a
+    ``report`` (and ``log``) the test streams its results and progress
+    there instead of returning them; ``report.end()`` is called when the
+    test finishes, even if it fails.
+    """
+    captured = io.StringIO() if log is None else None
+    tester = tester_cls(report=report, log=log or captured, **(init or {}))
+    instrumentation = Instrumentation(**instrument) if instrument is not None else None
+    cpu_start = time.process_time()
+    with timed() as elapsed:
+        try:
+            if instrumentation is None:
+                getattr(tester, test_name)()
+            else:
+                with instrumentation, instrumentation.span(f"test.{test_name}"):
+                    getattr(tester, test_name)()
+        finally:
+            if report is not None:
+                report.end()
+    cpu = time.process_time() - cpu_start
+    wall = elapsed["s"]
+    return {
+        "test": test_name,
+        "test_results": tester.test_results,
+        "vulnerabilities": tester.vulnerabilities,
+        "recommendations": tester.recommendations,
+        "log": captured.getvalue() if captured is not None else "",
+        "wall_time_s": wall,
+        "cpu_time_s": cpu,
+        "instrumentation": instrumentation.export() if instrumentation is not None else None,
+    }
+
+
+def merge_outcome(tester, outcome):
+    """Fold one isolated test outcome into the main tester"""
+    tester.log.write(outcome["log"])
+    for result in outcome["test_results"]:
+        for test_name, data in result.items():
+            if isinstance(data, RecordSet):
+                tester._record_records(test_name, data)
+            else:
+                tester._record_result(test_name, data)
+    tester.vulnerabilities.extend(outcome["vulnerabilities"])
+    tester.recommendations.extend(outcome["recommendations"])
+    tester.test_timings.append({
+        "test": outcome["test"],
+        "wall_time_s": round(outcome["wall_time_s"], 4),
+        "cpu_time_s": round(outcome["cpu_time_s"], 4),
+    })
+    if outcome["instrumentation"] is not None:
+        tester.instrumentation.merge(outcome["instrumentation"])
+
+
+def run_tests(tester, tests=None, workers=None, init=None, instrument=None):
+    """Run tests against ``tester`` and merge their state in discovery order
+
+    ``workers=1`` runs in-process one after another, each test writing
+    straight to ``tester``'s report; otherwise each test runs in a process
+    pool and streams its output back over a bounded queue, which the parent
+    drains one test at a time. Either way vulnerabilities, results and
+    timings are merged in the order the tests are defined, so reports are
+    deterministic regardless of which test finishes first. With
+    ``instrument`` options, each test's instrumentation is merged into
+    ``tester.instrumentation``.
+    """
+    tester_cls = type(tester)
+    tests = tests or discover_tests(tester_cls)
+    with timed() as elapsed:
+        if workers == 1:
+            forward = _ForwardReport(tester)
+            for name in tests:
+                merge_outcome(tester, run_isolated(tester_cls, name, init, instrument,
+                                                   forward, tester.log))
+        else:
+            # The manager is shut down first on the way out, so if a test fails,
+            # workers blocked on queues nobody drains any more fail instead of hanging
+            with ProcessPoolExecutor(max_workers=workers) as pool, multiprocessing.Manager() as manager:
+                channels = [_ChannelReport(manager.Queue(CHANNEL_DEPTH)) for _ in tests]
+                futures = [pool.submit(run_isolated, tester_cls, name, init, instrument, channel, channel)
+                           for name, channel in zip(tests, channels)]
+                # Tests are submitted in order, so the one being drained always
+                # has a worker; later ones wait on their full queues meanwhile
+                try:
+                    for future, channel in zip(futures, channels):
+                        _replay(tester, channel.queue)
+                        merge_outcome(tester, future.result())
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+    total_wall = elapsed["s"]
+    total_cpu = sum(t["cpu_time_s"] for t in tester.test_timings)
+    return {
+        "workers": workers or "auto",
+        "tests": len(tests),
+        "wall_time_s": round(total_wall, 4),
+        "sum_of_test_cpu_s": round(total_cpu, 4),
+    }
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Streaming Security Report Writers
+Emit audit results incrementally as each test finishes, either as
+human-readable sections or as JSON Lines, without holding results in memory
+"""
+
+import json
+import sys
+from collections.abc import Iterable, Mapping
+from datetime import datetime
+
+REPORT_TITLE = "BEAUTYCORT API SESSION SECURITY AUDIT REPORT"
+
+
+def _json_key(key):
+    """Object key as json.dumps would render it"""
+    if isinstance(key, str):
+        return json.dumps(key)
+    if key is None or isinstance(key, bool):
+        return json.dumps(json.dumps(key))
+    return json.dumps(str(key))
+
+
+def iter_json(obj, indent=None, _level=0):
+    """Serialize obj to JSON chunk by chunk
+
+    Output matches ``json.dumps(obj, indent=indent, default=str)`` for plain
+    data, but generators and other lazy iterables are encoded as arrays while
+    they are consumed, so arbitrarily long simulations never have to be
+    materialized as lists first.
+    """
+    if isinstance(obj, Mapping):
+        pairs = ((_json_key(key) + ": ", value) for key, value in obj.items())
+        open_, close = "{", "}"
+    elif isinstance(obj, Iterable) and not isinstance(obj, (str, bytes, bytearray)):
+        pairs = (("", value) for value in obj)
+        open_, close = "[", "]"
+    else:
+        yield json.dumps(obj, default=str)
+        return
+
+    if indent is None:
+        inner, outer, separator = "", "", ", "
+    else:
+        inner = "\n" + " " * (indent * (_level + 1))
+        outer = "\n" + " " * (indent * _level)
+        separator = ","
+    first = True
+    for prefix, value in pairs:
+        yield (open_ if first else separator) + inner + prefix
+        yield from iter_json(value, indent, _level + 1)
+        first = False
+    yield open_ + close if first else outer + close
+
+
+class RecordSet(list):
+    """Records of a streamed section, materialized to be reported later
+
+    Used when there is no report to stream to yet (e.g. a test run in a
+    worker process), so the section is still emitted with ``emit_records``.
+    """
+
+
+class PrettyReport:
+    """Human-readable report; each test section is written when it finishes"""
+
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self._results_started = False
+        self._records_started = False
+
+    def _write(self, text=""):
+        self.out.write(text + "\n")
+
+    def _section(self, test_name):
+        if not self._results_started:
+            self._write("\n" + "-" * 40)
+            self._write("DETAILED TEST RESULTS")
+            self._write("-" * 40)
+            self._results_started = True
+        self._write(f"\n{test_name.upper().replace('_', ' ')}:")
+
+    def begin(self, title=REPORT_TITLE, started=None):
+        started = started or datetime.now()
+        self._write("\n" + "=" * 60)
+        self._write(title)
+        self._write("=" * 60)
+        self._write(f"\nAUDIT DATE: {started.strftime('%Y-%m-%d %H:%M:%S')}")
+        self.out.flush()
+
+    def emit_result(self, test_name, data):
+        self._section(test_name)
+        for chunk in iter_json(data, indent=2):
+            self.out.write(chunk)
+        self._write()
+        self.out.flush()
+
+    def emit_records(self, test_name, records):
+        """Stream a large record set as one JSON array, a record at a time"""
+        self.begin_records(test_name)
+        for record in records:
+            self.emit_record(test_name, record)
+        self.end_records(test_name)
+
+    def begin_records(self, test_name):
+        self._section(test_name)
+        self._records_started = False
+
+    def emit_record(self, test_name, record):
+        self.out.write(("," if self._records_started else "[") + "\n  ")
+        for chunk in iter_json(record, indent=2, _level=1):
+            self.out.write(chunk)
+        self._records_started = True
+
+    def end_records(self, test_name):
+        self._write("\n]" if self._records_started else "[]")
+        self.out.flush()
+
+    def emit_summary(self, total_tests, vulnerabilities, recommendations, implementation_status):
+        self._write(f"\nTOTAL TESTS: {total_tests}")
+        self._write(f"VULNERABILITIES FOUND: {len(vulnerabilities)}")
+
+        self._write("\n" + "-" * 40)
+        self._write("VULNERABILITIES SUMMARY")
+        self._write("-" * 40)
+        for i, vuln in enumerate(vulnerabilities, 1):
+            self._write(f"{i}. {vuln}")
+
+        self._write("\n" + "-" * 40)
+        self._write("CRITICAL SECURITY RECOMMENDATIONS")
+        self._write("-" * 40)
+        for rec in recommendations:
+            self._write(rec)
+
+        self._write("\n" + "-" * 40)
+        self._write("SECURITY IMPLEMENTATION STATUS")
+        self._write("-" * 40)
+        for status, items in implementation_status.items():
+            self._write(f"\n{status}:")
+            for item in items:
+                self._write(f"  - {item}")
+
+    def end(self):
+        self._write("\n" + "=" * 60)
+        self._write("END OF SECURITY AUDIT REPORT")
+        self._write("=" * 60)
+        self.out.flush()
+
+
+class JsonLinesReport:
+    """One JSON object per line: begin, one per test result, summary, end"""
+
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+
+    def _emit(self, record):
+        for chunk in iter_json(record):
+            self.out.write(chunk)
+        self.out.write("\n")
+        self.out.flush()
+
+    def begin(self, title=REPORT_TITLE, started=None):
+        started = started or datetime.now()
+        self._emit({"type": "begin", "title": title, "audit_date": started.isoformat()})
+
+    def emit_result(self, test_name, data):
+        self._emit({"type": "result", "test": test_name, "data": data})
+
+    def emit_records(self, test_name, records):
+        """Stream a large record set as one line per record"""
+        for record in records:
+            self.emit_record(test_name, record)
+
+    def begin_records(self, test_name):
+        pass
+
+    def emit_record(self, test_name, record):
+        self._emit({"type": "record", "test": test_name, "data": record})
+
+    def end_records(self, test_name):
+        pass
+
+    def emit_summary(self, total_tests, vulnerabilities, recommendations, implementation_status):
+        self._emit({
+            "type": "summary",
+            "total_tests": total_tests,
+            "vulnerabilities": vulnerabilities,
+            "recommendations": recommendations,
+            "implementation_status": implementation_status,
+        })
+
+    def end(self):
+        self._emit({"type": "end"})
+
+
+class TeeReport:
+    """Forward every report call to several writers"""
+
+    def __init__(self, *reports):
+        self.reports = reports
+
+    def begin(self, *args):
+        for report in self.reports:
+            report.begin(*args)
+
+    def emit_result(self, test_name, data):
+        for report in self.reports:
+            report.emit_result(test_name, data)
+
+    def emit_records(self, test_name, records):
+        # One pass over the records, each handed to every writer in turn
+        self.begin_records(test_name)
+        for record in records:
+            self.emit_record(test_name, record)
+        self.end_records(test_name)
+
+    def begin_records(self, test_name):
+        for report in self.reports:
+            report.begin_records(test_name)
+
+    def emit_record(self, test_name, record):
+        for report in self.reports:
+            report.emit_record(test_name, record)
+
+    def end_records(self, test_name):
+        for report in self.reports:
+            report.end_records(test_name)
+
+    def emit_summary(self, *args):
+        for report in self.reports:
+            report.emit_summary(*args)
+
+    def end(self):
+        for report in self.reports:
+            report.end()
+
+
+REPORT_FORMATS = {"pretty": PrettyReport, "jsonl": JsonLinesReport}
+
+
+def create_report(fmt="pretty", out=None):
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"Unknown report format: {fmt}")
+    return REPORT_FORMATS[fmt](out)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Reproducible Runs and Result Snapshots
+One injected seed and virtual clock for every simulation, compact
+snapshots of repeated runs, and a compare command that flags statistically
+significant performance regressions between snapshots
+"""
+
+import argparse
+import gzip
+import json
+import math
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+# Virtual clock start for seeded runs (2024-01-01T00:00:00Z)
+DEFAULT_EPOCH = 1704067200.0
+
+# Leaf-key fragments and unit suffixes that mark a measured rate or cost
+HIGHER_IS_BETTER = ("per_sec", "speedup", "throughput", "hit_rate", "work_saved")
+# Whole words of a metric name ("build_time", "bytes_per_key"), not substrings,
+# so e.g. "blacklist_timeline" is not mistaken for a duration
+LOWER_IS_BETTER = ("time", "latency", "bytes")
+LOWER_IS_BETTER_UNITS = ("_ns", "_us", "_ms", "_s")
+
+
+class VirtualClock:
+    """Callable clock that only moves when advanced"""
+
+    def __init__(self, start=DEFAULT_EPOCH):
+        self.now = float(start)
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+        return self.now
+
+
+class SimulationContext:
+    """Source of all randomness and time for one run
+
+    With a ``seed`` every named stream is derived from it, so tests get the
+    same numbers whatever order (or process) they run in, and clocks start
+    at a fixed instant. Without one, streams are OS-seeded, clocks are the
+    wall clock, and benchmarks keep their own default seeds.
+    """
+
+    def __init__(self, seed=None, start=DEFAULT_EPOCH):
+        self.seed = seed
+        self.start = start
+
+    @property
+    def deterministic(self):
+        return self.seed is not None
+
+    def random(self, name):
+        """Independent ``random.Random`` stream for ``name``"""
+        if self.seed is None:
+            return random.Random()
+        # str seeds are hashed with SHA-512, so this is stable across processes
+        return random.Random(f"{self.seed}:{name}")
+
+    def seed_for(self, name, default=1):
+        """Integer seed for a benchmark's own ``seed`` argument"""
+        if self.seed is None:
+            return default
+        return self.random(name).getrandbits(32)
+
+    def clock(self):
+        """Fresh clock: virtual from ``start`` when seeded, else ``time.time``"""
+        return VirtualClock(self.start) if self.seed is not None else time.time
+
+    def now(self):
+        if self.seed is None:
+            return datetime.now()
+        return datetime.fromtimestamp(self.start, timezone.utc)
+
+
+def metric_direction(path):
+    """'higher' or 'lower' for measured metrics, None for plain values"""
+    leaf = path.rsplit(".", 1)[-1].split("[", 1)[0]
+    if any(part in leaf for part in HIGHER_IS_BETTER):
+        return "higher"
+    if leaf.endswith(LOWER_IS_BETTER_UNITS) or any(word in LOWER_IS_BETTER for word in leaf.split("_")):
+        return "lower"
+    return None
+
+
+def flatten_metrics(obj, prefix=""):
+    """Yield (path, number) for every numeric leaf; bools and text are skipped"""
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            yield from flatten_metrics(value, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(obj, (list, tuple)):
+        for index, value in enumerate(obj):
+            yield from flatten_metrics(value, f"{prefix}[{index}]")
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        if math.isfinite(obj):
+            yield prefix, obj
+
+
+class SnapshotRecorder:
+    """Collects every numeric result of repeated runs, one sample per run"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def record(self, name, results):
+        for path, value in flatten_metrics(results, name):
+            self.samples.setdefault(path, []).append(value)
+
+    def snapshot(self, **meta):
+        """Compact form: ``[n, mean, stdev]`` per metric path"""
+        metrics = {}
+        for path, values in self.samples.items():
+            stdev = statistics.stdev(values) if len(values) > 1 else 0.0
+            metrics[path] = [len(values), _round(statistics.fmean(values)), _round(stdev)]
+        meta.setdefault("created", datetime.now().isoformat(timespec="seconds"))
+        meta.setdefault("python", platform.python_version())
+        meta.setdefault("machine", platform.machine())
+        return {"meta": meta, "metrics": metrics}
+
+
+def _round(value):
+    return float(f"{value:.6g}")
+
+
+def save_snapshot(snapshot, path):
+    """Write a snapshot as compact JSON (gzipped if ``path`` ends in .gz)"""
+    data = json.dumps(snapshot, separators=(",", ":"), sort_keys=True).encode()
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wb") as f:
+        f.write(data)
+
+
+def load_snapshot(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return json.loads(f.read())
+
+
+def _betacf(a, b, x, iterations=200, eps=3e-14):
+    """Continued fraction for the regularized incomplete beta function"""
+    qab, qap, qam = a + b, a + 1, a - 1
+    c, d = 1.0, 1 - qab * x / qap
+    d = 1 / (d if abs(d) > 1e-300 else 1e-300)
+    h = d
+    for m in range(1, iterations + 1):
+        m2 = 2 * m
+        for numerator in (m * (b - m) * x / ((qam + m2) * (a + m2)),
+                          -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))):
+            d = 1 + numerator * d
+            d = 1 / (d if abs(d) > 1e-300 else 1e-300)
+            c = 1 + numerator / c
+            c = c if abs(c) > 1e-300 else 1e-300
+            h *= d * c
+        if abs(d * c - 1) < eps:
+            break
+    return h
+
+
+def _betainc(a, b, x):
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+                     + a * math.log(x) + b * math.log(1 - x))
+    if x < (a + 1) / (a + b + 2):
+        return front * _betacf(a, b, x) / a
+    return 1 - front * _betacf(b, a, 1 - x) / b
+
+
+def welch_t_test(a, b):
+    """Two-sided Welch t-test on (n, mean, stdev) summaries; returns (t, df, p)"""
+    (n1, m1, s1), (n2, m2, s2) = a, b
+    v1, v2 = s1 * s1 / n1, s2 * s2 / n2
+    if v1 + v2 == 0:
+        return (math.inf if m1 != m2 else 0.0), math.inf, (0.0 if m1 != m2 else 1.0)
+    t = (m2 - m1) / math.sqrt(v1 + v2)
+    df = (v1 + v2) ** 2 / (v1 * v1 / (n1 - 1) + v2 * v2 / (n2 - 1))
+    p = _betainc(df / 2, 0.5, df / (df + t * t))
+    return t, df, p
+
+
+def t_quantile(confidence, df):
+    """Two-sided Student t critical value (e.g. ~2.045 for 95% at df=29)"""
+    if not math.isfinite(df):
+        df = 1e6
+    low, high = 0.0, 1.0
+    while _betainc(df / 2, 0.5, df / (df + high * high)) > 1 - confidence:
+        high *= 2
+    for _ in range(60):
+        mid = (low + high) / 2
+        if _betainc(df / 2, 0.5, df / (df + mid * mid)) > 1 - confidence:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def compare_snapshots(baseline, current, alpha=0.05, min_change=0.05):
+    """Flag metrics that got significantly worse between two snapshots
+
+    A measured metric regresses when it moved in the bad direction by more
+    than ``min_change`` (relative) and Welch's t-test says the shift is
+    significant. A suite run tests hundreds of metrics at once, so p-values
+    are held to a Benjamini-Hochberg false discovery rate of ``alpha``
+    rather than ``alpha`` each. Both snapshots need at least two samples
+    per metric. Plain values (counts, sizes, flags) are listed when they
+    differ, which in a seeded run means the workload itself changed.
+    """
+    before = baseline["metrics"]
+    after = current["metrics"]
+    tested = 0
+    untested = 0
+    candidates = []
+    changed_values = []
+    for path in sorted(before.keys() & after.keys()):
+        old, new = before[path], after[path]
+        direction = metric_direction(path)
+        if direction is None:
+            if old[1] != new[1]:
+                changed_values.append({"metric": path, "baseline": old[1], "current": new[1]})
+            continue
+        if old[0] < 2 or new[0] < 2:
+            untested += 1
+            continue
+        tested += 1
+        if not old[1]:
+            continue
+        change = new[1] / old[1] - 1
+        if abs(change) > min_change:
+            worse = change < 0 if direction == "higher" else change > 0
+            candidates.append((welch_t_test(old, new)[2], path, direction, change, worse))
+
+    # Benjamini-Hochberg: keep the k smallest p-values with p_(k) <= k/m * alpha
+    candidates.sort()
+    cutoff = 0
+    for rank, candidate in enumerate(candidates, 1):
+        if candidate[0] <= rank / max(tested, 1) * alpha:
+            cutoff = rank
+    significant = candidates[:cutoff]
+
+    regressions = [{
+        "metric": path,
+        "direction": direction,
+        "baseline": before[path][1],
+        "current": after[path][1],
+        "change": round(change, 3),
+        "p_value": round(p, 6),
+    } for p, path, direction, change, worse in significant if worse]
+    return {
+        "compared": len(before.keys() & after.keys()),
+        "measured_metrics_tested": tested,
+        "regressions": regressions,
+        "significant_improvements": len(significant) - len(regressions),
+        "untested_measured_metrics": untested,
+        "changed_values": changed_values,
+        "missing": sorted(before.keys() - after.keys()),
+    }
+
+
+def main():
+    """Compare two result snapshots"""
+    parser = argparse.ArgumentParser(description="Compare result snapshots for regressions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compare = subparsers.add_parser("compare", help="flag significant regressions")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--alpha", type=float, default=0.05, help="significance level")
+    compare.add_argument("--min-change", type=float, default=0.05,
+                         help="smallest relative change worth flagging")
+    args = parser.parse_args()
+
+    result = compare_snapshots(load_snapshot(args.baseline), load_snapshot(args.current),
+                               args.alpha, args.min_change)
+    print(json.dumps(result, indent=2))
+    if result["regressions"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
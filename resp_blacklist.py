@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Redis-Protocol Token Blacklist
+Blacklist backend that speaks RESP with connection pooling and pipelining,
+plus an in-process fake RESP server for offline testing and benchmarks
+"""
+
+import argparse
+import json
+import queue
+import secrets
+import socket
+import socketserver
+import threading
+import time
+from contextlib import contextmanager
+
+from bench_timing import timed
+from token_blacklist import fake_token
+from token_hashing import hash_tokens
+
+BLACKLIST_PREFIX = "blacklist:"  # same key prefix as the API's redis-token.service
+
+
+class RespError(Exception):
+    """Error reply returned by the server"""
+
+
+def encode_command(*args):
+    """Encode one command as a RESP array of bulk strings"""
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif isinstance(arg, int):
+            arg = str(arg).encode()
+        out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(out)
+
+
+def read_reply(stream):
+    """Read one RESP reply from a buffered binary stream"""
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("connection closed by server")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        return RespError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [read_reply(stream) for _ in range(length)]
+    raise RespError(f"unexpected reply type: {line!r}")
+
+
+class RespConnection:
+    """Single RESP connection; every send/receive pair is one round trip"""
+
+    def __init__(self, host, port, timeout=5.0):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+        self.round_trips = 0
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def pipeline(self, commands):
+        """Send all commands in one write and read every reply back"""
+        self._sock.sendall(b"".join(encode_command(*cmd) for cmd in commands))
+        self.round_trips += 1
+        replies = [read_reply(self._reader) for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    def close(self):
+        self._reader.close()
+        self._sock.close()
+
+
+class ConnectionPool:
+    """Thread-safe LIFO pool of RESP connections"""
+
+    def __init__(self, host="127.0.0.1", port=6379, max_connections=8, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._all = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = RespConnection(self.host, self.port, self.timeout)
+                with self._lock:
+                    self._all.append(conn)
+            broken = False
+            try:
+                yield conn
+            except (ConnectionError, OSError):
+                broken = True
+                raise
+            finally:
+                if broken:
+                    with self._lock:
+                        self._all.remove(conn)
+                    conn.close()
+                else:
+                    self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    @property
+    def round_trips(self):
+        with self._lock:
+            return sum(conn.round_trips for conn in self._all)
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+
+
+class RespBlacklist:
+    """Shared token blacklist stored in a Redis-compatible server"""
+
+    name = "resp"
+
+    def __init__(self, pool, prefix=BLACKLIST_PREFIX, default_ttl=7 * 24 * 3600):
+        self.pool = pool
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def _key(self, digest):
+        return self.prefix + digest.hex()
+
+    def _set_command(self, digest, ttl):
+        return ("SET", self._key(digest), "1", "NX", "EX", max(1, int(ttl or self.default_ttl)))
+
+    def revoke(self, digest, ttl=None):
+        """Blacklist one digest; returns False if it was already present"""
+        with self.pool.connection() as conn:
+            return conn.execute(*self._set_command(digest, ttl)) == "OK"
+
+    def revoke_many(self, digests, ttl=None, batch_size=512):
+        """Blacklist digests with pipelined SET NX EX; returns newly added count"""
+        added = 0
+        with self.pool.connection() as conn:
+            for batch in _batches(digests, batch_size):
+                replies = conn.pipeline([self._set_command(d, ttl) for d in batch])
+                added += sum(1 for reply in replies if reply == "OK")
+        return added
+
+    def remove_many(self, digests, batch_size=512):
+        """Delete digests from the blacklist; returns how many were present"""
+        removed = 0
+        with self.pool.connection() as conn:
+            for batch in _batches(digests, batch_size):
+                removed += conn.execute("DEL", *(self._key(d) for d in batch))
+        return removed
+
+    def is_revoked(self, digest):
+        with self.pool.connection() as conn:
+            return conn.execute("EXISTS", self._key(digest)) == 1
+
+    def are_revoked(self, digests, batch_size=512):
+        """Check many digests, one pipelined round trip per batch"""
+        results = []
+        with self.pool.connection() as conn:
+            for batch in _batches(digests, batch_size):
+                replies = conn.pipeline([("EXISTS", self._key(d)) for d in batch])
+                results.extend(reply == 1 for reply in replies)
+        return results
+
+    # Same interface as the in-memory backends in token_blacklist
+    def add(self, digest):
+        self.revoke(digest)
+
+    def update(self, digests):
+        self.revoke_many(digests)
+
+    def __contains__(self, digest):
+        return self.is_revoked(digest)
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_command(buf, pos=0):
+    """Parse one RESP array of bulk strings from buf at pos
+
+    Returns ``(args, next_pos)``, or ``(None, pos)`` when buf does not yet
+    hold a complete command.
+    """
+    end = buf.find(b"\r\n", pos)
+    if end < 0:
+        return None, pos
+    if buf[pos:pos + 1] != b"*":
+        raise RespError("expected array")
+    count = int(buf[pos + 1:end])
+    cursor = end + 2
+    args = []
+    for _ in range(count):
+        end = buf.find(b"\r\n", cursor)
+        if end < 0:
+            return None, pos
+        length = int(buf[cursor + 1:end])
+        start = end + 2
+        if len(buf) < start + length + 2:
+            return None, pos
+        args.append(bytes(buf[start:start + length]))
+        cursor = start + length + 2
+    return args, cursor
+
+
+class _FakeRespHandler(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        sock = self.request
+        buf = bytearray()
+        while True:
+            try:
+                data = sock.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            buf += data
+            replies = []
+            pos = 0
+            try:
+                while True:
+                    command, pos = parse_command(buf, pos)
+                    if command is None:
+                        break
+                    replies.append(self.server.dispatch(command) if command else b"-ERR empty command\r\n")
+            except (RespError, ValueError):
+                sock.sendall(b"".join(replies) + b"-ERR protocol error\r\n")
+                return
+            del buf[:pos]
+            # Answer a whole pipelined batch with a single write
+            if replies:
+                sock.sendall(b"".join(replies))
+
+
+class FakeRespServer(socketserver.ThreadingTCPServer):
+    """Minimal in-process Redis stand-in: PING, SET [NX] [EX|PX], GET, EXISTS, DEL, TTL, DBSIZE, FLUSHALL"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _FakeRespHandler)
+        self._data = {}  # key -> (value, expires_at monotonic or None)
+        self._lock = threading.Lock()
+        self.commands_processed = 0
+        self._thread = None
+
+    @property
+    def address(self):
+        return self.server_address[:2]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def dispatch(self, command):
+        name = command[0].upper()
+        args = command[1:]
+        now = time.monotonic()
+        with self._lock:
+            self.commands_processed += 1
+            if name == b"PING":
+                return b"+PONG\r\n"
+            if name == b"SET" and len(args) >= 2:
+                key, value = args[0], args[1]
+                options = [a.upper() for a in args[2:]]
+                expires_at = None
+                for unit, scale in ((b"EX", 1), (b"PX", 1000)):
+                    if unit not in options:
+                        continue
+                    index = options.index(unit) + 1
+                    if index >= len(options) or not options[index].isdigit():
+                        return b"-ERR syntax error\r\n"
+                    expires_at = now + int(options[index]) / scale
+                    break
+                if b"NX" in options and self._live(key, now) is not None:
+                    return b"$-1\r\n"
+                self._data[key] = (value, expires_at)
+                return b"+OK\r\n"
+            if name == b"GET" and len(args) == 1:
+                entry = self._live(args[0], now)
+                if entry is None:
+                    return b"$-1\r\n"
+                return b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0])
+            if name == b"EXISTS" and args:
+                return b":%d\r\n" % sum(1 for key in args if self._live(key, now) is not None)
+            if name == b"DEL" and args:
+                removed = sum(1 for key in args if self._data.pop(key, None) is not None)
+                return b":%d\r\n" % removed
+            if name == b"TTL" and len(args) == 1:
+                entry = self._live(args[0], now)
+                if entry is None:
+                    return b":-2\r\n"
+                if entry[1] is None:
+                    return b":-1\r\n"
+                return b":%d\r\n" % int(entry[1] - now)
+            if name == b"DBSIZE":
+                return b":%d\r\n" % len(self._data)
+            if name == b"FLUSHALL":
+                self._data.clear()
+                return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name
+
+
+def benchmark_lookups(blacklist, digests, batch_size):
+    """Time EXISTS checks for digests; batch_size=1 means one call per check"""
+    pool = blacklist.pool
+    trips_before = pool.round_trips
+    # One timed() run per size: pipelined batches are single calls, and the
+    # figure being compared is round trips, not per-call CPU time
+    with timed() as elapsed:
+        if batch_size == 1:
+            hits = sum(1 for d in digests if blacklist.is_revoked(d))
+        else:
+            hits = sum(blacklist.are_revoked(digests, batch_size=batch_size))
+    trips = pool.round_trips - trips_before
+    return {
+        "batch_size": batch_size,
+        "checks": len(digests),
+        "hits": hits,
+        "ops_per_sec": len(digests) / elapsed["s"] if elapsed["s"] else 0.0,
+        "round_trips": trips,
+        "round_trips_per_check": trips / len(digests) if digests else 0.0,
+    }
+
+
+def run_benchmark(host=None, port=None, revoked=10000, checks=10000, batch_sizes=(1, 16, 128, 512),
+                  rng=None):
+    """Compare single versus pipelined blacklist checks
+
+    Runs against ``host:port`` when given, otherwise against a bundled
+    FakeRespServer on a loopback port. Keys are written under a prefix
+    unique to the run and deleted afterwards, so a real server's other
+    data is never touched; keys left by an aborted run expire with their
+    one-hour TTL. The prefix is drawn from ``rng`` (the OS CSPRNG if none).
+    """
+    server = None
+    if host is None:
+        server = FakeRespServer().start()
+        host, port = server.address
+    pool = ConnectionPool(host, port)
+    run_id = (rng or secrets.SystemRandom()).getrandbits(128)
+    blacklist = RespBlacklist(pool, prefix=f"bench:{run_id:032x}:")
+    try:
+        revoked_digests = hash_tokens(fake_token(i) for i in range(revoked))
+        with timed() as revoke_time:
+            blacklist.revoke_many(revoked_digests, ttl=3600)
+
+        probes = hash_tokens(fake_token(i * 2) for i in range(checks))  # ~half revoked
+        lookups = [benchmark_lookups(blacklist, probes, size) for size in batch_sizes]
+        removed = blacklist.remove_many(revoked_digests)
+        return {
+            "server": "fake" if server else f"{host}:{port}",
+            "revoked": revoked,
+            "keys_removed": removed,
+            "revoke_per_sec": revoked / revoke_time["s"] if revoke_time["s"] else 0.0,
+            "lookups": lookups,
+        }
+    finally:
+        pool.close()
+        if server:
+            server.stop()
+
+
+def main():
+    """Run the RESP blacklist benchmark"""
+    parser = argparse.ArgumentParser(description="RESP blacklist single vs pipelined benchmark")
+    parser.add_argument("--host", help="real Redis host (defaults to the bundled fake server)")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--revoked", type=int, default=10000)
+    parser.add_argument("--checks", type=int, default=10000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 128, 512])
+    args = parser.parse_args()
+
+    result = run_benchmark(args.host, args.port if args.host else None,
+                           args.revoked, args.checks, args.batch_sizes)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
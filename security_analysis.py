@@ -1,61 +1,90 @@
-# Test JWT Token Security Analysis
+#!/usr/bin/env python3
+"""
+Session Security Analysis
+Review of the API's JWT, refresh-token and blacklist configuration as an
+importable library: nothing runs at import, and each analysis is computed
+on first use and memoized per configuration
+"""
+
 import json
-import hashlib
-import secrets
-import time
-from datetime import datetime, timedelta
+from collections import namedtuple
+from functools import lru_cache
 
-# Simulate JWT payload analysis
-def analyze_jwt_security():
-    """Analyze JWT security implementation"""
-    
-    # Check JWT secret strength requirements
-    jwt_secret_requirements = {
-        "minimum_length": 32,
-        "recommended_length": 64,
-        "production_requirements": {
-            "length": 64,
-            "entropy": "high",
-            "rotation": "regular"
-        }
-    }
-    
-    # Test token expiration settings
-    token_expiration = {
-        "access_token": "7d",  # From environment validation
-        "refresh_token": "30d",
-        "recommended_access": "15m",
-        "recommended_refresh": "7d"
-    }
-    
-    # Security vulnerabilities to check
-    security_checks = {
-        "weak_secret_patterns": [
-            "secret", "password", "key", "jwt", "token", 
-            "123456", "admin", "beautycort", "test"
-        ],
-        "token_structure": {
-            "required_claims": ["id", "type", "iat", "exp"],
-            "optional_claims": ["phone", "email", "tokenId", "tokenFamily"]
+# Deployed settings the analysis reviews (from environment validation)
+AnalysisConfig = namedtuple(
+    "AnalysisConfig",
+    "access_token_expiry refresh_token_expiry blacklist_storage blacklist_cleanup_interval "
+    "refresh_cleanup_interval secret_rotation refresh_rate_limiting device_fingerprinting "
+    "session_monitoring",
+    defaults=("7d", "30d", "in-memory", "1 hour", "4 hours", False, False, False, False),
+)
+DEFAULT_CONFIG = AnalysisConfig()
+
+RECOMMENDED_ACCESS_EXPIRY = "15m"
+RECOMMENDED_REFRESH_EXPIRY = "7d"
+
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(text):
+    """Seconds in a "15m" / "7d" style duration"""
+    text = text.strip()
+    if text and text[-1] in _DURATION_UNITS:
+        return int(text[:-1]) * _DURATION_UNITS[text[-1]]
+    return int(text)
+
+
+def make_config(config=None, **overrides):
+    """AnalysisConfig from a config (or mapping) plus field overrides"""
+    if config is None:
+        config = DEFAULT_CONFIG
+    elif not isinstance(config, AnalysisConfig):
+        config = AnalysisConfig(**config)
+    return config._replace(**overrides) if overrides else config
+
+
+# The analyses below are cached per (hashable) config and return the same
+# dict on every call, so callers that need to modify a result should copy it.
+
+@lru_cache(maxsize=32)
+def _jwt_security(config):
+    return {
+        "jwt_secret_analysis": {
+            "minimum_length": 32,
+            "recommended_length": 64,
+            "production_requirements": {
+                "length": 64,
+                "entropy": "high",
+                "rotation": "regular"
+            }
+        },
+        "token_expiration_analysis": {
+            "access_token": config.access_token_expiry,
+            "refresh_token": config.refresh_token_expiry,
+            "recommended_access": RECOMMENDED_ACCESS_EXPIRY,
+            "recommended_refresh": RECOMMENDED_REFRESH_EXPIRY
         },
-        "blacklist_implementation": {
-            "storage": "in-memory",  # Should be Redis in production
-            "cleanup_interval": "1 hour",
-            "performance_impact": "low"
+        "security_vulnerabilities": {
+            "weak_secret_patterns": [
+                "secret", "password", "key", "jwt", "token",
+                "123456", "admin", "beautycort", "test"
+            ],
+            "token_structure": {
+                "required_claims": ["id", "type", "iat", "exp"],
+                "optional_claims": ["phone", "email", "tokenId", "tokenFamily"]
+            },
+            "blacklist_implementation": {
+                "storage": config.blacklist_storage,
+                "cleanup_interval": config.blacklist_cleanup_interval,
+                "performance_impact": "low"
+            }
         }
     }
-    
-    return {
-        "jwt_secret_analysis": jwt_secret_requirements,
-        "token_expiration_analysis": token_expiration,
-        "security_vulnerabilities": security_checks
-    }
 
-# Test refresh token rotation security
-def analyze_refresh_token_security():
-    """Analyze refresh token rotation security"""
-    
-    rotation_security = {
+
+@lru_cache(maxsize=32)
+def _refresh_token_security(config):
+    return {
         "token_family_tracking": {
             "implemented": True,
             "security_benefit": "Prevents token replay attacks"
@@ -67,62 +96,191 @@ def analyze_refresh_token_security():
         },
         "cleanup_mechanisms": {
             "expired_tokens": "automatic",
-            "interval": "4 hours",
+            "interval": config.refresh_cleanup_interval,
             "performance_impact": "minimal"
         }
     }
-    
-    return rotation_security
 
-# Test token blacklisting security
-def analyze_blacklist_security():
-    """Analyze token blacklisting security"""
-    
-    blacklist_security = {
+
+@lru_cache(maxsize=32)
+def _blacklist_security(config):
+    shared = config.blacklist_storage.lower() == "redis"
+    return {
         "token_hashing": {
             "algorithm": "SHA-256",
             "prevents_storage": "plain tokens",
             "security_benefit": "Protects token values"
         },
         "storage_mechanism": {
-            "current": "in-memory",
+            "current": config.blacklist_storage,
             "recommended": "Redis",
-            "scalability": "limited"
+            "scalability": "horizontal" if shared else "limited"
         },
         "cleanup_efficiency": {
             "automatic": True,
-            "interval": "1 hour",
+            "interval": config.blacklist_cleanup_interval,
             "memory_management": "good"
         }
     }
-    
-    return blacklist_security
 
-# Run security analysis
-print("=== BeautyCort API Session Security Analysis ===\n")
 
-jwt_analysis = analyze_jwt_security()
-refresh_analysis = analyze_refresh_token_security()
-blacklist_analysis = analyze_blacklist_security()
+@lru_cache(maxsize=32)
+def _findings(config):
+    vulnerabilities = []
+    recommendations = []
+    if config.blacklist_storage.lower() != "redis":
+        vulnerabilities.append(f"Token blacklist uses {config.blacklist_storage} storage "
+                               "and is not shared between instances")
+        recommendations.append("Move to Redis for token blacklisting in production")
+    if parse_duration(config.access_token_expiry) > parse_duration(RECOMMENDED_ACCESS_EXPIRY):
+        vulnerabilities.append(f"Access tokens expire after {config.access_token_expiry} "
+                               f"(recommended {RECOMMENDED_ACCESS_EXPIRY})")
+        recommendations.append("Reduce access token expiration to 15 minutes")
+    if parse_duration(config.refresh_token_expiry) > parse_duration(RECOMMENDED_REFRESH_EXPIRY):
+        vulnerabilities.append(f"Refresh tokens expire after {config.refresh_token_expiry} "
+                               f"(recommended {RECOMMENDED_REFRESH_EXPIRY})")
+    if not config.secret_rotation:
+        recommendations.append("Implement proper JWT secret rotation")
+    if not config.refresh_rate_limiting:
+        recommendations.append("Add rate limiting for token refresh endpoints")
+    if not config.device_fingerprinting:
+        recommendations.append("Implement device fingerprinting for session security")
+    if not config.session_monitoring:
+        recommendations.append("Add session monitoring and alerting")
+    return {
+        "vulnerabilities": vulnerabilities,
+        "recommendations": [f"{i}. {text}" for i, text in enumerate(recommendations, 1)],
+    }
+
+
+def analyze_jwt_security(config=None, **overrides):
+    """Analyze JWT security implementation"""
+    return _jwt_security(make_config(config, **overrides))
+
+
+def analyze_refresh_token_security(config=None, **overrides):
+    """Analyze refresh token rotation security"""
+    return _refresh_token_security(make_config(config, **overrides))
+
+
+def analyze_blacklist_security(config=None, **overrides):
+    """Analyze token blacklisting security"""
+    return _blacklist_security(make_config(config, **overrides))
+
+
+def security_findings(config=None, **overrides):
+    """Vulnerabilities and numbered recommendations for a configuration"""
+    return _findings(make_config(config, **overrides))
+
+
+ANALYSES = {
+    "jwt_security": analyze_jwt_security,
+    "refresh_token_security": analyze_refresh_token_security,
+    "blacklist_security": analyze_blacklist_security,
+}
+
+
+def analyze(config=None, **overrides):
+    """All three analyses plus findings, keyed by name"""
+    config = make_config(config, **overrides)
+    results = {name: analysis(config) for name, analysis in ANALYSES.items()}
+    results["findings"] = security_findings(config)
+    return results
+
+
+def clear_cache():
+    for cached in (_jwt_security, _refresh_token_security, _blacklist_security, _findings):
+        cached.cache_clear()
+
+
+def print_analysis(results):
+    print("=== BeautyCort API Session Security Analysis ===\n")
+
+    print("1. JWT Token Security Analysis:")
+    print(json.dumps(results["jwt_security"], indent=2))
+
+    print("\n2. Refresh Token Security Analysis:")
+    print(json.dumps(results["refresh_token_security"], indent=2))
+
+    print("\n3. Token Blacklisting Security Analysis:")
+    print(json.dumps(results["blacklist_security"], indent=2))
+
+    print("\n=== Security Recommendations ===")
+    for rec in results["findings"]["recommendations"]:
+        print(rec)
+
+
+def main():
+    """Run the analysis for the deployed (or overridden) configuration"""
+    # Only the CLI needs these; keeping them out of module scope keeps the
+    # library import down to json and functools
+    import argparse
+    import time
+    import uuid
+
+    parser = argparse.ArgumentParser(description="BeautyCort API session security analysis")
+    parser.add_argument("--format", choices=("pretty", "json"), default="pretty")
+    parser.add_argument("--access-token-expiry", default=DEFAULT_CONFIG.access_token_expiry)
+    parser.add_argument("--refresh-token-expiry", default=DEFAULT_CONFIG.refresh_token_expiry)
+    parser.add_argument("--blacklist-storage", default=DEFAULT_CONFIG.blacklist_storage)
+    for flag in ("secret-rotation", "refresh-rate-limiting", "device-fingerprinting",
+                 "session-monitoring"):
+        parser.add_argument(f"--{flag}", action="store_true", help="already deployed")
+    parser.add_argument("--store", help="also append typed records to this audit store")
+    parser.add_argument("--store-format", choices=("columnar", "csv", "jsonl"), default="columnar")
+    parser.add_argument("--service", default="beautycort-api")
+    parser.add_argument("--instrument", action="store_true",
+                        help="time and count each analysis (an extra output section)")
+    parser.add_argument("--profile", metavar="PATH", help="with instrumentation, write cProfile data")
+    args = parser.parse_args()
+
+    config = make_config(
+        access_token_expiry=args.access_token_expiry,
+        refresh_token_expiry=args.refresh_token_expiry,
+        blacklist_storage=args.blacklist_storage,
+        secret_rotation=args.secret_rotation,
+        refresh_rate_limiting=args.refresh_rate_limiting,
+        device_fingerprinting=args.device_fingerprinting,
+        session_monitoring=args.session_monitoring,
+    )
+    if args.instrument or args.profile:
+        import sys
+        from instrumentation import Instrumentation
 
-print("1. JWT Token Security Analysis:")
-print(json.dumps(jwt_analysis, indent=2))
+        # Hook this module object, which is __main__ when run as a script
+        module = sys.modules[__name__]
+        hooks = [("analysis", module, name) for name in (
+            "analyze_jwt_security", "analyze_refresh_token_security",
+            "analyze_blacklist_security", "security_findings")]
+        with Instrumentation(hooks, profile=bool(args.profile)) as instrumentation:
+            results = analyze(config)
+        results["instrumentation"] = instrumentation.report()
+        if args.profile:
+            instrumentation.dump_stats(args.profile)
+    else:
+        results = analyze(config)
+    if args.format == "json":
+        print(json.dumps(results, indent=2))
+    else:
+        print_analysis(results)
+        if "instrumentation" in results:
+            print("\n=== Instrumentation ===")
+            print(json.dumps(results["instrumentation"], indent=2))
 
-print("\n2. Refresh Token Security Analysis:")
-print(json.dumps(refresh_analysis, indent=2))
+    if args.store:
+        from audit_store import StoreReport, open_sink
 
-print("\n3. Token Blacklisting Security Analysis:")
-print(json.dumps(blacklist_analysis, indent=2))
+        ts = time.time()
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.localtime(ts))
+        run = f"{args.service}-analysis-{stamp}-{uuid.uuid4().hex[:8]}"
+        report = StoreReport(open_sink(args.store_format, args.store), run, args.service, ts)
+        for name in ANALYSES:
+            report.emit_result(name, results[name])
+        findings = results["findings"]
+        report.emit_summary(len(ANALYSES), findings["vulnerabilities"],
+                            findings["recommendations"], None)
+        report.end()
 
-print("\n=== Security Recommendations ===")
-recommendations = [
-    "1. Move to Redis for token blacklisting in production",
-    "2. Reduce access token expiration to 15 minutes",
-    "3. Implement proper JWT secret rotation",
-    "4. Add rate limiting for token refresh endpoints",
-    "5. Implement device fingerprinting for session security",
-    "6. Add session monitoring and alerting"
-]
 
-for rec in recommendations:
-    print(rec)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
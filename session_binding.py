@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Device-Fingerprint Session Binding
+Hashes a normalized IP prefix and User-Agent features into 64-bit
+fingerprints, keeps a compact open-addressing index from session to
+fingerprint, and checks each request for a binding mismatch in O(1)
+"""
+
+import argparse
+import hashlib
+import ipaddress
+import json
+import random
+import re
+from array import array
+from functools import lru_cache
+
+from bench_timing import measure_each, timed, traced_allocations
+
+MATCH = "match"
+SIMILAR = "similar"
+MISMATCH = "mismatch"
+UNBOUND = "unbound"
+
+MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+
+_BROWSER_RE = re.compile(r"(Edg|OPR|Firefox|Chrome|Version)/(\d+)")
+_OS_RE = re.compile(r"(Windows NT [\d.]+|Mac OS X|iPhone OS|Android|Linux)")
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d+")
+
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data.encode(), digest_size=8).digest(), "little")
+
+
+@lru_cache(maxsize=65536)
+def ip_prefix(ip, v4_prefix=24, v6_prefix=48):
+    """Network prefix of an address, so a client moving within it still matches"""
+    address = ipaddress.ip_address(ip)
+    prefix = v4_prefix if address.version == 4 else v6_prefix
+    return str(ipaddress.ip_network(f"{address}/{prefix}", strict=False))
+
+
+@lru_cache(maxsize=65536)
+def ua_features(user_agent):
+    """Stable User-Agent features: browser family, major version, OS, mobile"""
+    browsers = dict(_BROWSER_RE.findall(user_agent))
+    for family in ("Edg", "OPR", "Firefox", "Chrome", "Version"):
+        if family in browsers:
+            browser = ("Safari" if family == "Version" else family), browsers[family]
+            break
+    else:
+        browser = ("other", "0")
+    match = _OS_RE.search(user_agent)
+    os_name = match.group(1) if match else "other"
+    mobile = "mobile" if "Mobile" in user_agent else "desktop"
+    return browser[0], browser[1], os_name, mobile
+
+
+def _weights(features, bits=64):
+    """Per-bit vote totals of the feature hashes (the SimHash accumulator)"""
+    weights = [0] * bits
+    for feature in features:
+        h = _hash64(feature)
+        for bit in range(bits):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return weights
+
+
+def _threshold(weights):
+    value = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            value |= 1 << bit
+    return value
+
+
+def simhash(features, bits=64):
+    """Charikar SimHash: similar feature sets give nearby fingerprints"""
+    return _threshold(_weights(features, bits))
+
+
+@lru_cache(maxsize=65536)
+def _ua_weights(user_agent):
+    # Word-level tokens let a small UA change move only a few bits
+    return tuple(_weights(ua_features(user_agent) + tuple(_TOKEN_RE.findall(user_agent))))
+
+
+@lru_cache(maxsize=65536)
+def _network_weights(ip):
+    address = ipaddress.ip_address(ip)
+    wide = ip_prefix(ip, 16, 32) if address.version == 4 else ip_prefix(ip, 32, 32)
+    # Weighted like the UA tokens so a network move alone is not a mismatch
+    return tuple(3 * w for w in _weights((ip_prefix(ip), wide)))
+
+
+def fingerprint(ip, user_agent):
+    """Exact 64-bit fingerprint of IP prefix and normalized UA features"""
+    return _hash64("|".join((ip_prefix(ip),) + ua_features(user_agent)))
+
+
+def similarity_fingerprint(ip, user_agent):
+    """SimHash over IP prefixes and UA tokens, tolerant of small changes
+
+    Vote totals are cached per UA and per address, so a request costs one
+    64-way add and threshold rather than hashing every token.
+    """
+    return _threshold(map(sum, zip(_network_weights(ip), _ua_weights(user_agent))))
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def session_key(session):
+    """Map a session id (int, str or bytes) to an odd, well-mixed 64-bit key
+
+    Integers use Fibonacci hashing, so the high bits index the table.
+    """
+    if isinstance(session, int):
+        return (session * _GOLDEN) & MASK64 | 1
+    if isinstance(session, str):
+        session = session.encode()
+    return int.from_bytes(hashlib.blake2b(session, digest_size=8).digest(), "little") | 1
+
+
+class SessionBindingIndex:
+    """Session -> fingerprint map in two flat ``array('Q')`` tables
+
+    Keys are odd 64-bit session keys, so 0 marks an empty slot and 2 a
+    deleted one; a session costs 16 bytes per slot instead of a dict entry
+    plus two int objects. With ``similarity`` fingerprints are SimHashes
+    and a request within ``max_distance`` bits counts as SIMILAR.
+    """
+
+    _EMPTY = 0
+    _TOMBSTONE = 2
+
+    def __init__(self, capacity=1024, similarity=False, max_distance=8, max_load=0.7):
+        self.similarity = similarity
+        self.max_distance = max_distance
+        self.max_load = max_load
+        self._count = 0
+        self._used_slots = 0
+        bits = 3
+        while (1 << bits) * max_load < capacity:
+            bits += 1
+        self._allocate(bits)
+
+    def _allocate(self, bits):
+        self._bits = bits
+        self._shift = 64 - bits
+        self._mask = (1 << bits) - 1
+        self._keys = array("Q", bytes(8 << bits))
+        self._values = array("Q", bytes(8 << bits))
+
+    def _probe(self, key):
+        """Return (slot, found) for key; slot is where it is or would go"""
+        keys = self._keys
+        mask = self._mask
+        slot = key >> self._shift  # keys are already well mixed
+        first_free = -1
+        while True:
+            current = keys[slot]
+            if current == key:
+                return slot, True
+            if current == self._EMPTY:
+                return (first_free if first_free >= 0 else slot), False
+            if current == self._TOMBSTONE and first_free < 0:
+                first_free = slot
+            slot = (slot + 1) & mask
+
+    def _grow(self):
+        old_keys, old_values = self._keys, self._values
+        bits = self._bits + 1 if self._count >= len(old_keys) * self.max_load / 2 else self._bits
+        self._allocate(bits)
+        self._used_slots = 0
+        for key, value in zip(old_keys, old_values):
+            if key & 1:
+                slot, _ = self._probe(key)
+                self._keys[slot] = key
+                self._values[slot] = value
+                self._used_slots += 1
+
+    def compute(self, ip, user_agent):
+        """Fingerprint for a request in this index's mode"""
+        if self.similarity:
+            return similarity_fingerprint(ip, user_agent)
+        return fingerprint(ip, user_agent)
+
+    def bind_fingerprint(self, session, value):
+        key = session_key(session)
+        slot, found = self._probe(key)
+        if not found:
+            if self._keys[slot] == self._EMPTY:
+                self._used_slots += 1
+            self._keys[slot] = key
+            self._count += 1
+        self._values[slot] = value
+        if self._used_slots > len(self._keys) * self.max_load:
+            self._grow()
+
+    def bind(self, session, ip, user_agent):
+        """Bind (or rebind) a session to the device that created it"""
+        self.bind_fingerprint(session, self.compute(ip, user_agent))
+
+    def check_fingerprint(self, session, value):
+        slot, found = self._probe(session_key(session))
+        if not found:
+            return UNBOUND
+        bound = self._values[slot]
+        if bound == value:
+            return MATCH
+        if self.similarity and hamming(bound, value) <= self.max_distance:
+            return SIMILAR
+        return MISMATCH
+
+    def check(self, session, ip, user_agent):
+        """MATCH, SIMILAR, MISMATCH or UNBOUND for a request on ``session``"""
+        return self.check_fingerprint(session, self.compute(ip, user_agent))
+
+    def unbind(self, session):
+        slot, found = self._probe(session_key(session))
+        if not found:
+            return False
+        self._keys[slot] = self._TOMBSTONE
+        self._count -= 1
+        return True
+
+    def nbytes(self):
+        return len(self._keys) * self._keys.itemsize + len(self._values) * self._values.itemsize
+
+    def __contains__(self, session):
+        return self._probe(session_key(session))[1]
+
+    def __len__(self):
+        return self._count
+
+
+_UA_TEMPLATES = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/{major}.0.{minor}.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+    "Version/{major}.{minor} Safari/605.1.15",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_{minor} like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/{major}.0 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/{major}.0.{minor}.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:{major}.0) Gecko/20100101 Firefox/{major}.{minor}",
+]
+
+
+def synthetic_device(rng):
+    """Random (ip, template index, major, minor) device profile"""
+    ip = f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+    return ip, rng.randrange(len(_UA_TEMPLATES)), rng.randrange(100, 130), rng.randrange(10)
+
+
+def device_request(device, rng=None, drift=False):
+    """(ip, user_agent) for a device; ``drift`` moves within its /24 and upgrades the browser"""
+    ip, template, major, minor = device
+    if drift and rng is not None:
+        ip = ip.rsplit(".", 1)[0] + f".{rng.randrange(1, 255)}"
+        major += 1
+    return ip, _UA_TEMPLATES[template].format(major=major, minor=minor)
+
+
+def dict_bytes_per_session(sessions=100000):
+    """Measured cost of the obvious ``{session_id: fingerprint}`` dict"""
+    with traced_allocations() as usage:
+        index = {f"session-{i}": (i * _GOLDEN) & MASK64 for i in range(sessions)}
+    del index
+    return usage["current"] / sessions
+
+
+def benchmark_binding(sessions=10_000_000, checks=200000, similarity=False, devices=50000,
+                      mismatch_ratio=0.05, drift_ratio=0.1, seed=1):
+    """Bind ``sessions`` sessions, then time checks of matching/drifted/foreign requests
+
+    Sessions share ``devices`` profiles whose fingerprints are computed
+    once, so the build measures the index rather than UA parsing. Checks
+    hash each request in full (with the UA feature cache warm, as a server
+    would see repeat clients).
+    """
+    rng = random.Random(seed)
+    profiles = [synthetic_device(rng) for _ in range(devices)]
+    index = SessionBindingIndex(capacity=sessions, similarity=similarity)
+    bound = [index.compute(*device_request(device)) for device in profiles]
+
+    bind = index.bind_fingerprint
+    with timed() as build_time:
+        for session in range(sessions):
+            bind(session, bound[session % devices])
+
+    requests = []
+    for _ in range(checks):
+        session = rng.randrange(sessions)
+        roll = rng.random()
+        if roll < mismatch_ratio:
+            kind, device = "foreign", profiles[rng.randrange(devices)]
+            if device is profiles[session % devices]:
+                kind = "same"
+            requests.append((kind, session) + device_request(device))
+        elif roll < mismatch_ratio + drift_ratio:
+            requests.append(("drift", session) + device_request(profiles[session % devices], rng, True))
+        else:
+            requests.append(("same", session) + device_request(profiles[session % devices]))
+
+    for _, session, ip, ua in requests[:1000]:
+        index.check(session, ip, ua)  # warm the UA caches
+    outcomes = {}
+    check = index.check
+    for kind, session, ip, ua in requests:
+        status = check(session, ip, ua)
+        outcomes.setdefault(kind, {}).setdefault(status, 0)
+        outcomes[kind][status] += 1
+    checking = measure_each(lambda request: check(*request[1:]), requests, batch=256)
+
+    values = [(session, index.compute(ip, ua)) for _, session, ip, ua in requests]
+    check_fp = index.check_fingerprint
+    lookups = measure_each(lambda value: check_fp(*value), values, batch=256)
+
+    return {
+        "mode": "simhash" if similarity else "exact",
+        "sessions": len(index),
+        "build_time_s": round(build_time["s"], 2),
+        "checks": checks,
+        "checks_per_sec": checking["ops_per_sec"],
+        "index_lookups_per_sec": lookups["ops_per_sec"],
+        "index_bytes": index.nbytes(),
+        "bytes_per_session": index.nbytes() / len(index),
+        "dict_bytes_per_session": dict_bytes_per_session(min(sessions, 100000)),
+        "outcomes": outcomes,
+    }
+
+
+def main():
+    """Benchmark exact and SimHash session binding"""
+    parser = argparse.ArgumentParser(description="Device-fingerprint session binding benchmark")
+    parser.add_argument("--sessions", type=int, default=10_000_000)
+    parser.add_argument("--checks", type=int, default=200000)
+    parser.add_argument("--modes", nargs="+", choices=["exact", "simhash"], default=["exact", "simhash"])
+    args = parser.parse_args()
+
+    results = [benchmark_binding(args.sessions, args.checks, similarity=(mode == "simhash"))
+               for mode in args.modes]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,29 +4,99 @@ Session Security Attack Vector Testing
 Tests various session hijacking and security attack scenarios
 """
 
-import json
-import hashlib
-import time
-import random
+import argparse
 import string
-from datetime import datetime, timedelta
+import sys
+import time
+import uuid
+
+from attack_traffic import generate_events, run_stress
+from audit_store import SINKS, StoreReport, open_sink
+from bench_timing import measure_each, ratio_interval, verdict
+from blacklist_gossip import benchmark_gossip
+from blacklist_snapshot import benchmark_snapshot
+from concurrency_harness import race_login_logout, race_refresh_logout, race_same_token, run_sweep
+from expiry_simulator import compare_policies
+from expiry_wheel import benchmark_cleanup
+from instrumentation import Instrumentation
+from jwt_keyring import benchmark_keyring, check_grace_period
+from parallel_runner import run_tests
+from rate_limiter import run_comparison as run_rate_limit_comparison
+from report_stream import REPORT_FORMATS, REPORT_TITLE, PrettyReport, RecordSet, TeeReport, create_report
+from reproducibility import SimulationContext, SnapshotRecorder, save_snapshot
+from resp_blacklist import run_benchmark as benchmark_shared_blacklist
+from secret_audit import MIN_ENTROPY_BITS_PER_CHAR, WEAK_PATTERNS, SecretAuditor, benchmark_audit
+from session_binding import benchmark_binding
+from session_monitor import benchmark_detector
+from token_blacklist import BACKENDS as BLACKLIST_BACKENDS, benchmark_backend, measure_memory_sizing
+from token_families import REUSE_DETECTED, FamilyManager, benchmark_rotation
+from token_hashing import benchmark_hashing
+from verified_token_cache import benchmark_cache
 
 class SessionSecurityTester:
-    def __init__(self):
+    def __init__(self, report=None, log=None, context=None):
         self.test_results = []
         self.vulnerabilities = []
         self.recommendations = []
+        # With a report attached, results are streamed out as each test
+        # finishes instead of being kept in self.test_results
+        self.report = report
+        self.log = log or sys.stdout
+        self.tests_completed = 0
+        self.test_timings = []
+        self.run_summary = None
+        self._report_started = False
+        # All randomness and simulated time come from here (seeded or not)
+        self.context = context or SimulationContext()
+        # Set to a SnapshotRecorder to capture every numeric result
+        self.recorder = None
+        # Set to an Instrumentation to collect per-test and token-op profiles
+        self.instrumentation = None
+    
+    def _progress(self, message):
+        print(message, file=self.log)
+    
+    def _start_report(self, report):
+        if not self._report_started:
+            report.begin(REPORT_TITLE, self.context.now())
+            self._report_started = True
+    
+    def _record_result(self, test_name, results):
+        self.tests_completed += 1
+        if self.recorder is not None:
+            self.recorder.record(test_name, results)
+        if self.report is None:
+            self.test_results.append({test_name: results})
+            return
+        self._start_report(self.report)
+        self.report.emit_result(test_name, results)
+    
+    def _record_records(self, test_name, records):
+        """Record a large per-record section, e.g. a generator of records
+
+        With a report attached the records are encoded and written as they
+        are produced; otherwise they are held as a RecordSet until then.
+        """
+        if self.recorder is not None:
+            records = self._recorded(test_name, records)
+        if self.report is None:
+            self.test_results.append({test_name: RecordSet(records)})
+            return
+        self._start_report(self.report)
+        self.report.emit_records(test_name, records)
+    
+    def _recorded(self, test_name, records):
+        for index, record in enumerate(records):
+            self.recorder.record(f"{test_name}[{index}]", record)
+            yield record
     
     def test_jwt_secret_strength(self):
         """Test JWT secret strength against common attacks"""
-        print("1. Testing JWT Secret Strength...")
+        self._progress("1. Testing JWT Secret Strength...")
         
         # Common weak secrets to test against
-        weak_secrets = [
-            "secret", "password", "key", "jwt", "token",
-            "123456", "admin", "beautycort", "test",
-            "default-secret", "beautycort-jwt-secret-2024"
-        ]
+        weak_secrets = WEAK_PATTERNS
+        auditor = SecretAuditor(patterns=weak_secrets)
         
         # Test minimum length requirements
         min_length_tests = [
@@ -42,13 +112,14 @@ class SessionSecurityTester:
             "entropy_tests": []
         }
         
-        # Test weak patterns
-        for weak in weak_secrets:
-            test_secret = f"super-{weak}-key-2024"
-            contains_weak = any(pattern in test_secret.lower() for pattern in weak_secrets)
+        # Test weak patterns (all patterns matched in one pass per secret)
+        test_secrets = [f"super-{weak}-key-2024" for weak in weak_secrets]
+        for test_secret, score in zip(test_secrets, auditor.audit(test_secrets)):
+            contains_weak = bool(score["weak_patterns"])
             results["weak_pattern_tests"].append({
                 "secret": test_secret[:20] + "...",
                 "contains_weak_pattern": contains_weak,
+                "matched_patterns": score["weak_patterns"],
                 "secure": not contains_weak
             })
         
@@ -62,30 +133,49 @@ class SessionSecurityTester:
             })
         
         # Test entropy
-        high_entropy_secret = ''.join(random.choices(string.ascii_letters + string.digits + string.punctuation, k=64))
+        rng = self.context.random("jwt_secret_strength")
+        high_entropy_secret = ''.join(rng.choices(string.ascii_letters + string.digits + string.punctuation, k=64))
         low_entropy_secret = "a" * 64
         
+        high_score, low_score = auditor.score_chunk([high_entropy_secret, low_entropy_secret])
+        
         results["entropy_tests"] = [
             {
                 "type": "high_entropy",
                 "length": len(high_entropy_secret),
                 "unique_chars": len(set(high_entropy_secret)),
-                "secure": len(set(high_entropy_secret)) > 20
+                "entropy_bits_per_char": high_score["entropy_bits_per_char"],
+                "secure": high_score["entropy_bits_per_char"] >= MIN_ENTROPY_BITS_PER_CHAR
             },
             {
                 "type": "low_entropy", 
                 "length": len(low_entropy_secret),
                 "unique_chars": len(set(low_entropy_secret)),
-                "secure": len(set(low_entropy_secret)) > 20
+                "entropy_bits_per_char": low_score["entropy_bits_per_char"],
+                "secure": low_score["entropy_bits_per_char"] >= MIN_ENTROPY_BITS_PER_CHAR
             }
         ]
         
-        self.test_results.append({"jwt_secret_strength": results})
-        print(f"   ✓ JWT secret strength tests completed")
+        # Bulk audit throughput for fleets of secrets
+        results["bulk_audit"] = benchmark_audit(20000, seed=self.context.seed_for("bulk_audit"))
+        
+        # Verifying against several secrets during a rotation window
+        results["secret_rotation"] = benchmark_keyring(tokens=500, repeats=3,
+                                                      seed=self.context.seed_for("secret_rotation"),
+                                                      clock=self.context.clock())
+        
+        # A rotated-out key must stop verifying once its grace period ends
+        grace = check_grace_period(grace=60, advance=3600)
+        results["secret_rotation_grace"] = grace
+        if not grace["retired_key_rejected"]:
+            self.vulnerabilities.append("Rotated-out JWT signing keys keep verifying after their grace period")
+        
+        self._record_result("jwt_secret_strength", results)
+        self._progress(f"   ✓ JWT secret strength tests completed")
         
     def test_token_expiration_attacks(self):
         """Test token expiration and replay attack scenarios"""
-        print("2. Testing Token Expiration and Replay Attacks...")
+        self._progress("2. Testing Token Expiration and Replay Attacks...")
         
         # Current implementation uses 7 days for access tokens
         current_access_expiry = 7 * 24 * 60 * 60  # 7 days in seconds
@@ -95,6 +185,21 @@ class SessionSecurityTester:
         recommended_access_expiry = 15 * 60  # 15 minutes
         recommended_refresh_expiry = 7 * 24 * 60 * 60  # 7 days
         
+        # Play out a week of sessions under each policy on a virtual clock
+        simulations = compare_policies(users=200, days=7,
+                                       seed=self.context.seed_for("policy_simulation"))
+        policy_simulation = [
+            {
+                "policy": sim["policy"],
+                "peak_blacklist_entries": sim["peak_blacklist_entries"],
+                "peak_blacklist_bytes": sim["peak_blacklist_bytes"],
+                "peak_traced_bytes": sim["peak_traced_bytes"],
+                "exposure": sim["exposure"],
+                "events": sim["events"],
+            }
+            for sim in simulations
+        ]
+        
         results = {
             "access_token_expiry": {
                 "current": f"{current_access_expiry / 3600} hours",
@@ -120,54 +225,88 @@ class SessionSecurityTester:
                     "mitigation": "Token family rotation implemented",
                     "risk_level": "LOW"
                 }
-            ]
+            ],
+            "policy_simulation": policy_simulation
         }
         
-        self.test_results.append({"token_expiration_attacks": results})
-        print(f"   ✓ Token expiration attack tests completed")
+        self._record_result("token_expiration_attacks", results)
+        # Blacklist size every 6 simulated hours, one record per policy and sample
+        self._record_records("policy_blacklist_timeline", (
+            {"policy": sim["policy"], "hour": hour, "blacklist_entries": entries}
+            for sim in simulations
+            for hour, entries in sim["blacklist_timeline"]
+        ))
+        self._progress(f"   ✓ Token expiration attack tests completed")
         
         if current_access_expiry > 3600:
             self.vulnerabilities.append("Access tokens have long expiration (7 days) - should be 15 minutes")
         
     def test_blacklist_security(self):
         """Test token blacklisting security and performance"""
-        print("3. Testing Token Blacklisting Security...")
-        
-        # Simulate blacklist operations
-        def simulate_blacklist_performance(num_tokens):
-            """Simulate performance with different blacklist sizes"""
-            start_time = time.time()
-            
-            # Simulate hash operations (SHA-256)
-            hashes = []
-            for i in range(num_tokens):
-                token = f"fake-jwt-token-{i}-{'x' * 100}"
-                token_hash = hashlib.sha256(token.encode()).hexdigest()
-                hashes.append(token_hash)
-            
-            # Simulate lookup operations
-            lookup_time = 0
-            for i in range(100):  # 100 lookups
-                lookup_start = time.time()
-                _ = f"lookup-token-{i}" in hashes
-                lookup_time += time.time() - lookup_start
-            
-            total_time = time.time() - start_time
-            return {
-                "total_time": total_time,
-                "avg_lookup_time": lookup_time / 100,
-                "memory_usage_estimate": len(hashes) * 64  # 64 bytes per hash
+        self._progress("3. Testing Token Blacklisting Security...")
+        
+        # Benchmark every blacklist backend at increasing sizes; each record
+        # is reported as soon as its benchmark finishes
+        def performance_tests():
+            baseline = {}
+            for size in [100, 1000, 10000]:
+                for backend in BLACKLIST_BACKENDS:
+                    perf = benchmark_backend(backend, size, lookups=2000,
+                                             seed=self.context.seed_for(f"blacklist_{backend}_{size}"))
+                    baseline.setdefault(backend, perf["lookup"])
+                    # Lookups should not slow down as the blacklist grows; only
+                    # call it either way when the confidence intervals agree
+                    growth, low, high = ratio_interval(perf["lookup"], baseline[backend])
+                    yield {
+                        "backend": backend,
+                        "blacklist_size": size,
+                        "performance": perf,
+                        "lookup_growth": round(growth, 2),
+                        "lookup_growth_interval": [round(low, 2), round(high, 2)],
+                        "scalability": verdict(low, high, 3)
+                    }
+        
+        self._record_records("blacklist_performance", performance_tests())
+        
+        # Measured memory versus the naive 64-bytes-per-hash estimate
+        memory_sizing = [measure_memory_sizing(size) for size in [1000, 10000, 100000]]
+        largest = memory_sizing[-1]
+        memory_projection = {
+            f"{entries:,} revoked tokens": {
+                "naive_estimate_mb": round(entries * 64 / 2 ** 20, 1),
+                "hex_list_mb": round(entries * largest["hex_list_bytes_per_entry"] / 2 ** 20, 1),
+                "compact_store_mb": round(entries * largest["compact_store_bytes_per_entry"] / 2 ** 20, 1)
             }
+            for entries in [10 ** 6, 10 ** 7]
+        }
         
-        # Test with different blacklist sizes
-        performance_tests = []
-        for size in [100, 1000, 10000]:
-            perf = simulate_blacklist_performance(size)
-            performance_tests.append({
-                "blacklist_size": size,
-                "performance": perf,
-                "scalability": "GOOD" if perf["avg_lookup_time"] < 0.001 else "POOR"
-            })
+        # Hourly full sweep versus per-second timing wheel expiry
+        cleanup_comparison = benchmark_cleanup(100000, duration=3 * 3600,
+                                               seed=self.context.seed_for("cleanup_comparison"))
+        if not cleanup_comparison["expiry_engine"]["consistent"]:
+            self.vulnerabilities.append("Expiry engine drops or strands re-revoked blacklist entries")
+        
+        # Restart recovery: mapped snapshot vs rebuilding from a JSON dump
+        persistence = benchmark_snapshot(entries=100000, probes=1000,
+                                         seed=self.context.seed_for("blacklist_snapshot"))
+        
+        # Bulk revocation hashing: per-token hexdigest loop vs batched raw
+        # digests, then the same batch fanned out over 1..N workers
+        bulk_hashing = benchmark_hashing(tokens=50000, samples=3)
+        
+        # Replicas kept in sync by batched gossip plus anti-entropy, as N grows
+        replication = benchmark_gossip(sizes=(2, 4, 8), revocations=2000, loss=0.05,
+                                       seed=self.context.seed_for("blacklist_gossip"),
+                                       clock=self.context.clock())
+        
+        # Shared RESP store (bundled fake server): single vs pipelined checks
+        shared_store = benchmark_shared_blacklist(revoked=2000, checks=2000,
+                                                  rng=self.context.random("shared_blacklist"))
+        
+        # Verify + blacklist work saved by caching verified claims
+        verified_cache = benchmark_cache(distinct_tokens=2000, requests=20000, cache_size=500,
+                                         seed=self.context.seed_for("verified_cache"),
+                                         clock=self.context.clock())
         
         results = {
             "implementation": {
@@ -176,7 +315,14 @@ class SessionSecurityTester:
                 "cleanup": "automatic (1 hour interval)",
                 "concurrent_safety": "depends on implementation"
             },
-            "performance_tests": performance_tests,
+            "memory_sizing": memory_sizing,
+            "memory_projection": memory_projection,
+            "cleanup_comparison": cleanup_comparison,
+            "persistence_benchmark": persistence,
+            "bulk_hashing_benchmark": bulk_hashing,
+            "replication_benchmark": replication,
+            "shared_store_benchmark": shared_store,
+            "verified_cache_benchmark": verified_cache,
             "security_features": {
                 "token_hashing": True,
                 "automatic_cleanup": True,
@@ -190,40 +336,50 @@ class SessionSecurityTester:
             ]
         }
         
-        self.test_results.append({"blacklist_security": results})
-        print(f"   ✓ Token blacklisting security tests completed")
+        self._record_result("blacklist_security", results)
+        self._progress(f"   ✓ Token blacklisting security tests completed")
         
         self.vulnerabilities.append("Token blacklisting uses in-memory storage - should use Redis in production")
         
     def test_refresh_token_rotation(self):
         """Test refresh token rotation security"""
-        print("4. Testing Refresh Token Rotation...")
+        self._progress("4. Testing Refresh Token Rotation...")
         
-        # Simulate token family management
+        # Drive one family through 10 rotations, then replay an old token
         def simulate_token_family():
             """Simulate token family lifecycle"""
-            import uuid
-            
-            # Initial token family
-            family_id = str(uuid.uuid4())
+            manager = FamilyManager(clock=self.context.clock(),
+                                    rng=self.context.random("token_family"))
+            family_id, token = manager.create_family(user_id="audit-user")
             tokens = []
             
-            # Simulate 10 rotations
             for i in range(10):
-                token_id = str(uuid.uuid4())
+                status, new_token = manager.rotate(family_id, token)
                 tokens.append({
-                    "id": token_id,
+                    "id": f"{new_token:016x}",
                     "family": family_id,
-                    "generation": i,
-                    "revoked": False,
-                    "created_at": datetime.now() - timedelta(hours=i)
+                    "generation": manager.generation(family_id),
+                    "status": status
                 })
+                previous, token = token, new_token
+            
+            reuse_status, _ = manager.rotate(family_id, previous)
+            
+            # Each replay revokes its family, so time detection over a
+            # batch of fresh families that have each rotated once
+            replays = []
+            for i in range(640):
+                other_id, first = manager.create_family(user_id=f"audit-user-{i}")
+                manager.rotate(other_id, first)
+                replays.append((other_id, first))
+            detection = measure_each(lambda replay: manager.rotate(*replay), replays)
             
-            # Simulate token reuse detection
             reuse_detection = {
                 "tokens_in_family": len(tokens),
-                "revoked_on_reuse": True,
-                "family_revocation": True
+                "revoked_on_reuse": reuse_status == REUSE_DETECTED,
+                "family_revocation": not manager.is_valid(family_id, token),
+                "detection_latency_us": detection["mean_ns"] / 1000,
+                "detection_timing": detection
             }
             
             return {
@@ -235,11 +391,16 @@ class SessionSecurityTester:
         # Test rotation security
         family_test = simulate_token_family()
         
+        # Concurrent rotations with injected reuse
+        rotation_benchmark = benchmark_rotation(num_families=50000, workers=8, ops_per_worker=5000,
+                                                seed=self.context.seed_for("rotation_benchmark"),
+                                                clock=self.context.clock())
+        
         results = {
             "rotation_mechanism": {
                 "family_tracking": True,
                 "automatic_revocation": True,
-                "reuse_detection": True,
+                "reuse_detection": family_test["reuse_detection"]["revoked_on_reuse"],
                 "cleanup_interval": "4 hours"
             },
             "security_benefits": [
@@ -249,6 +410,7 @@ class SessionSecurityTester:
                 "Automatic cleanup"
             ],
             "family_simulation": family_test,
+            "rotation_benchmark": rotation_benchmark,
             "attack_scenarios": [
                 {
                     "attack": "Token reuse",
@@ -265,12 +427,12 @@ class SessionSecurityTester:
             ]
         }
         
-        self.test_results.append({"refresh_token_rotation": results})
-        print(f"   ✓ Refresh token rotation tests completed")
+        self._record_result("refresh_token_rotation", results)
+        self._progress(f"   ✓ Refresh token rotation tests completed")
         
     def test_session_hijacking_vectors(self):
         """Test various session hijacking attack vectors"""
-        print("5. Testing Session Hijacking Attack Vectors...")
+        self._progress("5. Testing Session Hijacking Attack Vectors...")
         
         attack_vectors = [
             {
@@ -321,9 +483,31 @@ class SessionSecurityTester:
             "samesite_cookies": "NOT IMPLEMENTED"
         }
         
+        # Replay refresh traffic (including a refresh storm) through each limiter
+        refresh_rate_limiting = run_rate_limit_comparison(
+            requests=50000, seed=self.context.seed_for("refresh_rate_limiting"))
+        if any(r["abusive_denied_ratio"] < 0.5 for r in refresh_rate_limiting):
+            self.vulnerabilities.append("Refresh rate limiting lets a refresh storm through")
+        
+        # Replay a mixed legitimate/attack event stream through blacklist,
+        # rotation and rate limiting together
+        attack_replay = run_stress(generate_events(20000, seed=self.context.seed_for("attack_replay")))
+        
+        # Cost of binding sessions to an IP-prefix/User-Agent fingerprint
+        session_binding = [benchmark_binding(100000, 10000, similarity=mode, devices=5000,
+                                             seed=self.context.seed_for("session_binding"))
+                           for mode in (False, True)]
+        
+        # Streaming replay / impossible-travel / refresh-storm detection
+        anomaly_detection = benchmark_detector(100000, seed=self.context.seed_for("anomaly_detection"))
+        
         results = {
             "attack_vectors": attack_vectors,
             "current_protections": current_protections,
+            "refresh_rate_limiting": refresh_rate_limiting,
+            "attack_replay": attack_replay,
+            "session_binding": session_binding,
+            "anomaly_detection": anomaly_detection,
             "missing_protections": [
                 "HttpOnly cookies for token storage",
                 "SameSite cookie attributes",
@@ -333,8 +517,8 @@ class SessionSecurityTester:
             ]
         }
         
-        self.test_results.append({"session_hijacking_vectors": results})
-        print(f"   ✓ Session hijacking attack vector tests completed")
+        self._record_result("session_hijacking_vectors", results)
+        self._progress(f"   ✓ Session hijacking attack vector tests completed")
         
         # Add critical vulnerabilities
         self.vulnerabilities.extend([
@@ -345,42 +529,46 @@ class SessionSecurityTester:
         
     def test_concurrent_session_attacks(self):
         """Test concurrent session and race condition attacks"""
-        print("6. Testing Concurrent Session Attacks...")
-        
-        # Simulate concurrent operations
-        def simulate_concurrent_refresh():
-            """Simulate concurrent refresh token operations"""
-            scenarios = [
-                {
-                    "scenario": "Multiple refresh requests",
-                    "requests": 5,
-                    "expected_behavior": "All should succeed with different tokens",
-                    "risk": "Token collision"
-                },
-                {
-                    "scenario": "Refresh + logout race",
-                    "requests": 2,
-                    "expected_behavior": "Logout should invalidate family",
-                    "risk": "Token still valid after logout"
-                },
-                {
-                    "scenario": "Concurrent login + logout",
-                    "requests": 10,
-                    "expected_behavior": "Consistent session state",
-                    "risk": "Session state inconsistency"
-                }
-            ]
-            
-            return scenarios
+        self._progress("6. Testing Concurrent Session Attacks...")
+        
+        # Execute each race against the token service model, unlocked and locked
+        rng = self.context.random("concurrent_sessions")
+        concurrent_tests = []
+        for scenario, race, requests, expected in [
+            ("Multiple refresh requests", race_same_token, 5,
+             "Exactly one request rotates the token"),
+            ("Refresh + logout race", race_refresh_logout, 2,
+             "Logout should invalidate family"),
+            ("Concurrent login + logout", race_login_logout, 10,
+             "Consistent session state")
+        ]:
+            for safe in (False, True):
+                outcome = race(requests, safe, rng=rng)
+                concurrent_tests.append({
+                    "scenario": scenario,
+                    "requests": requests,
+                    "locking": "lock" if safe else "none",
+                    "expected_behavior": expected,
+                    "outcome": outcome,
+                    "result": "VULNERABLE" if outcome["violation"] else "SAFE"
+                })
         
-        concurrent_tests = simulate_concurrent_refresh()
+        # Throughput and tail latency as contention grows
+        # Same worker counts in every mode; process workers do fewer ops each
+        # since every shared-state access is a manager round trip
+        levels = [1, 4, 16, 64]
+        rng = self.context.random("contention_sweep")
+        contention_sweep = run_sweep(["thread", "asyncio"], levels, ops=50, rng=rng)
+        contention_sweep += run_sweep(["process"], levels, ops=25, rng=rng)
         
         results = {
             "concurrent_scenarios": concurrent_tests,
+            "contention_sweep": contention_sweep,
             "race_condition_risks": [
                 "Token blacklisting race conditions",
                 "Refresh token family inconsistency",
-                "Cleanup timing issues"
+                "Cleanup timing issues",
+                "Session state inconsistency"
             ],
             "mitigation_strategies": [
                 "Atomic operations for token operations",
@@ -395,38 +583,36 @@ class SessionSecurityTester:
             }
         }
         
-        self.test_results.append({"concurrent_session_attacks": results})
-        print(f"   ✓ Concurrent session attack tests completed")
+        self._record_result("concurrent_session_attacks", results)
+        self._progress(f"   ✓ Concurrent session attack tests completed")
+        
+        unlocked = [t for t in concurrent_tests if t["result"] == "VULNERABLE" and t["locking"] == "none"]
+        if any(t["scenario"] != "Concurrent login + logout" for t in unlocked):
+            self.vulnerabilities.append("Refresh without locking double-issues tokens under concurrent requests")
+        if any(t["scenario"] == "Concurrent login + logout" for t in unlocked):
+            self.vulnerabilities.append("Logout everywhere without locking leaves orphaned live sessions")
         
     def generate_security_report(self):
         """Generate comprehensive security report"""
-        print("\n" + "="*60)
-        print("BEAUTYCORT API SESSION SECURITY AUDIT REPORT")
-        print("="*60)
-        
-        print(f"\nAUDIT DATE: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"TOTAL TESTS: {len(self.test_results)}")
-        print(f"VULNERABILITIES FOUND: {len(self.vulnerabilities)}")
-        
-        print("\n" + "-"*40)
-        print("VULNERABILITIES SUMMARY")
-        print("-"*40)
-        
-        for i, vuln in enumerate(self.vulnerabilities, 1):
-            print(f"{i}. {vuln}")
-        
-        print("\n" + "-"*40)
-        print("DETAILED TEST RESULTS")
-        print("-"*40)
+        report = self.report or PrettyReport()
+        self._start_report(report)
         
+        # Without a streaming report the results were held until now
         for result in self.test_results:
             for test_name, test_data in result.items():
-                print(f"\n{test_name.upper().replace('_', ' ')}:")
-                print(json.dumps(test_data, indent=2, default=str))
+                if isinstance(test_data, RecordSet):
+                    report.emit_records(test_name, test_data)
+                else:
+                    report.emit_result(test_name, test_data)
+        
+        if self.test_timings:
+            report.emit_result("test_timings", {
+                "runner": self.run_summary,
+                "tests": self.test_timings
+            })
         
-        print("\n" + "-"*40)
-        print("CRITICAL SECURITY RECOMMENDATIONS")
-        print("-"*40)
+        if self.instrumentation is not None:
+            report.emit_result("instrumentation", self.instrumentation.report())
         
         critical_recommendations = [
             "1. IMMEDIATE: Implement Redis for token blacklisting",
@@ -438,13 +624,6 @@ class SessionSecurityTester:
             "7. LOW: Implement rate limiting for refresh endpoints"
         ]
         
-        for rec in critical_recommendations:
-            print(rec)
-        
-        print("\n" + "-"*40)
-        print("SECURITY IMPLEMENTATION STATUS")
-        print("-"*40)
-        
         implementation_status = {
             "✅ IMPLEMENTED": [
                 "JWT token blacklisting system",
@@ -469,32 +648,91 @@ class SessionSecurityTester:
             ]
         }
         
-        for status, items in implementation_status.items():
-            print(f"\n{status}:")
-            for item in items:
-                print(f"  - {item}")
-        
-        print("\n" + "="*60)
-        print("END OF SECURITY AUDIT REPORT")
-        print("="*60)
+        report.emit_summary(self.tests_completed, self.vulnerabilities,
+                            critical_recommendations, implementation_status)
+        report.end()
 
 def main():
     """Run comprehensive security audit"""
-    tester = SessionSecurityTester()
+    parser = argparse.ArgumentParser(description="BeautyCort API session security audit")
+    parser.add_argument("--format", choices=sorted(REPORT_FORMATS), default="pretty",
+                        help="report format, streamed as each test finishes")
+    parser.add_argument("--output", help="write the report to a file instead of stdout")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes for running tests (1 = sequential, 0 = one per CPU)")
+    parser.add_argument("--store", metavar="PATH",
+                        help="also append typed result records for cross-run queries")
+    parser.add_argument("--store-format", choices=sorted(SINKS), default="columnar")
+    parser.add_argument("--service", default="beautycort-api",
+                        help="service name recorded with stored results")
+    parser.add_argument("--seed", type=int,
+                        help="seed all randomness and simulated time for a reproducible run")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="run the suite this many times (samples for --snapshot)")
+    parser.add_argument("--snapshot", metavar="PATH",
+                        help="save every numeric result (mean/stdev over repeats) for comparison")
+    parser.add_argument("--instrument", action="store_true",
+                        help="count and time every test and token operation (report section)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="with instrumentation, record tracemalloc peaks (slows the run)")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="with instrumentation, write merged cProfile data for pstats")
+    args = parser.parse_args()
+    instrument = None
+    if args.instrument or args.trace_memory or args.profile:
+        instrument = {"trace_memory": args.trace_memory, "profile": bool(args.profile)}
     
-    print("BeautyCort API Session Security Audit")
-    print("="*40)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    # Keep stdout pure JSON Lines when the report is written there
+    log = sys.stderr if args.format == "jsonl" and out is sys.stdout else sys.stdout
+    context = SimulationContext(args.seed)
+    recorder = SnapshotRecorder() if args.snapshot else None
     
-    # Run all security tests
-    tester.test_jwt_secret_strength()
-    tester.test_token_expiration_attacks()
-    tester.test_blacklist_security()
-    tester.test_refresh_token_rotation()
-    tester.test_session_hijacking_vectors()
-    tester.test_concurrent_session_attacks()
+    print("BeautyCort API Session Security Audit", file=log)
+    print("="*40, file=log)
     
-    # Generate comprehensive report
-    tester.generate_security_report()
+    try:
+        for run in range(1, args.repeat + 1):
+            if args.repeat > 1:
+                print(f"\nRun {run}/{args.repeat}", file=log)
+            # Only the last run streams the report
+            report = None
+            if run == args.repeat:
+                report = create_report(args.format, out)
+                if args.store:
+                    # Wall clock, not the (possibly seeded) simulation clock, plus
+                    # a random suffix so no two runs ever share an id in the store
+                    started = time.time()
+                    stamp = time.strftime('%Y%m%dT%H%M%S', time.localtime(started))
+                    run_id = f"{args.service}-{stamp}-{uuid.uuid4().hex[:8]}"
+                    store = StoreReport(open_sink(args.store_format, args.store), run_id,
+                                        args.service, started)
+                    report = TeeReport(report, store)
+            tester = SessionSecurityTester(report=report, log=log, context=context)
+            tester.recorder = recorder
+            if instrument is not None:
+                tester.instrumentation = Instrumentation(**instrument)
+            
+            # Run all security tests (each isolated, merged in definition order)
+            tester.run_summary = run_tests(tester, workers=args.workers or None,
+                                           init={"context": context}, instrument=instrument)
+            if recorder is not None:
+                recorder.record("test_timings", {t["test"]: t for t in tester.test_timings})
+        
+        # Generate comprehensive report
+        tester.generate_security_report()
+        
+        if args.profile:
+            tester.instrumentation.dump_stats(args.profile)
+            print(f"Profile written to {args.profile}", file=log)
+        
+        if recorder is not None:
+            save_snapshot(recorder.snapshot(seed=args.seed, runs=args.repeat, workers=args.workers),
+                          args.snapshot)
+            print(f"Snapshot written to {args.snapshot}", file=log)
+    finally:
+        if out is not sys.stdout:
+            out.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Bulk Token Hashing
+Batched SHA-256 over iterables of tokens returning raw digests, with large
+batches fanned out across a worker pool, and a benchmark against the
+per-token hexdigest loop on 1..N workers
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from bench_timing import measure
+from token_blacklist import DIGEST_SIZE
+
+# hashlib only releases the GIL while hashing inputs at least this long, so
+# threads only overlap on large tokens; typical JWTs need processes
+GIL_RELEASE_BYTES = 2048
+
+
+def hash_batch(tokens):
+    """Raw SHA-256 digests of a batch of str/bytes tokens, packed end to end"""
+    sha256 = hashlib.sha256
+    return b"".join([sha256(t if isinstance(t, bytes) else t.encode()).digest() for t in tokens])
+
+
+def split_digests(packed):
+    """List of DIGEST_SIZE-byte digests from a packed buffer"""
+    return [bytes(packed[i:i + DIGEST_SIZE]) for i in range(0, len(packed), DIGEST_SIZE)]
+
+
+class TokenHasher:
+    """Reusable hashing stage; owns its worker pool across calls
+
+    Tokens are hashed in ``chunk_size`` pieces (small enough that each
+    piece's digests stay in cache) copied into one preallocated output
+    buffer. Batches below ``min_parallel`` tokens are hashed inline, since
+    handing them to workers costs more than hashing them. ``mode`` is
+    "thread", "process", or "auto" (threads only when tokens are long
+    enough for hashlib to drop the GIL).
+    """
+
+    def __init__(self, workers=None, mode="auto", chunk_size=4096, min_parallel=16384):
+        if mode not in ("auto", "thread", "process"):
+            raise ValueError(f"Unknown hashing mode: {mode}")
+        self.workers = workers or os.cpu_count() or 1
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.min_parallel = min_parallel
+        self._pools = {}
+
+    def _pool(self, mode):
+        pool = self._pools.get(mode)
+        if pool is None:
+            executor = ThreadPoolExecutor if mode == "thread" else ProcessPoolExecutor
+            pool = self._pools[mode] = executor(max_workers=self.workers)
+        return pool
+
+    def _mode_for(self, tokens):
+        if self.mode != "auto":
+            return self.mode
+        sample = tokens[:64]
+        average = sum(len(t) for t in sample) / len(sample)
+        return "thread" if average >= GIL_RELEASE_BYTES else "process"
+
+    def hash_packed(self, tokens):
+        """Digests of ``tokens`` in order, as one packed buffer"""
+        tokens = tokens if isinstance(tokens, list) else list(tokens)
+        size = self.chunk_size
+        if len(tokens) <= size:
+            return hash_batch(tokens)
+        chunks = [tokens[i:i + size] for i in range(0, len(tokens), size)]
+        if self.workers == 1 or len(tokens) < self.min_parallel:
+            results = map(hash_batch, chunks)
+        else:
+            results = self._pool(self._mode_for(tokens)).map(hash_batch, chunks)
+        out = bytearray(len(tokens) * DIGEST_SIZE)
+        offset = 0
+        for packed in results:
+            out[offset:offset + len(packed)] = packed
+            offset += len(packed)
+        return out
+
+    def hash_tokens(self, tokens):
+        """Digests of ``tokens`` in order, one ``bytes`` per token"""
+        return split_digests(self.hash_packed(tokens))
+
+    def close(self):
+        for pool in self._pools.values():
+            pool.shutdown()
+        self._pools.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def hash_tokens(tokens, workers=1, mode="auto"):
+    """Raw digests for an iterable of tokens (one-off; reuse a TokenHasher for many calls)"""
+    with TokenHasher(workers, mode) as hasher:
+        return hasher.hash_tokens(tokens)
+
+
+def synthetic_tokens(count, token_bytes=300):
+    """Distinct JWT-sized ASCII tokens"""
+    filler = "x" * max(token_bytes - 24, 0)
+    return [f"eyJ.{i:019d}.{filler}" for i in range(count)]
+
+
+def benchmark_hashing(tokens=200000, token_bytes=300, max_workers=None, samples=5):
+    """Tokens hashed per second: per-token hexdigest loop vs batched digests
+
+    Every figure is the mean of ``samples`` whole-batch runs from
+    bench_timing. Pools are started (and warmed) before timing, as they
+    would be in a long-running service.
+    """
+    batch = synthetic_tokens(tokens, token_bytes)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    def rate(fn):
+        timing = measure(fn, samples=samples, batch=1, warmup=1)
+        return {
+            "tokens_per_sec": tokens * 1e9 / timing["mean_ns"],
+            "ci_tokens_per_sec": [tokens * 1e9 / timing["ci_high_ns"],
+                                  tokens * 1e9 / timing["ci_low_ns"] if timing["ci_low_ns"] else None],
+        }
+
+    sha256 = hashlib.sha256
+    baseline = rate(lambda: [sha256(t.encode()).hexdigest() for t in batch])
+    inline = TokenHasher(1)
+    batched = rate(lambda: inline.hash_packed(batch))
+    scaling = []
+    for mode in ("thread", "process"):
+        for workers in range(1, max_workers + 1):
+            with TokenHasher(workers, mode, min_parallel=0) as hasher:
+                result = rate(lambda: hasher.hash_packed(batch))
+            result.update({
+                "mode": mode,
+                "workers": workers,
+                "speedup_vs_loop": result["tokens_per_sec"] / baseline["tokens_per_sec"],
+            })
+            scaling.append(result)
+    matches = inline.hash_tokens(batch) == [sha256(t.encode()).digest() for t in batch]
+
+    return {
+        "tokens": tokens,
+        "token_bytes": token_bytes,
+        "cpu_count": os.cpu_count(),
+        "gil_released": token_bytes >= GIL_RELEASE_BYTES,
+        "digests_match_loop": matches,
+        "per_token_hexdigest_loop": baseline,
+        "batched_raw_digests": dict(batched, speedup_vs_loop=batched["tokens_per_sec"]
+                                    / baseline["tokens_per_sec"]),
+        "scaling": scaling,
+    }
+
+
+def main():
+    """Benchmark bulk token hashing"""
+    parser = argparse.ArgumentParser(description="Batched SHA-256 token hashing benchmark")
+    parser.add_argument("--tokens", type=int, default=200000)
+    parser.add_argument("--token-bytes", type=int, nargs="+", default=[300, 4096])
+    parser.add_argument("--max-workers", type=int, help="default: every core")
+    parser.add_argument("--samples", type=int, default=5)
+    args = parser.parse_args()
+
+    print(json.dumps([benchmark_hashing(args.tokens, size, args.max_workers, args.samples)
+                      for size in args.token_bytes], indent=2))
+
+
+if __name__ == "__main__":
+    main()
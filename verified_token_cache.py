@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Verified Token Cache
+Bounded LRU cache of decoded JWT claims keyed by token digest, invalidated
+by expiry, TTL, and token/family/user revocation
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from itertools import accumulate
+
+from bench_timing import measure_each
+from jwt_bench import JWTError, make_claims, sign, verify
+from token_blacklist import CompactDigestStore, hash_token
+
+
+class VerifiedTokenCache:
+    """LRU of verified claims that never outlives exp, TTL, or a revocation
+
+    Each entry lives until the earliest of the token's ``exp``, ``ttl``
+    seconds after it was verified, or the moment the token, its family
+    (``tokenFamily``) or its user (``id``) is revoked. Revocations go
+    through this cache so a revoked token can never be served from it:
+    every revocation bumps a generation counter, and claims verified while
+    one was in flight are not cached.
+    """
+
+    def __init__(self, max_size=100000, ttl=60, clock=time.time):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # digest -> (claims, expires_at)
+        self._by_family = {}
+        self._by_user = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _index_add(self, index, key, digest):
+        if key is not None:
+            index.setdefault(key, set()).add(digest)
+
+    def _index_discard(self, index, key, digest):
+        owned = index.get(key)
+        if owned is not None:
+            owned.discard(digest)
+            if not owned:
+                del index[key]
+
+    def _remove(self, digest):
+        claims, _ = self._entries.pop(digest)
+        self._index_discard(self._by_family, claims.get("tokenFamily"), digest)
+        self._index_discard(self._by_user, claims.get("id"), digest)
+
+    def get(self, digest):
+        """Return cached claims for a digest, or None on miss/expiry"""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] <= self.clock():
+                self._remove(digest)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, digest, claims, generation=None):
+        """Cache claims; skipped if any revocation happened since ``generation``"""
+        now = self.clock()
+        expires_at = min(claims.get("exp", now + self.ttl), now + self.ttl)
+        if expires_at <= now:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if digest in self._entries:
+                self._remove(digest)
+            self._entries[digest] = (claims, expires_at)
+            self._index_add(self._by_family, claims.get("tokenFamily"), digest)
+            self._index_add(self._by_user, claims.get("id"), digest)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def get_or_verify(self, token, verifier):
+        """Serve claims from cache or run ``verifier(token)`` and cache them"""
+        digest = hash_token(token)
+        # Read before verifying so a revocation racing the verifier is seen by put()
+        generation = self._generation
+        claims = self.get(digest)
+        if claims is None:
+            claims = verifier(token)
+            self.put(digest, claims, generation)
+        return claims
+
+    def revoke_token(self, digest):
+        with self._lock:
+            self._generation += 1
+            if digest in self._entries:
+                self._remove(digest)
+                self.invalidations += 1
+
+    def _revoke_index(self, index, key):
+        with self._lock:
+            self._generation += 1
+            digests = index.get(key, ())
+            for digest in list(digests):
+                self._remove(digest)
+                self.invalidations += 1
+
+    def revoke_family(self, family_id):
+        self._revoke_index(self._by_family, family_id)
+
+    def revoke_user(self, user_id):
+        self._revoke_index(self._by_user, user_id)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RevocationError(JWTError):
+    """Token is on the blacklist or its family has been revoked"""
+
+
+def zipf_cum_weights(n, exponent=1.1):
+    """Cumulative Zipf weights for ranks 1..n (for random.choices)"""
+    return list(accumulate(1.0 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+def benchmark_cache(distinct_tokens=10000, requests=200000, cache_size=2000,
+                    exponent=1.1, revoke_every=1000, ttl=60, seed=1, clock=time.time):
+    """Replay a Zipfian token-reuse workload with and without the cache
+
+    Every ``revoke_every`` requests a random family is revoked, which must
+    drop its tokens from the cache and fail later verifications. The
+    signing secret comes from ``seed`` and token times from ``clock``.
+    """
+    rng = random.Random(seed)
+    secret = rng.randbytes(64)
+    now = clock()
+    claims = [make_claims("with_family", index=i, now=now) for i in range(distinct_tokens)]
+    tokens = [sign(c, secret) for c in claims]
+    families = [c["tokenFamily"] for c in claims]
+    workload = rng.choices(range(distinct_tokens), cum_weights=zipf_cum_weights(distinct_tokens, exponent),
+                           k=requests)
+    revocations = {i: rng.randrange(distinct_tokens) for i in range(revoke_every, requests, revoke_every)}
+
+    def run(use_cache):
+        blacklist = CompactDigestStore(capacity=distinct_tokens)
+        revoked_families = set()
+        cache = VerifiedTokenCache(max_size=cache_size, ttl=ttl, clock=clock)
+        verifications = 0
+        rejected = 0
+
+        def verifier(token):
+            nonlocal verifications
+            verifications += 1
+            claims = verify(token, secret, now=now)
+            if hash_token(token) in blacklist or claims.get("tokenFamily") in revoked_families:
+                raise RevocationError("Token revoked")
+            return claims
+
+        def handle(request):
+            nonlocal rejected
+            i, index = request
+            victim = revocations.get(i)
+            if victim is not None:
+                revoked_families.add(families[victim])
+                blacklist.insert(hash_token(tokens[victim]))
+                if use_cache:
+                    cache.revoke_family(families[victim])
+            try:
+                if use_cache:
+                    cache.get_or_verify(tokens[index], verifier)
+                else:
+                    verifier(tokens[index])
+            except RevocationError:
+                rejected += 1
+
+        # Every request is served once, in order; batches of them are timed
+        timing = measure_each(handle, enumerate(workload), batch=256)
+        result = {
+            "verifications": verifications,
+            "rejected": rejected,
+            "requests_per_sec": timing["ops_per_sec"],
+        }
+        if use_cache:
+            result["cache"] = cache.stats()
+        return result
+
+    uncached = run(False)
+    cached = run(True)
+    return {
+        "distinct_tokens": distinct_tokens,
+        "requests": requests,
+        "zipf_exponent": exponent,
+        "cache_size": cache_size,
+        "revocations": len(revocations),
+        "uncached": uncached,
+        "cached": cached,
+        "verification_work_saved": 1 - cached["verifications"] / uncached["verifications"],
+        "consistent_rejections": cached["rejected"] == uncached["rejected"],
+        "speedup": cached["requests_per_sec"] / uncached["requests_per_sec"],
+    }
+
+
+def main():
+    """Run the cache benchmark"""
+    parser = argparse.ArgumentParser(description="Verified token cache benchmark (Zipfian reuse)")
+    parser.add_argument("--tokens", type=int, default=10000, help="distinct tokens in circulation")
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--cache-size", type=int, default=2000)
+    parser.add_argument("--exponent", type=float, default=1.1, help="Zipf skew")
+    parser.add_argument("--revoke-every", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(json.dumps(benchmark_cache(args.tokens, args.requests, args.cache_size,
+                                     args.exponent, args.revoke_every), indent=2))
+
+
+if __name__ == "__main__":
+    main()